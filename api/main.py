@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# api/main.py
+
+"""
+HTTP API for the RAG Pipeline
+
+- POST /answer  {"question": ..., "top_k": 5, "filters": {...}}
+  → {"answer": ..., "sources": [...]}
+  ("trace": true adds the request's stage timings and counters)
+- GET  /health  queue depths and batch statistics
+- GET  /metrics stage latency histograms and counters (Prometheus format)
+
+Concurrent requests are micro-batched (see src/rag/micro_batching.py):
+query embedding + FAISS search run once per batch of questions, and
+Flan-T5 generates each batch of prompts in one padded call. A full queue
+answers 503 (with Retry-After), a request slower than RAG_API_TIMEOUT
+seconds answers 504.
+
+Run:
+    python -m api.main        (or: uvicorn api.main:app)
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+from contextlib import asynccontextmanager, nullcontext
+from typing import Dict, List, Optional, Union
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+from src.embeddings.chunk_store import check_filters
+from src.rag import query_rag_pipeline as qrp
+from src.rag import telemetry
+from src.rag.batch_answer import source_records
+from src.rag.micro_batching import (
+    MAX_BATCH_SIZE,
+    MAX_QUEUE_SIZE,
+    MAX_WAIT_MS,
+    MicroBatcher,
+    Overloaded,
+)
+from src.rag.models import preload_models
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+HOST = os.environ.get("RAG_API_HOST", "0.0.0.0")
+PORT = int(os.environ.get("RAG_API_PORT", "8000"))
+REQUEST_TIMEOUT = float(os.environ.get("RAG_API_TIMEOUT", "30"))  # Seconds
+VECTOR_STORE_DIR = os.environ.get("RAG_VECTOR_STORE_DIR", qrp.VECTOR_STORE_DIR)
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+class AnswerRequest(BaseModel):
+    question: str
+    top_k: int = qrp.TOP_K
+    # product / company: a name or a list of names
+    filters: Optional[Dict[str, Union[str, List[str]]]] = None
+    trace: bool = False
+
+
+async def run_blocking(func, *args):
+    """``func(*args)`` on the default executor, keeping the event loop free
+
+    Runs in a copy of the caller's context, so telemetry spans still land
+    in the request's trace.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(None, context.run, func, *args)
+
+
+class RAGService:
+    """``answer_question`` with micro-batched retrieval and generation"""
+
+    def __init__(
+        self,
+        vector_store,
+        cache=None,
+        max_batch_size=MAX_BATCH_SIZE,
+        max_wait_ms=MAX_WAIT_MS,
+        max_queue_size=MAX_QUEUE_SIZE,
+    ):
+        self.vector_store = vector_store
+        self.cache = cache
+        options = dict(
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            max_queue_size=max_queue_size,
+        )
+        self.retriever = MicroBatcher(self._retrieve, name="retrieval", **options)
+        self.generator = MicroBatcher(self._generate, name="generation", **options)
+
+    def _retrieve(self, items):
+        """One embedding + search call per (top_k, filters) group.
+
+        A group that fails gets the exception as its items' results, so
+        only its own callers see it.
+        """
+        groups = {}
+        for i, (_, top_k, filters) in enumerate(items):
+            key = (top_k, json.dumps(filters, sort_keys=True))
+            groups.setdefault(key, []).append(i)
+
+        results = [None] * len(items)
+        for positions in groups.values():
+            _, top_k, filters = items[positions[0]]
+            try:
+                found = qrp._retrieve_chunks_batch(
+                    self.vector_store,
+                    [items[i][0] for i in positions],
+                    top_k,
+                    filters,
+                    self.cache,
+                )
+                found = list(zip(*found))  # (chunks, complete) per question
+            except Exception as exc:
+                found = [exc] * len(positions)
+            for i, result in zip(positions, found):
+                results[i] = result
+        return results
+
+    def _generate(self, prompts):
+        return qrp.generate_answers(prompts)
+
+    def _lookup(self, question, chunks, complete):
+        """``(cache, key, answer, prompt)``: the cached answer, or on a miss
+        the prompt to generate it from"""
+        # Answers built from a partial (shard skipped) retrieval are not cached
+        cache = qrp._active_cache(self.vector_store, self.cache) if complete else None
+        key = qrp._answer_key(cache, self.vector_store, question, chunks)
+        answer = cache.answers.get(key) if key else None
+        if answer is not None:
+            telemetry.count("answer_cache_hits")
+            return cache, key, answer, None
+        return cache, key, None, qrp.build_prompt(chunks, question)
+
+    async def answer(self, question, top_k=qrp.TOP_K, filters=None, timeout=None):
+        """Same result as ``answer_question``, batched with concurrent calls"""
+        check_filters(filters)  # Bad input fails here, not in a shared batch
+        # Cache lookups, prompt building and aggregate queries block: they
+        # run on the executor, not on the event loop
+        counted = await run_blocking(qrp.answer_from_aggregates, question, filters)
+        if counted is not None:
+            return counted, []
+        # Spans include the time spent waiting for the batch
+        with telemetry.span("batched_retrieve"):
+            chunks, complete = await self.retriever.submit(
+                (question, top_k, filters), timeout
+            )
+
+        cache, key, answer, prompt = await run_blocking(
+            self._lookup, question, chunks, complete
+        )
+        if answer is None:
+            with telemetry.span("batched_generate"):
+                answer = await self.generator.submit(prompt, timeout)
+            if key:
+                await run_blocking(cache.answers.put, key, answer)
+        return answer, chunks
+
+    def start(self):
+        self.retriever.start()
+        self.generator.start()
+
+    async def stop(self):
+        await self.retriever.stop()
+        await self.generator.stop()
+
+
+def create_app(
+    vector_store=None,
+    cache=None,
+    timeout=REQUEST_TIMEOUT,
+    vector_store_dir=None,
+    **options,
+):
+    """FastAPI app; the vector store and models are loaded at startup
+
+    Pass ``vector_store`` (and a stubbed generator) to serve without the
+    real models, e.g. in tests; ``vector_store_dir`` is where its document
+    store is (sources then list their near-duplicate complaint IDs).
+    """
+
+    @asynccontextmanager
+    async def lifespan(app):
+        store = vector_store
+        app.state.vector_store_dir = vector_store_dir
+        if store is None:
+            preload_models()
+            store = qrp.load_vector_store(VECTOR_STORE_DIR)
+            app.state.vector_store_dir = VECTOR_STORE_DIR
+        app.state.service = RAGService(store, cache, **options)
+        app.state.service.start()
+        yield
+        await app.state.service.stop()
+
+    app = FastAPI(title="CrediTrust Complaints RAG", lifespan=lifespan)
+
+    @app.post("/answer")
+    async def answer(request: AnswerRequest):
+        service = app.state.service
+        status = 500
+        with telemetry.tracing() if request.trace else nullcontext() as trace:
+            try:
+                with telemetry.span("request"):
+                    # The timeout covers queueing, retrieval and generation
+                    answer, sources = await asyncio.wait_for(
+                        service.answer(
+                            request.question, request.top_k, request.filters
+                        ),
+                        timeout,
+                    )
+                status = 200
+            except Overloaded as exc:
+                status = 503
+                raise HTTPException(503, str(exc), headers={"Retry-After": "1"})
+            except asyncio.TimeoutError:
+                status = 504
+                raise HTTPException(504, f"no answer within {timeout:g}s")
+            except ValueError as exc:  # e.g. unknown filter keys
+                status = 400
+                raise HTTPException(400, str(exc))
+            finally:
+                if telemetry.TELEMETRY_ENABLED:
+                    telemetry.METRICS.inc("requests", status=status)
+        body = {
+            "question": request.question,
+            "answer": answer,
+            "sources": await run_blocking(
+                source_records, sources, app.state.vector_store_dir
+            ),
+        }
+        if trace is not None:
+            body["trace"] = trace.as_dict()
+        return body
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        return telemetry.METRICS.render()
+
+    @app.get("/health")
+    async def health():
+        service = app.state.service
+        return {
+            "status": "ok",
+            "queued": {
+                "retrieval": service.retriever.pending(),
+                "generation": service.generator.pending(),
+            },
+            "batches": {
+                name: {"count": batcher.batches, "items": batcher.items}
+                for name, batcher in (
+                    ("retrieval", service.retriever),
+                    ("generation", service.generator),
+                )
+            },
+        }
+
+    return app
+
+
+app = create_app()
+
+# --------------------------------------------
+# MAIN
+# --------------------------------------------
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=HOST, port=PORT)
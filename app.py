@@ -1,20 +1,30 @@
-import sys
-import os
 import streamlit as st
 
 # import time
-from rag.query_rag_pipeline import answer_question, load_vector_store
+from src.rag.models import BackgroundLoad, preload_models
+from src.rag.query_rag_pipeline import (
+    VECTOR_STORE_DIR,
+    get_duplicate_ids,
+    get_full_narrative,
+    list_products,
+    load_vector_store,
+    stream_answer,
+)
 
-# Add src to sys.path
-current_dir = os.path.dirname(os.path.abspath(__file__))
-src_dir = os.path.join(current_dir, "src")
-sys.path.insert(0, src_dir)
+# Reruns only the chat turns, not the whole script (no-op on old Streamlit)
+fragment = getattr(st, "fragment", lambda fn: fn)
 
 
-# Load vectorstore once
-vs = load_vector_store(
-    "vector_store/faiss_index", "sentence-transformers/all-MiniLM-L6-v2"
-)
+@st.cache_resource(show_spinner=False)
+def warm_up():
+    """Process-wide: models + vector store load once, in the background,
+    and are shared by every session and rerun"""
+    return BackgroundLoad(
+        lambda: (preload_models(), load_vector_store(VECTOR_STORE_DIR))[1]
+    )
+
+
+startup = warm_up()
 
 # Page config
 st.set_page_config(
@@ -157,12 +167,38 @@ st.markdown(
 
 st.title("💬 Financial Complaints RAG Chatbot")
 
-# Chat container with fixed height and scrolling
-chat_container = st.container()
 
-# Session state for chat history
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+def sources_html(sources):
+    sources_md = "<br>".join(
+        f"- {src.page_content[:300].replace(chr(10), ' ')}..."  # chr(10) is \n
+        for src in sources
+    )
+    return f'<div class="sources"><b>🔎 Sources used:</b><br>{sources_md}</div>'
+
+
+def turn_html(question, answer, sources):
+    """HTML of one chat turn, built once when the turn is added"""
+    return (
+        f'<div class="chat-message user-message">🧑‍💻 {question}</div>'
+        f'<div class="chat-message ai-message">🤖 {answer}</div>' + sources_html(sources)
+    )
+
+
+def render_turn(i, turn):
+    st.markdown(turn["html"], unsafe_allow_html=True)
+    # Full narratives are only fetched from the document store on demand
+    if st.checkbox("📄 Show full complaint narratives", key=f"narratives-{i}"):
+        shown = set()
+        for src in turn["sources"]:
+            cid = src.metadata["complaint_id"]
+            if cid not in shown:
+                shown.add(cid)
+                st.markdown(f"**Complaint {cid}**")
+                st.write(get_full_narrative(src))
+                duplicates = get_duplicate_ids(src)
+                if duplicates:
+                    listed = ", ".join(str(d) for d in duplicates)
+                    st.caption(f"Also stands for near-duplicate complaints: {listed}")
 
 
 # Input and buttons in a fixed container at the bottom
@@ -175,43 +211,71 @@ def render_input():
         return user_input, submit
 
 
-# Render chat messages inside scrollable container
-with chat_container:
-    st.markdown('<div id="chat-container">', unsafe_allow_html=True)
-    for message in st.session_state.chat_history:
-        st.markdown(
-            f'<div class="chat-message user-message">🧑‍💻 {message["question"]}</div>',
-            unsafe_allow_html=True,
-        )
-        st.markdown(
-            f'<div class="chat-message ai-message">🤖 {message["answer"]}</div>',
-            unsafe_allow_html=True,
-        )
-        # Show sources truncated
-        sources_md = "<br>".join(
-            [
-                f"- {src.page_content[:300].replace(chr(10), ' ')}..."  # chr(10) is \n
-                for src in message["sources"]
-            ]
-        )
-        st.markdown(
-            f'<div class="sources"><b>🔎 Sources used:</b><br>{sources_md}</div>',
-            unsafe_allow_html=True,
-        )
-    st.markdown("</div>", unsafe_allow_html=True)
+@fragment
+def chat(vs, filters):
+    """Turns added since the last full run, the input form and the new turn
 
-# Render input form fixed at bottom
-user_input, submitted = render_input()
+    Submitting a question reruns only this function: earlier turns are not
+    rendered again, so a turn costs the same however long the chat is.
+    """
+    history = st.session_state.chat_history
+    for i in range(st.session_state.rendered_turns, len(history)):
+        render_turn(i, history[i])
+
+    user_input, submitted = render_input()
+    if not submitted or user_input.strip() == "":
+        return
 
-# Process input
-if submitted and user_input.strip() != "":
-    answer, sources = answer_question(user_input, vs, top_k=5)
-    st.session_state.chat_history.append(
+    st.markdown(
+        f'<div class="chat-message user-message">🧑‍💻 {user_input}</div>',
+        unsafe_allow_html=True,
+    )
+    answer_box = st.empty()
+    sources, tokens = stream_answer(user_input, vs, top_k=5, filters=filters)
+    # Sources are known right after retrieval, before any token is generated
+    st.markdown(sources_html(sources), unsafe_allow_html=True)
+    answer = ""
+    for token in tokens:
+        answer += token
+        answer_box.markdown(
+            f'<div class="chat-message ai-message">🤖 {answer}▌</div>',
+            unsafe_allow_html=True,
+        )
+    answer_box.markdown(
+        f'<div class="chat-message ai-message">🤖 {answer}</div>',
+        unsafe_allow_html=True,
+    )
+    history.append(
         {
             "question": user_input,
             "answer": answer,
             "sources": sources,
+            "html": turn_html(user_input, answer, sources),
         }
     )
-    # Rerun to update chat
-    st.rerun()
+
+
+# Session state for chat history
+if "chat_history" not in st.session_state:
+    st.session_state.chat_history = []
+
+# Full runs (first load, product change) render the whole history once
+chat_container = st.container()
+with chat_container:
+    st.markdown('<div id="chat-container">', unsafe_allow_html=True)
+    for i, turn in enumerate(st.session_state.chat_history):
+        render_turn(i, turn)
+    st.markdown("</div>", unsafe_allow_html=True)
+st.session_state.rendered_turns = len(st.session_state.chat_history)
+
+if not startup.ready:
+    with st.spinner("Loading the models and the vector store ..."):
+        startup.result()
+vs = startup.result()
+
+# Restrict retrieval to one product (applied inside the vector search)
+ALL_PRODUCTS = "All products"
+product = st.sidebar.selectbox("Product", [ALL_PRODUCTS] + list_products(vs))
+filters = None if product == ALL_PRODUCTS else {"product": product}
+
+chat(vs, filters)
@@ -1,26 +1,46 @@
 #!/usr/bin/env python3
 
 import gradio as gr
-from src.rag.query_rag_pipeline import load_vector_store, answer_question
-
-# Load vector store once at startup
-vs = load_vector_store(
-    vector_store_dir="vector_store/faiss_index",
-    embedding_model_name="sentence-transformers/all-MiniLM-L6-v2",
+from src.rag.models import preload_models
+from src.rag.query_rag_pipeline import (
+    VECTOR_STORE_DIR,
+    get_duplicate_ids,
+    list_products,
+    load_vector_store,
+    stream_answer,
 )
 
+# Load + warm up the shared models and the vector store once at startup;
+# the store uses the same (configured) embedder the registry just warmed
+preload_models()
+vs = load_vector_store(VECTOR_STORE_DIR)
 
-def chat_fn(message, history):
-    answer, sources = answer_question(message, vs, top_k=5)
 
-    # Prepare sources text
-    sources_text = "\n".join(
-        [f"[{i+1}] {chunk.page_content[:300]}..." for i, chunk in enumerate(sources)]
-    )
+ALL_PRODUCTS = "All products"
+
+
+def source_line(i, chunk):
+    line = f"[{i+1}] (complaint {chunk.metadata['complaint_id']}) "
+    duplicates = get_duplicate_ids(chunk, VECTOR_STORE_DIR)
+    if duplicates:  # Near-duplicate complaints indexed through this one
+        line += f"(also {', '.join(str(d) for d in duplicates)}) "
+    return line + f"{chunk.page_content[:300]}..."
 
-    final_reply = f"{answer}\n\n**Sources:**\n{sources_text}"
 
-    return final_reply
+def chat_fn(message, history, product=ALL_PRODUCTS):
+    filters = None if product == ALL_PRODUCTS else {"product": product}
+    sources, tokens = stream_answer(message, vs, top_k=5, filters=filters)
+
+    # Prepare sources text
+    sources_text = "\n".join([source_line(i, chunk) for i, chunk in enumerate(sources)])
+    sources_md = f"\n\n**Sources:**\n{sources_text}"
+
+    # Sources show up right after retrieval, the answer grows as it streams
+    answer = ""
+    yield f"…{sources_md}"
+    for token in tokens:
+        answer += token
+        yield f"{answer}{sources_md}"
 
 
 if __name__ == "__main__":
@@ -31,4 +51,9 @@ if __name__ == "__main__":
         "The chatbot responds based on customer complaint data and "
         "shows source excerpts.",
         theme=gr.themes.Default(),
+        additional_inputs=[
+            gr.Dropdown(
+                [ALL_PRODUCTS] + list_products(vs), value=ALL_PRODUCTS, label="Product"
+            )
+        ],
     ).launch()
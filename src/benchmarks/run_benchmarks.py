@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# src/benchmarks/run_benchmarks.py
+
+"""
+Per-Stage Micro-Benchmarks for the RAG Pipeline
+
+- Runs offline on a synthetic CFPB-like corpus with deterministic stub
+  models (see synthetic.py), so numbers measure our code, not the models
+- Stages: clean_text / clean_narratives, near-duplicate detection,
+  chunk_texts, embedding
+  throughput, index build, retrieve_chunks latency (dense and hybrid) at
+  several corpus sizes, build_prompt and end-to-end answer_question
+- Results are written as JSON and compared against a stored baseline:
+  latencies (``*_ms``) more than ``--tolerance`` slower or throughputs
+  (``*_per_s``) that much lower are reported as regressions
+
+Example:
+    python -m src.benchmarks.run_benchmarks --save-baseline   # reference run
+    python -m src.benchmarks.run_benchmarks                   # later runs
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from ..data.data_preprocessing import clean_narratives, clean_text
+from ..embeddings.chunker import chunk_spans
+from ..embeddings.create_vector_store import build_vector_store
+from ..embeddings.dedup import deduplicate
+from ..embeddings.embedding_stage import embed_in_batches
+from ..embeddings.index_factory import build_index
+from ..embeddings.mmap_store import MmapVectorStore
+from ..rag.cache import RAGCache
+from ..rag.query_rag_pipeline import answer_question, build_prompt, retrieve_chunks
+from .synthetic import make_complaints, stub_models
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+OUTPUT_PATH = "reports/benchmarks/latest.json"
+BASELINE_PATH = "reports/benchmarks/baseline.json"
+
+CORPUS_SIZES = [1_000, 5_000, 20_000]  # Complaints per retrieval benchmark
+N_TEXT_ROWS = 5_000  # Complaints for the cleaning/chunking/embedding stages
+N_QUERIES = 50
+TOLERANCE = 0.25  # Allowed slowdown before a metric counts as a regression
+
+QUERIES = [
+    "Why was I charged a late fee on my credit card?",
+    "zelle payment never arrived",
+    "BNPL installment taken twice",
+    "interest rate raised without notice",
+    "personal loan I never applied for on my credit report",
+]
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def timed(fn, repeat):
+    """Per-call latencies of ``fn()`` in ms (after one warm-up call)"""
+    fn()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def latency_stats(latencies):
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 4),
+    }
+
+
+def throughput(fn, n_items):
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    return result, round(n_items / seconds, 1)
+
+
+def bench_text_stages(raw, embedder):
+    results = {}
+    narratives = raw["Consumer complaint narrative"].tolist()
+
+    _, rate = throughput(lambda: [clean_text(t) for t in narratives], len(narratives))
+    results["clean_text"] = {"narratives_per_s": rate}
+
+    cleaned, rate = throughput(lambda: clean_narratives(raw.copy()), len(raw))
+    results["clean_narratives"] = {"rows_per_s": rate}
+
+    (_, _, report), rate = throughput(lambda: deduplicate(cleaned), len(cleaned))
+    results["dedup"] = {"rows_per_s": rate, "shrink": report["shrink"]}
+
+    spans, rate = throughput(lambda: chunk_spans(cleaned), len(cleaned))
+    results["chunk_texts"] = {"rows_per_s": rate, "chunks": len(spans)}
+
+    texts = list(spans.texts)
+    vectors, rate = throughput(lambda: embed_in_batches(texts, embedder), len(texts))
+    results["embedding"] = {"chunks_per_s": rate}
+
+    matrix = np.asarray(vectors, dtype="float32")
+    for index_type in ("flat", "hnsw"):
+        _, rate = throughput(lambda: build_index([matrix], index_type), len(matrix))
+        results[f"index_build_{index_type}"] = {"vectors_per_s": rate}
+    return results
+
+
+def bench_retrieval(raw, embedder, n_queries, work_dir):
+    """Build a store for ``raw`` and time the query-side stages"""
+    df = clean_narratives(raw.copy())
+    build_vector_store(df, embedder.model_name, work_dir, embeddings_model=embedder)
+    store = MmapVectorStore.load(work_dir, embedder)
+    cache = RAGCache(max_entries=0)  # measure the work, not the cache
+    queries = iter(QUERIES * n_queries)
+
+    results = {}
+    for mode in ("dense", "hybrid"):
+        latencies = timed(
+            lambda: retrieve_chunks(store, next(queries), cache=cache, mode=mode),
+            n_queries,
+        )
+        results[f"retrieve_{mode}"] = latency_stats(latencies)
+
+    chunks = retrieve_chunks(store, QUERIES[0], cache=cache)
+    results["build_prompt"] = latency_stats(
+        timed(lambda: build_prompt(chunks, QUERIES[0]), n_queries)
+    )
+    results["answer_question"] = latency_stats(
+        timed(lambda: answer_question(next(queries), store, cache=cache), n_queries)
+    )
+    return results
+
+
+def run_suite(sizes=CORPUS_SIZES, n_text_rows=N_TEXT_ROWS, n_queries=N_QUERIES):
+    """``{"meta": ..., "results": {benchmark: {metric: value}}}``"""
+    results = {}
+    with stub_models() as (embedder, _):
+        print(f"Text stages on {n_text_rows} complaints ...")
+        results.update(bench_text_stages(make_complaints(n_text_rows), embedder))
+        for size in sizes:
+            print(f"Query stages on {size} complaints ...")
+            with tempfile.TemporaryDirectory() as work_dir:
+                stages = bench_retrieval(
+                    make_complaints(size, seed=size), embedder, n_queries, work_dir
+                )
+            for name, metrics in stages.items():
+                results[f"{name}@{size}"] = metrics
+
+    meta = {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "sizes": list(sizes),
+        "n_text_rows": n_text_rows,
+        "n_queries": n_queries,
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Regressions of ``results`` against ``baseline`` (both ``run_suite``
+    outputs), as ``(benchmark, metric, baseline, current)`` tuples"""
+    regressions = []
+    for name, metrics in results["results"].items():
+        reference = baseline["results"].get(name, {})
+        for metric, value in metrics.items():
+            before = reference.get(metric)
+            if not before:
+                continue
+            if metric.endswith("_ms") and value > before * (1 + tolerance):
+                regressions.append((name, metric, before, value))
+            elif metric.endswith("_per_s") and value < before * (1 - tolerance):
+                regressions.append((name, metric, before, value))
+    return regressions
+
+
+def format_report(results, baseline=None):
+    rows = ["| benchmark | metric | value | baseline |", "|---|---|---|---|"]
+    for name, metrics in results["results"].items():
+        reference = (baseline or {}).get("results", {}).get(name, {})
+        for metric, value in metrics.items():
+            rows.append(
+                f"| {name} | {metric} | {value} | {reference.get(metric, '')} |"
+            )
+    return "\n".join(rows)
+
+
+def save_json(data, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+# --------------------------------------------
+# MAIN
+# --------------------------------------------
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline RAG micro-benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=CORPUS_SIZES)
+    parser.add_argument("--text-rows", type=int, default=N_TEXT_ROWS)
+    parser.add_argument("--queries", type=int, default=N_QUERIES)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store this run as the baseline instead of comparing",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = run_suite(args.sizes, args.text_rows, args.queries)
+    save_json(results, args.output)
+
+    if args.save_baseline:
+        save_json(results, args.baseline)
+        print(format_report(results))
+        print(f"Saved baseline → {args.baseline}")
+        sys.exit(0)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print(format_report(results, baseline))
+    print(f"Saved results → {args.output}")
+
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; run with --save-baseline first.")
+        sys.exit(0)
+    regressions = compare(results, baseline, args.tolerance)
+    for name, metric, before, value in regressions:
+        print(f"REGRESSION {name} {metric}: {before} → {value}")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {args.tolerance:.0%}.")
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# src/benchmarks/synthetic.py
+
+"""
+Synthetic Corpus and Stub Models for Offline Benchmarks
+
+- ``make_complaints``: CFPB-like complaints (same columns as the raw dump,
+  boilerplate intros, XXXX redactions, mixed case and punctuation, long
+  tail of narrative lengths), fully determined by the seed
+- ``HashingEmbeddings``: deterministic bag-of-words embedder with MiniLM's
+  dimension, so index sizes and search costs are realistic and similar
+  texts still land close together
+- ``StubLLM``: deterministic generator (echoes the start of the context)
+- ``stub_models``: makes ``get_embedder`` / ``get_generator`` return the
+  stubs, so the real pipeline code runs without downloading anything
+"""
+
+import re
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+
+from ..data.data_preprocessing import TARGET_PRODUCTS
+from ..rag import models
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+STUB_ANSWER_WORDS = 40
+
+COMPANIES = [
+    "EQUIFAX, INC.",
+    "Capital One Financial Corporation",
+    "JPMORGAN CHASE & CO.",
+    "BANK OF AMERICA, NATIONAL ASSOCIATION",
+    "Block, Inc.",
+    "Affirm Holdings, Inc",
+    "PayPal Holdings, Inc.",
+    "WELLS FARGO & COMPANY",
+]
+ISSUES = [
+    "Problem with a purchase shown on your statement",
+    "Fees or interest",
+    "Managing an account",
+    "Fraud or scam",
+    "Getting a line of credit",
+    "Problem with a lender or other company charging your account",
+]
+INTROS = [
+    "I am writing to file a complaint about my account. ",
+    "I want to submit this complaint because nobody helped me. ",
+    "",
+    "",
+]
+SENTENCES = [
+    "On XX/XX/XXXX I noticed a charge of ${amount} that I did not make.",
+    "The {company} representative told me the late fee would be removed.",
+    "I sent a Zelle payment to XXXX and the money never arrived!",
+    "My BNPL installment was taken twice from my checking account.",
+    "They raised my interest rate to {rate}% without any notice.",
+    "I disputed the transaction {times} times and was denied each time.",
+    "Customer service kept transferring me and hung up after an hour.",
+    "The savings account was frozen and I could not pay my rent.",
+    "A personal loan I never applied for appeared on my credit report.",
+    "I have attached my bank statements showing the payment was made.",
+    "This is unfair and I want a refund of the overdraft fees.",
+    "My credit card was closed while I was traveling abroad.",
+]
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def make_narrative(rng, company):
+    n_sentences = int(min(rng.geometric(0.12), 60))
+    sentences = [
+        SENTENCES[i].format(
+            amount=int(rng.integers(5, 5000)),
+            company=company,
+            rate=int(rng.integers(10, 36)),
+            times=int(rng.integers(2, 9)),
+        )
+        for i in rng.integers(0, len(SENTENCES), n_sentences)
+    ]
+    return INTROS[int(rng.integers(len(INTROS)))] + " ".join(sentences)
+
+
+def make_complaints(n, seed=0):
+    """``n`` raw complaints with the columns ``data_preprocessing`` reads"""
+    rng = np.random.default_rng(seed)
+    companies = rng.choice(COMPANIES, n)
+    dates = np.datetime64("2020-01-01") + rng.integers(0, 5 * 365, n)
+    return pd.DataFrame(
+        {
+            "Date received": pd.to_datetime(dates).strftime("%Y-%m-%d"),
+            "Product": rng.choice(TARGET_PRODUCTS, n),
+            "Issue": rng.choice(ISSUES, n),
+            "Company": companies,
+            "Consumer complaint narrative": [
+                make_narrative(rng, company) for company in companies
+            ],
+            "Complaint ID": np.arange(1_000_000, 1_000_000 + n),
+        }
+    )
+
+
+class HashingEmbeddings(Embeddings):
+    """Feature-hashed word counts, L2-normalized (deterministic, no model)"""
+
+    model_name = "stub/hashing-embeddings"
+
+    def __init__(self, size=EMBEDDING_DIM):
+        self.size = size
+
+    def _embed(self, text):
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            vector[zlib.crc32(word.encode()) % self.size] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts):
+        return [self._embed(text).tolist() for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text).tolist()
+
+
+class StubLLM(LLM):
+    """Answers with the first words of the prompt's context"""
+
+    n_words: int = STUB_ANSWER_WORDS
+
+    @property
+    def _llm_type(self):
+        return "stub"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        context = prompt.split("Context:", 1)[-1]
+        return " ".join(context.split()[: self.n_words])
+
+
+@contextmanager
+def stub_models(embedder=None, generator=None):
+    """Serve the stubs from ``get_embedder`` / ``get_generator`` meanwhile"""
+    embedder = embedder or HashingEmbeddings()
+    generator = generator or StubLLM()
+    saved = dict(models._embedders), dict(models._generators)
+    models._embedders[models.EMBEDDING_MODEL_NAME] = embedder
+    models._generators[models.GENERATOR_MODEL_NAME] = generator
+    try:
+        yield embedder, generator
+    finally:
+        models.clear_models()
+        models._embedders.update(saved[0])
+        models._generators.update(saved[1])
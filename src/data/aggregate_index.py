@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# src/data/aggregate_index.py
+
+"""
+Precomputed Aggregate Index for Counting Questions
+
+- Built by data_preprocessing.py from the filtered, cleaned complaints
+- ``aggregates_offsets.npy`` / ``aggregates_rows.npy``: for every term and
+  two-word phrase, the complaints (rows) that mention it
+- ``aggregates_complaints.npy``: one row per complaint: complaint ID,
+  product, company and issue codes, day received
+- ``aggregates.json``: vocabulary, product/company/issue names
+- ``count`` answers "how many complaints mention X" for any filter, broken
+  down by product, month, company or issue, with vectorized numpy over the
+  matching rows only: milliseconds, and exact, unlike top-k retrieval
+- Words are lower-cased, stop words and XXXX redactions dropped and a plural
+  ``s`` removed, so "late fees" matches "late fee"; phrases mentioned by
+  fewer than MIN_PHRASE_COUNT complaints are not stored (their words are
+  then matched anywhere in the narrative)
+"""
+
+import json
+import os
+from array import array
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from ..embeddings.chunk_store import (
+    DATE_UNKNOWN,
+    FILTER_KEYS,
+    _as_set,
+    _replace,
+    day_number,
+)
+from ..embeddings.lexical_index import tokenize
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+AGGREGATE_INDEX_DIR = "data/interim/aggregates"
+AGGREGATE_HEADER_FILENAME = "aggregates.json"
+AGGREGATE_OFFSETS_FILENAME = "aggregates_offsets.npy"
+AGGREGATE_ROWS_FILENAME = "aggregates_rows.npy"
+AGGREGATE_COMPLAINTS_FILENAME = "aggregates_complaints.npy"
+FORMAT_VERSION = 1
+
+MIN_PHRASE_COUNT = 5  # Complaints a two-word phrase needs to be stored
+READ_BATCH_SIZE = 100_000  # Parquet rows per batch while building
+FACETS = ("product", "company", "issue")
+FACET_COLUMNS = {"product": "Product", "company": "Company", "issue": "Issue"}
+BREAKDOWNS = FACETS + ("month",)
+
+COMPLAINT_DTYPE = np.dtype(
+    [
+        ("complaint_id", "<i8"),
+        ("product", "<i4"),  # Index into the header's name lists, -1: missing
+        ("company", "<i4"),
+        ("issue", "<i4"),
+        ("date", "<i4"),  # Days since 1970-01-01 (DATE_UNKNOWN if missing)
+    ]
+)
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def normalize(token):
+    """Cheap singular form: ``fees`` -> ``fee`` (``access`` stays)"""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def words(text):
+    return [normalize(token) for token in tokenize(text)]
+
+
+def index_terms(text):
+    """Distinct words and consecutive word pairs of ``text``"""
+    tokens = words(text)
+    return set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+def has_aggregate_index(save_dir):
+    return os.path.exists(os.path.join(save_dir, AGGREGATE_HEADER_FILENAME))
+
+
+def _narratives(df):
+    if "Cleaned Narrative" in df.columns:
+        return df["Cleaned Narrative"]
+    return df["Consumer complaint narrative"]
+
+
+def _day_numbers(df):
+    if "Date received" not in df.columns:
+        return np.full(len(df), DATE_UNKNOWN, dtype=np.int32)
+    dates = pd.to_datetime(df["Date received"], errors="coerce")
+    days = dates.to_numpy(dtype="datetime64[D]").astype(np.int64)
+    days[dates.isna().to_numpy()] = DATE_UNKNOWN
+    return days.astype(np.int32)
+
+
+def build_aggregate_index(frames, save_dir, min_phrase_count=MIN_PHRASE_COUNT):
+    """Index the complaint frames in ``frames`` (batches of one dataset)"""
+    vocabulary = {}
+    term_ids = array("i")
+    row_ids = array("i")
+    names = {facet: {} for facet in FACETS}
+    complaints = []
+    row = 0
+    for df in frames:
+        for text in _narratives(df):
+            for term in index_terms("" if pd.isna(text) else str(text)):
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                row_ids.append(row)
+            row += 1
+
+        part = np.zeros(len(df), dtype=COMPLAINT_DTYPE)
+        part["complaint_id"] = df["Complaint ID"].to_numpy(dtype=np.int64)
+        for facet, column in FACET_COLUMNS.items():
+            if column not in df.columns:
+                part[facet] = -1
+                continue
+            codes = names[facet]
+            part[facet] = [
+                -1 if pd.isna(value) else codes.setdefault(str(value), len(codes))
+                for value in df[column]
+            ]
+        part["date"] = _day_numbers(df)
+        complaints.append(part)
+
+    terms = np.frombuffer(term_ids, dtype=np.int32)
+    rows = np.frombuffer(row_ids, dtype=np.int32)
+    vocabulary = list(vocabulary)
+
+    # Rare phrases take most of the space and are never asked about
+    doc_freq = np.bincount(terms, minlength=len(vocabulary))
+    is_phrase = np.array([" " in term for term in vocabulary], dtype=bool)
+    keep = ~is_phrase | (doc_freq >= min_phrase_count)
+    new_ids = np.cumsum(keep) - 1
+    kept = keep[terms]
+    terms, rows = new_ids[terms[kept]], rows[kept]
+    vocabulary = [term for term, k in zip(vocabulary, keep) if k]
+
+    # Rows were appended in order, so a stable sort keeps them sorted per term
+    order = np.argsort(terms, kind="stable")
+    offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(terms, minlength=len(vocabulary)), out=offsets[1:])
+    table = (
+        np.concatenate(complaints) if complaints else np.zeros(0, dtype=COMPLAINT_DTYPE)
+    )
+
+    os.makedirs(save_dir, exist_ok=True)
+
+    def writer(values):
+        def write(path):
+            with open(path, "wb") as f:
+                np.save(f, values)
+
+        return write
+
+    for filename, values in (
+        (AGGREGATE_OFFSETS_FILENAME, offsets),
+        (AGGREGATE_ROWS_FILENAME, rows[order]),
+        (AGGREGATE_COMPLAINTS_FILENAME, table),
+    ):
+        _replace(os.path.join(save_dir, filename), writer(values))
+
+    def write_header(path):
+        with open(path, "w") as f:
+            header = {
+                "version": FORMAT_VERSION,
+                "count": len(table),
+                "min_phrase_count": min_phrase_count,
+                "vocabulary": vocabulary,
+                **{f"{facet}_names": list(names[facet]) for facet in FACETS},
+            }
+            json.dump(header, f)
+
+    # The header goes last: it marks the index as complete
+    _replace(os.path.join(save_dir, AGGREGATE_HEADER_FILENAME), write_header)
+    print(
+        f"Aggregate index: {len(table)} complaints, {len(vocabulary)} terms "
+        f"→ {save_dir}"
+    )
+    return len(table)
+
+
+def build_aggregate_index_from_file(
+    path, save_dir, batch_size=READ_BATCH_SIZE, min_phrase_count=MIN_PHRASE_COUNT
+):
+    """``build_aggregate_index`` over a cleaned Parquet/CSV file, in batches"""
+    if path.endswith(".parquet"):
+        frames = (
+            batch.to_pandas()
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size)
+        )
+    else:
+        frames = pd.read_csv(path, chunksize=batch_size)
+    return build_aggregate_index(frames, save_dir, min_phrase_count)
+
+
+class AggregateIndex:
+    """Complaint counts for terms and phrases, by product/month/company/issue"""
+
+    def __init__(self, vocabulary, offsets, rows, complaints, names):
+        self.vocabulary = {term: i for i, term in enumerate(vocabulary)}
+        self.offsets = offsets
+        self.rows = rows
+        self.complaints = complaints
+        self.names = names  # facet -> list of names
+
+    @classmethod
+    def from_dir(cls, save_dir, mmap=True):
+        with open(os.path.join(save_dir, AGGREGATE_HEADER_FILENAME)) as f:
+            header = json.load(f)
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported aggregate index version {header['version']}")
+        mmap_mode = "r" if mmap else None
+        offsets, rows, complaints = [
+            np.load(os.path.join(save_dir, filename), mmap_mode=mmap_mode)
+            for filename in (
+                AGGREGATE_OFFSETS_FILENAME,
+                AGGREGATE_ROWS_FILENAME,
+                AGGREGATE_COMPLAINTS_FILENAME,
+            )
+        ]
+        names = {facet: header[f"{facet}_names"] for facet in FACETS}
+        return cls(header["vocabulary"], offsets, rows, complaints, names)
+
+    def __len__(self):
+        return len(self.complaints)
+
+    @property
+    def products(self):
+        return list(self.names["product"])
+
+    def _postings(self, term):
+        term_id = self.vocabulary.get(term)
+        if term_id is None:
+            return None
+        return np.asarray(self.rows[self.offsets[term_id] : self.offsets[term_id + 1]])
+
+    def match(self, phrase):
+        """Sorted rows mentioning ``phrase`` and whether the match is exact
+
+        Phrases are matched pair by pair; when a pair was too rare to be
+        stored, complaints containing all the words count (not exact).
+        """
+        tokens = words(phrase)
+        if not tokens:
+            return None, True
+        pairs = [f"{a} {b}" for a, b in zip(tokens, tokens[1:])] or tokens
+        postings = [self._postings(term) for term in pairs]
+        exact = all(p is not None for p in postings)
+        if not exact:
+            postings = [self._postings(token) for token in tokens]
+            if any(p is None for p in postings):
+                return np.zeros(0, dtype=np.int64), True
+        rows = postings[0]
+        for other in postings[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows.astype(np.int64), exact
+
+    def scope(self, filters=None):
+        """Boolean mask of the complaints matching ``filters`` (the
+        ``retrieve_chunks`` keys: product, company, date_from, date_to)"""
+        filters = filters or {}
+        unknown = set(filters) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError(
+                f"Unknown filter keys {sorted(unknown)}, use {FILTER_KEYS}"
+            )
+        mask = np.ones(len(self.complaints), dtype=bool)
+        for key in ("product", "company"):
+            if filters.get(key) is not None:
+                wanted = _as_set(filters[key])
+                codes = [i for i, name in enumerate(self.names[key]) if name in wanted]
+                mask &= np.isin(self.complaints[key], codes)
+        dates = self.complaints["date"]
+        if filters.get("date_from") is not None:
+            mask &= dates >= day_number(filters["date_from"])
+        if filters.get("date_to") is not None:
+            mask &= (dates != DATE_UNKNOWN) & (dates <= day_number(filters["date_to"]))
+        return mask
+
+    def _labels(self, rows, by):
+        """Breakdown key of each of ``rows`` and the names of the keys"""
+        if by == "month":
+            dates = self.complaints["date"][rows]
+            months = dates.astype("datetime64[D]").astype("datetime64[M]")
+            months = months.astype(np.int64)
+            months[dates == DATE_UNKNOWN] = -1
+            return months
+        return np.asarray(self.complaints[by][rows])
+
+    def _label_name(self, by, code):
+        if code < 0:
+            return "unknown"
+        if by == "month":
+            return str(np.datetime64(int(code), "M"))
+        return self.names[by][code]
+
+    def count(self, phrase=None, filters=None, by=None, n_examples=5):
+        """Complaints mentioning ``phrase`` (all if None) within ``filters``
+
+        Returns ``{"matches", "total", "exact", "breakdown", "examples"}``;
+        ``breakdown`` (for ``by`` in BREAKDOWNS) lists ``(name, matches,
+        total)``: by count for facets, chronologically for months.
+        ``examples`` are the complaint IDs of the latest matches.
+        """
+        if by is not None and by not in BREAKDOWNS:
+            raise ValueError(f"Unknown breakdown {by!r}, use one of {BREAKDOWNS}")
+        in_scope = self.scope(filters)
+        matched, exact = self.match(phrase) if phrase else (None, True)
+        if matched is None:  # No phrase (or only stop words): everything
+            matched = np.flatnonzero(in_scope)
+        else:
+            matched = matched[in_scope[matched]]
+
+        breakdown = []
+        if by is not None:
+            keys, counts = np.unique(self._labels(matched, by), return_counts=True)
+            all_keys, all_counts = np.unique(
+                self._labels(np.flatnonzero(in_scope), by), return_counts=True
+            )
+            totals = dict(zip(all_keys.tolist(), all_counts.tolist()))
+            breakdown = [
+                (self._label_name(by, key), count, totals[key])
+                for key, count in zip(keys.tolist(), counts.tolist())
+            ]
+            if by != "month":
+                breakdown.sort(key=lambda entry: -entry[1])
+
+        latest = np.argsort(-self.complaints["date"][matched], kind="stable")
+        examples = self.complaints["complaint_id"][matched[latest[:n_examples]]]
+        return {
+            "matches": len(matched),
+            "total": int(in_scope.sum()),
+            "exact": exact,
+            "breakdown": breakdown,
+            "examples": [int(cid) for cid in examples],
+        }
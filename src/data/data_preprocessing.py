@@ -9,20 +9,62 @@ Data Preprocessing Script for RAG Complaint Analysis Project
 - Filters data for target products
 - Cleans complaint narratives
 - Saves filtered dataset for downstream RAG pipeline
+- Streaming mode: reads the raw CSV in chunks (only the needed columns)
+  and appends the filtered, cleaned rows to a Parquet file
+- Builds the aggregate index (term/phrase counts by product, month,
+  company and issue) that answers counting questions, see aggregate_index.py
 """
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import matplotlib.pyplot as plt
 import seaborn as sns
+import argparse
 import re
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .aggregate_index import AGGREGATE_INDEX_DIR, build_aggregate_index_from_file
 
 # -------------------------------------------
 # CONFIG
 # -------------------------------------------
 
 RAW_DATA_PATH = "data/raw/complaints.csv"
-OUTPUT_PATH = "data/interim/filtered_complaints.csv"
+OUTPUT_PATH = "data/interim/filtered_complaints.parquet"
+
+READ_CHUNKSIZE = 100_000  # Rows per CSV chunk in streaming mode
+
+# Columns the downstream pipeline actually uses (everything else is skipped)
+USE_COLUMNS = [
+    "Date received",
+    "Product",
+    "Issue",
+    "Company",
+    "Consumer complaint narrative",
+    "Complaint ID",
+]
+
+COLUMN_DTYPES = {
+    "Product": "category",
+    "Issue": "category",
+    "Company": "category",
+    "Consumer complaint narrative": "string",
+    "Complaint ID": "int64",
+}
+
+# Precompiled cleaning patterns (applied in this order)
+BOILERPLATE_PATTERNS = [
+    re.compile(r"i am writing.*?complaint"),
+    re.compile(r"i want to.*?complaint"),
+]
+# Replacing every char outside [a-z0-9\s.,] with a space and then collapsing
+# whitespace is the same as turning each run of chars outside [a-z0-9.,]
+# into one space, which can be done in a single pass.
+DISALLOWED_RUN_PATTERN = re.compile(r"[^a-z0-9.,]+")
+ALLOWED_ASCII = b"abcdefghijklmnopqrstuvwxyz0123456789.,"
+_ASCII_CLEAN_TABLE = bytes(i if i in ALLOWED_ASCII else 32 for i in range(256))
 
 TARGET_PRODUCTS = [
     "Credit card",
@@ -105,52 +147,225 @@ def filter_data(df, target_products):
     return filtered
 
 
+def _collapse_disallowed(text):
+    """Turn runs of non-alphanumeric chars (and whitespace) into one space"""
+    if text.isascii():
+        # Fast path: byte-level translate + split, no regex
+        cleaned = text.encode("ascii").translate(_ASCII_CLEAN_TABLE)
+        return b" ".join(cleaned.split()).decode("ascii")
+    return DISALLOWED_RUN_PATTERN.sub(" ", text).strip()
+
+
 def clean_text(text):
     """Perform basic cleaning on complaint narrative"""
     text = text.lower()
     # Remove common boilerplate intro patterns
-    text = re.sub(r"i am writing.*?complaint", "", text)
-    text = re.sub(r"i want to.*?complaint", "", text)
+    for pattern in BOILERPLATE_PATTERNS:
+        text = pattern.sub("", text)
     # Remove non-alphanumeric characters except basic punctuation
-    text = re.sub(r"[^a-z0-9\s.,]", " ", text)
-    # Collapse multiple spaces
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
-
-
-def clean_narratives(df):
-    """Apply cleaning to the narrative text"""
-    df["Cleaned Narrative"] = df["Consumer complaint narrative"].apply(clean_text)
+    # and collapse multiple spaces
+    return _collapse_disallowed(text)
+
+
+def clean_series(series):
+    """Column-wise equivalent of ``clean_text`` (same output, fewer passes)"""
+    series = series.str.lower()
+    for pattern in BOILERPLATE_PATTERNS:
+        series = series.str.replace(pattern, "", regex=True)
+    return series.map(_collapse_disallowed, na_action="ignore")
+
+
+def _split_bounds(n_rows, n_parts):
+    step, extra = divmod(n_rows, n_parts)
+    start = 0
+    for i in range(n_parts):
+        stop = start + step + (1 if i < extra else 0)
+        yield start, stop
+        start = stop
+
+
+def _resolve_jobs(n_jobs):
+    return (os.cpu_count() or 1) if n_jobs == -1 else n_jobs
+
+
+def _clean_series_parallel(series, n_jobs, executor=None):
+    """Split a text column across worker processes and clean each part
+
+    Uses ``executor`` if given (left running), else a pool of its own.
+    """
+    parts = [
+        series.iloc[start:stop]
+        for start, stop in _split_bounds(len(series), n_jobs)
+        if stop > start
+    ]
+    if executor is not None:
+        return pd.concat(list(executor.map(clean_series, parts)))
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        cleaned = list(executor.map(clean_series, parts))
+    return pd.concat(cleaned)
+
+
+def clean_narratives(df, n_jobs=1, executor=None):
+    """Apply cleaning to the narrative text
+
+    ``n_jobs > 1`` cleans the column in a process pool (``-1`` = all cores);
+    pass ``executor`` to reuse one pool across calls.
+    """
+    narratives = df["Consumer complaint narrative"]
+    n_jobs = _resolve_jobs(n_jobs)
+    if n_jobs > 1 and len(narratives) > n_jobs:
+        df["Cleaned Narrative"] = _clean_series_parallel(narratives, n_jobs, executor)
+    else:
+        df["Cleaned Narrative"] = clean_series(narratives)
     return df
 
 
 def save_filtered_data(df, path):
-    """Save cleaned dataframe to CSV"""
+    """Save cleaned dataframe to Parquet or CSV (chosen by file extension)"""
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    df.to_csv(path, index=False)
+    if path.endswith(".parquet"):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
     print(f"Saved cleaned data → {path}")
 
 
+def _normalize_chunk_dtypes(df, target_products):
+    """Give every chunk the same column types so Parquet row groups match"""
+    df["Product"] = df["Product"].astype(pd.CategoricalDtype(target_products))
+    for col in ("Issue", "Company"):
+        if col in df.columns:
+            df[col] = df[col].astype("string")
+    if "Date received" in df.columns:
+        df["Date received"] = pd.to_datetime(df["Date received"], errors="coerce")
+    return df
+
+
+def stream_filtered_data(
+    path,
+    target_products,
+    output_path,
+    chunksize=READ_CHUNKSIZE,
+    clean=True,
+    n_jobs=1,
+):
+    """Filter + clean the raw CSV chunk by chunk and write it as Parquet.
+
+    Only USE_COLUMNS are parsed, so peak memory is bounded by ``chunksize``
+    rather than by the size of the CFPB dump. With ``n_jobs > 1`` one
+    process pool cleans every chunk.
+    """
+    print(f"Streaming data from {path} (chunksize={chunksize}) ...")
+    reader = pd.read_csv(
+        path,
+        usecols=lambda col: col in USE_COLUMNS,
+        dtype=COLUMN_DTYPES,
+        chunksize=chunksize,
+    )
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    writer = None
+    n_read = 0
+    n_written = 0
+    filtered = None
+    n_jobs = _resolve_jobs(n_jobs)
+    executor = ProcessPoolExecutor(max_workers=n_jobs) if clean and n_jobs > 1 else None
+    try:
+        for chunk in reader:
+            n_read += len(chunk)
+            mask = (
+                chunk["Product"].isin(target_products)
+                & chunk["Consumer complaint narrative"].notna()
+            )
+            filtered = _normalize_chunk_dtypes(chunk[mask].copy(), target_products)
+            if filtered.empty:
+                continue
+            if clean:
+                filtered = clean_narratives(filtered, n_jobs, executor)
+
+            table = pa.Table.from_pandas(filtered, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table)
+            n_written += len(filtered)
+    finally:
+        if writer is not None:
+            writer.close()
+        if executor is not None:
+            executor.shutdown()
+
+    if writer is None and filtered is not None:
+        # Nothing matched: still leave a valid (empty) file for downstream
+        # steps, with the columns a written chunk has
+        if clean:
+            filtered = clean_narratives(filtered)
+        filtered.to_parquet(output_path, index=False)
+
+    print(f"Read {n_read} rows, kept {n_written} rows.")
+    print(f"Saved cleaned data → {output_path}")
+    return n_written
+
+
 # -------------------------------------------
 # MAIN SCRIPT
 # -------------------------------------------
 
-if __name__ == "__main__":
-    # Load data
-    df = load_data(RAW_DATA_PATH)
-
-    # EDA
-    plot_product_distribution(df)
-    analyze_narrative_lengths(df)
-    count_narrative_presence(df)
 
-    # Filtering
-    df_filtered = filter_data(df, TARGET_PRODUCTS)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Preprocess CFPB complaints")
+    parser.add_argument("--input", default=RAW_DATA_PATH)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--chunksize", type=int, default=READ_CHUNKSIZE)
+    parser.add_argument(
+        "--n-jobs",
+        type=int,
+        default=1,
+        help="Worker processes for narrative cleaning (-1 = all cores)",
+    )
+    parser.add_argument(
+        "--aggregates",
+        default=AGGREGATE_INDEX_DIR,
+        help="Aggregate index directory for counting questions ('' skips it)",
+    )
+    parser.add_argument(
+        "--eda",
+        action="store_true",
+        help="Load the full CSV in memory and produce EDA plots",
+    )
+    return parser.parse_args()
 
-    # Clean narratives
-    df_cleaned = clean_narratives(df_filtered)
 
-    # Save output
-    save_filtered_data(df_cleaned, OUTPUT_PATH)
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.eda:
+        # Load data
+        df = load_data(args.input)
+
+        # EDA
+        plot_product_distribution(df)
+        analyze_narrative_lengths(df)
+        count_narrative_presence(df)
+
+        # Filtering
+        df_filtered = filter_data(df, TARGET_PRODUCTS)
+
+        # Clean narratives
+        df_cleaned = clean_narratives(df_filtered, n_jobs=args.n_jobs)
+
+        # Save output
+        save_filtered_data(df_cleaned, args.output)
+    else:
+        # Stream + filter + clean chunk by chunk (bounded memory)
+        stream_filtered_data(
+            args.input,
+            TARGET_PRODUCTS,
+            args.output,
+            chunksize=args.chunksize,
+            n_jobs=args.n_jobs,
+        )
+
+    if args.aggregates:
+        build_aggregate_index_from_file(args.output, args.aggregates)
 
     print("✅ Data preprocessing complete.")
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# src/embeddings/chunk_store.py
+
+"""
+Memory-Mapped Chunk Store
+
+- Replaces the pickled LangChain docstore (``index.pkl``): nothing is
+  unpickled at load time
+- ``chunks.npy``: one fixed-width row per chunk, sorted by FAISS label
+  (complaint_id, chunk number, character offsets, product code and where
+  the chunk text sits in ``chunks.bin``)
+- ``chunks.bin``: all chunk texts, UTF-8, back to back
+- ``chunks.json``: product and company names, format version and a build
+  id that changes on every rebuild/update (lets caches detect new data)
+- ``select`` turns metadata filters (product, company, date range) into the
+  FAISS labels they match, so filters can be applied inside the search
+- Table and texts are memory-mapped, so opening the store reads nothing and
+  every process serving the same store shares one copy in the OS page cache
+- Incremental builds patch the store (``patch_chunk_store``): kept rows are
+  copied as they are and only the new chunks' texts are appended; the text
+  file is compacted once more than half of it is dead
+"""
+
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from langchain_core.documents import Document
+
+from .chunker import ChunkSpans
+from .manifest import chunk_id
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+CHUNK_TABLE_FILENAME = "chunks.npy"
+CHUNK_TEXT_FILENAME = "chunks.bin"
+CHUNK_HEADER_FILENAME = "chunks.json"
+FORMAT_VERSION = 1
+MAX_DEAD_TEXT = 0.5  # Compact chunks.bin when more of it belongs to no chunk
+COPY_BLOCK = 64 * 2**20  # Bytes of chunks.bin copied at a time
+
+CHUNK_DTYPE = np.dtype(
+    [
+        ("label", "<i8"),  # FAISS id of the chunk's vector
+        ("complaint_id", "<i8"),
+        ("number", "<i4"),  # n-th chunk of its complaint
+        ("start", "<i4"),  # Character offsets into the narrative
+        ("end", "<i4"),
+        ("product", "<i4"),  # Index into the header's product list
+        ("company", "<i4"),  # Index into the header's company list
+        ("date", "<i4"),  # Days since 1970-01-01 the complaint was received
+        ("text_offset", "<i8"),  # Byte range of the text in chunks.bin
+        ("text_length", "<i4"),
+    ]
+)
+
+DATE_UNKNOWN = -1
+FILTER_KEYS = ("product", "company", "date_from", "date_to")
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def day_number(date):
+    """``"2023-05-01"`` -> days since 1970-01-01 (DATE_UNKNOWN if missing)"""
+    if date is None or date != date:  # None / NaN
+        return DATE_UNKNOWN
+    return int(np.datetime64(str(date)[:10], "D").astype(np.int64))
+
+
+def check_filters(filter):
+    """Raise ValueError for unknown keys or dates ``day_number`` can't read"""
+    unknown = set(filter or {}) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown filter keys {sorted(unknown)}, use {FILTER_KEYS}")
+    for key in ("date_from", "date_to"):
+        try:
+            day_number((filter or {}).get(key))
+        except ValueError:
+            raise ValueError(f"Bad {key} {filter[key]!r}, use YYYY-MM-DD") from None
+
+
+def _as_set(value):
+    return {value} if isinstance(value, str) else set(value)
+
+
+def has_chunk_store(save_dir):
+    return os.path.exists(os.path.join(save_dir, CHUNK_HEADER_FILENAME))
+
+
+def build_chunk_table(docs, labels=None):
+    """Chunk rows, concatenated UTF-8 texts and the product vocabulary
+
+    ``labels`` are the FAISS ids of ``docs`` (default: their positions).
+    """
+    labels = np.arange(len(docs)) if labels is None else np.asarray(labels)
+    if isinstance(docs, ChunkSpans):
+        return _span_chunk_table(docs, labels)
+    table = np.zeros(len(docs), dtype=CHUNK_DTYPE)
+    products = {}
+    companies = {}
+    numbers = {}
+    encoded = []
+    offset = 0
+    for i, doc in enumerate(docs):
+        meta = doc.metadata
+        cid = int(meta["complaint_id"])
+        text = doc.page_content.encode("utf-8")
+        table[i] = (
+            labels[i],
+            cid,
+            numbers.get(cid, 0),
+            meta.get("start", -1),
+            meta.get("end", -1),
+            products.setdefault(meta.get("product"), len(products)),
+            companies.setdefault(meta.get("company"), len(companies)),
+            day_number(meta.get("date_received")),
+            offset,
+            len(text),
+        )
+        numbers[cid] = numbers.get(cid, 0) + 1
+        encoded.append(text)
+        offset += len(text)
+
+    order = np.argsort(table["label"], kind="stable")
+    return table[order], b"".join(encoded), list(products), list(companies)
+
+
+def _span_chunk_table(spans, labels):
+    """``build_chunk_table`` for a ``ChunkSpans``, column by column"""
+    encoded = [text.encode("utf-8") for text in spans.texts]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    product_codes, products = pd.factorize(spans.products, use_na_sentinel=False)
+    company_codes, companies = pd.factorize(spans.companies, use_na_sentinel=False)
+
+    table = np.zeros(len(spans), dtype=CHUNK_DTYPE)
+    table["label"] = labels
+    table["complaint_id"] = spans.complaint_ids
+    table["number"] = spans.numbers
+    table["start"] = spans.starts
+    table["end"] = spans.ends
+    table["product"] = product_codes
+    table["company"] = company_codes
+    table["date"] = spans.dates
+    table["text_offset"] = np.cumsum(lengths) - lengths
+    table["text_length"] = lengths
+
+    order = np.argsort(table["label"], kind="stable")
+    return (
+        table[order],
+        b"".join(encoded),
+        [_json_name(p) for p in products],
+        [_json_name(c) for c in companies],
+    )
+
+
+def _json_name(value):
+    return None if value is None or value != value else value
+
+
+def _replace(path, write):
+    # Readers may have the old file mapped: write a new file and swap it in,
+    # never overwrite in place
+    tmp_path = path + ".tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def write_chunk_store(save_dir, docs, labels=None):
+    table, texts, products, companies = build_chunk_table(docs, labels)
+    os.makedirs(save_dir, exist_ok=True)
+
+    def write_texts(path):
+        with open(path, "wb") as f:
+            f.write(texts)
+
+    _write_chunk_files(save_dir, table, write_texts, products, companies)
+
+
+def _merge_names(names, extra, codes):
+    """``names`` + the new ones of ``extra``; ``codes`` (into ``extra``)
+    translated into the merged list"""
+    merged = list(names)
+    positions = {name: i for i, name in enumerate(merged)}
+    mapping = np.zeros(max(len(extra), 1), dtype=np.int64)
+    for i, name in enumerate(extra):
+        if name not in positions:
+            positions[name] = len(merged)
+            merged.append(name)
+        mapping[i] = positions[name]
+    return merged, mapping[codes]
+
+
+def _drop_unused(names, codes):
+    """Names still referenced by ``codes``, and the codes renumbered"""
+    used, codes = np.unique(codes, return_inverse=True)
+    return [names[i] for i in used], codes.reshape(-1)
+
+
+def patch_chunk_store(save_dir, chunks, keep, kept_labels, docs, new_labels):
+    """Incremental ``write_chunk_store``: rows ``keep`` (a mask) of the
+    current ``chunks`` get ``kept_labels``, ``docs`` are appended with
+    ``new_labels`` (all larger)
+
+    Kept rows are copied column-wise and their texts stay where they are in
+    ``chunks.bin``; only the new texts are encoded. Returns the row of every
+    old row in the new table (-1: dropped).
+    """
+    table = np.array(chunks.table[keep])
+    table["label"] = kept_labels
+    new_table, new_texts, products, companies = build_chunk_table(docs, new_labels)
+
+    live_bytes = int(table["text_length"].sum())
+    compact = live_bytes < (1 - MAX_DEAD_TEXT) * len(chunks.texts)
+    if compact:
+        starts, lengths = table["text_offset"].copy(), table["text_length"]
+        table["text_offset"] = np.cumsum(lengths) - lengths
+    new_table["text_offset"] += live_bytes if compact else len(chunks.texts)
+
+    for key, names, extra in (
+        ("product", chunks.products, products),
+        ("company", chunks.companies, companies),
+    ):
+        merged, new_table[key] = _merge_names(names, extra, new_table[key])
+        codes = np.concatenate([table[key], new_table[key]])
+        merged, codes = _drop_unused(merged, codes)
+        table[key], new_table[key] = codes[: len(table)], codes[len(table) :]
+        if key == "product":
+            products = merged
+        else:
+            companies = merged
+    table = np.concatenate([table, new_table])
+
+    def write_texts(path):
+        with open(path, "wb") as f:
+            if compact:
+                for start, length in zip(starts, lengths):
+                    f.write(chunks.texts[start : start + length].tobytes())
+            else:
+                for start in range(0, len(chunks.texts), COPY_BLOCK):
+                    f.write(chunks.texts[start : start + COPY_BLOCK].tobytes())
+            f.write(new_texts)
+
+    _write_chunk_files(save_dir, table, write_texts, products, companies)
+    rows = np.full(len(chunks.table), -1, dtype=np.int64)
+    rows[np.flatnonzero(keep)] = np.arange(int(np.count_nonzero(keep)))
+    return rows
+
+
+def _write_chunk_files(save_dir, table, write_texts, products, companies):
+    def write_table(path):
+        with open(path, "wb") as f:
+            np.save(f, table)
+
+    def write_header(path):
+        with open(path, "w") as f:
+            header = {
+                "version": FORMAT_VERSION,
+                "count": len(table),
+                "products": products,
+                "companies": companies,
+                "build_id": uuid.uuid4().hex,
+            }
+            json.dump(header, f)
+
+    _replace(os.path.join(save_dir, CHUNK_TABLE_FILENAME), write_table)
+    _replace(os.path.join(save_dir, CHUNK_TEXT_FILENAME), write_texts)
+    # The header goes last: it marks the store as complete
+    _replace(os.path.join(save_dir, CHUNK_HEADER_FILENAME), write_header)
+
+
+class ChunkStore:
+    """Read-only access to chunk texts and metadata by FAISS label"""
+
+    def __init__(self, table, texts, products, companies, build_id=None):
+        self.table = table
+        self.texts = texts
+        self.products = products
+        self.companies = companies
+        self.build_id = build_id
+        # Flat indexes label chunks 0..n-1, which makes lookups positional
+        self._positional = len(table) == 0 or (
+            table["label"][0] == 0 and table["label"][-1] == len(table) - 1
+        )
+
+    @classmethod
+    def from_dir(cls, save_dir, mmap=True):
+        with open(os.path.join(save_dir, CHUNK_HEADER_FILENAME)) as f:
+            header = json.load(f)
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported chunk store version {header['version']}")
+
+        table = np.load(
+            os.path.join(save_dir, CHUNK_TABLE_FILENAME),
+            mmap_mode="r" if mmap else None,
+        )
+        text_path = os.path.join(save_dir, CHUNK_TEXT_FILENAME)
+        if os.path.getsize(text_path) == 0:
+            texts = np.zeros(0, dtype=np.uint8)
+        elif mmap:
+            texts = np.memmap(text_path, dtype=np.uint8, mode="r")
+        else:
+            texts = np.fromfile(text_path, dtype=np.uint8)
+        return cls(
+            table,
+            texts,
+            header["products"],
+            header["companies"],
+            header.get("build_id"),
+        )
+
+    def __len__(self):
+        return len(self.table)
+
+    def rows_for_labels(self, labels):
+        """Row positions of FAISS labels (-1 where a label is unknown)"""
+        labels = np.asarray(labels, dtype=np.int64)
+        if self._positional:
+            rows = labels.copy()
+            rows[(labels < 0) | (labels >= len(self.table))] = -1
+            return rows
+        rows = np.searchsorted(self.table["label"], labels)
+        rows = np.minimum(rows, len(self.table) - 1)
+        rows[self.table["label"][rows] != labels] = -1
+        return rows
+
+    def select(self, filter):
+        """Sorted FAISS labels of the chunks matching ``filter``
+
+        ``filter`` keys: ``product`` / ``company`` (a name or a list of
+        names), ``date_from`` / ``date_to`` (inclusive ``YYYY-MM-DD``).
+        ``None`` values are ignored.
+        """
+        check_filters(filter)
+        mask = np.ones(len(self.table), dtype=bool)
+        for key, names in (("product", self.products), ("company", self.companies)):
+            if filter.get(key) is not None:
+                wanted = _as_set(filter[key])
+                codes = [code for code, name in enumerate(names) if name in wanted]
+                mask &= np.isin(self.table[key], codes)
+        if filter.get("date_from") is not None:
+            mask &= self.table["date"] >= day_number(filter["date_from"])
+        if filter.get("date_to") is not None:
+            dates = self.table["date"]
+            mask &= (dates != DATE_UNKNOWN) & (dates <= day_number(filter["date_to"]))
+        return np.asarray(self.table["label"][mask])
+
+    def text(self, row):
+        entry = self.table[row]
+        start = int(entry["text_offset"])
+        data = self.texts[start : start + int(entry["text_length"])]
+        return data.tobytes().decode("utf-8")
+
+    def document(self, row):
+        entry = self.table[row]
+        cid = int(entry["complaint_id"])
+        metadata = {
+            "complaint_id": cid,
+            "product": self.products[int(entry["product"])],
+            "start": int(entry["start"]),
+            "end": int(entry["end"]),
+        }
+        company = self.companies[int(entry["company"])]
+        if company is not None:
+            metadata["company"] = company
+        if entry["date"] != DATE_UNKNOWN:
+            metadata["date_received"] = str(np.datetime64(int(entry["date"]), "D"))
+        return Document(
+            id=chunk_id(cid, int(entry["number"])),
+            page_content=self.text(row),
+            metadata=metadata,
+        )
+
+    def documents(self, rows=None):
+        rows = range(len(self.table)) if rows is None else rows
+        return [self.document(int(row)) for row in rows]
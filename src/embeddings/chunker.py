@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# src/embeddings/chunker.py
+
+"""
+Offset-Based Narrative Chunker
+
+- Produces the same chunks as LangChain's ``RecursiveCharacterTextSplitter``
+  (separators ``\\n\\n``, ``\\n``, ``.``, space, character; separators kept
+  at the start of the next piece; whitespace stripped), but works on
+  character offsets: no intermediate strings and no ``Document`` per chunk
+- A chunked corpus is a ``ChunkSpans``: compact arrays of (row, start, end)
+  into the narratives of the frame, plus per-row complaint ID, product,
+  company and date; chunk texts are sliced out only when something reads
+  them (``spans.texts[i:j]``, e.g. one embedding shard at a time)
+- Large frames are split across worker processes
+- Offsets are the true positions of the chunks; LangChain searches for each
+  chunk text again (``str.find``) and can report an earlier copy of it in
+  highly repetitive text
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from langchain_core.documents import Document
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+SEPARATORS = ("\n\n", "\n", ".", " ", "")
+
+CHUNK_WORKERS = int(os.environ.get("RAG_CHUNK_WORKERS", "0"))  # 0: all cores
+MIN_ROWS_PER_WORKER = 20_000  # Smaller frames are chunked in-process
+DATE_UNKNOWN = -1
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def _strip(text, start, end):
+    """Offsets of ``text[start:end].strip()``"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _pieces(text, start, end, separator):
+    """``re.split`` with the separator kept at the start of each piece"""
+    if not separator:
+        return [(i, i + 1) for i in range(start, end)]
+    pieces = []
+    previous = start
+    found = text.find(separator, start, end)
+    while found != -1:
+        if found > previous:
+            pieces.append((previous, found))
+        previous = found
+        found = text.find(separator, found + len(separator), end)
+    if end > previous:
+        pieces.append((previous, end))
+    return pieces
+
+
+def _merge(text, pieces, chunk_size, chunk_overlap, out):
+    """Greedily join consecutive pieces into chunks of at most
+    ``chunk_size`` characters, carrying up to ``chunk_overlap`` over"""
+    first = 0  # current chunk: pieces[first:i]
+    total = 0
+    for i, (start, end) in enumerate(pieces):
+        length = end - start
+        if total + length > chunk_size and i > first:
+            _emit(text, pieces[first][0], pieces[i - 1][1], out)
+            while total > chunk_overlap or (total + length > chunk_size and total > 0):
+                total -= pieces[first][1] - pieces[first][0]
+                first += 1
+        total += length
+    if first < len(pieces):
+        _emit(text, pieces[first][0], pieces[-1][1], out)
+
+
+def _emit(text, start, end, out):
+    start, end = _strip(text, start, end)
+    if end > start:
+        out.append((start, end))
+
+
+def _split(text, start, end, separators, chunk_size, chunk_overlap, out):
+    separator = separators[-1]
+    rest = ()
+    for i, candidate in enumerate(separators):
+        if not candidate:
+            separator = candidate
+            break
+        if text.find(candidate, start, end) != -1:
+            separator = candidate
+            rest = separators[i + 1 :]
+            break
+
+    good = []
+    for piece in _pieces(text, start, end, separator):
+        if piece[1] - piece[0] < chunk_size:
+            good.append(piece)
+            continue
+        if good:
+            _merge(text, good, chunk_size, chunk_overlap, out)
+            good = []
+        if rest:
+            _split(text, piece[0], piece[1], rest, chunk_size, chunk_overlap, out)
+        else:
+            out.append(piece)  # LangChain keeps these unstripped
+    if good:
+        _merge(text, good, chunk_size, chunk_overlap, out)
+
+
+def split_offsets(text, chunk_size=300, chunk_overlap=50, separators=SEPARATORS):
+    """``(start, end)`` of every chunk of ``text``"""
+    out = []
+    _split(text, 0, len(text), tuple(separators), chunk_size, chunk_overlap, out)
+    return out
+
+
+def _split_batch(texts, chunk_size, chunk_overlap):
+    """Chunks per text and their offsets, as arrays (cheap to send back)"""
+    counts = np.zeros(len(texts), dtype=np.int32)
+    offsets = []
+    for i, text in enumerate(texts):
+        spans = split_offsets(text, chunk_size, chunk_overlap)
+        counts[i] = len(spans)
+        offsets.extend(spans)
+    offsets = np.array(offsets, dtype=np.int32).reshape(-1, 2)
+    return counts, offsets
+
+
+def _worker_count(n_rows, n_workers):
+    n_workers = n_workers or CHUNK_WORKERS or os.cpu_count() or 1
+    return max(1, min(n_workers, n_rows // MIN_ROWS_PER_WORKER))
+
+
+def _day_numbers(values):
+    dates = pd.to_datetime(pd.Series(values), errors="coerce")
+    days = dates.to_numpy(dtype="datetime64[D]").astype(np.int64)
+    days[dates.isna().to_numpy()] = DATE_UNKNOWN
+    return days
+
+
+def chunk_spans(df, chunk_size=300, chunk_overlap=50, n_workers=None):
+    """Chunk the cleaned narratives of ``df`` into a ``ChunkSpans``
+
+    ``n_workers`` processes split the narratives (default: RAG_CHUNK_WORKERS,
+    else all cores; frames under MIN_ROWS_PER_WORKER rows per worker stay
+    in-process).
+    """
+    narratives = [str(text) for text in df["Cleaned Narrative"]]
+    n_workers = _worker_count(len(narratives), n_workers)
+    if n_workers == 1:
+        counts, offsets = _split_batch(narratives, chunk_size, chunk_overlap)
+    else:
+        bounds = np.linspace(0, len(narratives), n_workers * 4 + 1).astype(int)
+        batches = [narratives[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(
+                pool.map(
+                    _split_batch,
+                    batches,
+                    [chunk_size] * len(batches),
+                    [chunk_overlap] * len(batches),
+                )
+            )
+        counts = np.concatenate([counts for counts, _ in results])
+        offsets = np.concatenate([offsets for _, offsets in results])
+
+    companies = None
+    if "Company" in df.columns:
+        companies = df["Company"].astype(object).where(df["Company"].notna())
+        companies = companies.to_numpy()
+    dates = None
+    if "Date received" in df.columns:
+        dates = _day_numbers(df["Date received"].to_numpy())
+
+    spans = ChunkSpans(
+        narratives,
+        np.repeat(np.arange(len(narratives), dtype=np.int32), counts),
+        offsets[:, 0],
+        offsets[:, 1],
+        df["Complaint ID"].to_numpy(dtype=np.int64),
+        df["Product"].astype(object).to_numpy(),
+        companies,
+        dates,
+    )
+    print(f"Created {len(spans)} text chunks.")
+    return spans
+
+
+class SpanTexts:
+    """Sequence view of the chunk texts, sliced out on access"""
+
+    def __init__(self, spans):
+        self.spans = spans
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self.spans.text(i) for i in range(*item.indices(len(self)))]
+        return self.spans.text(item)
+
+    def __iter__(self):
+        return (self.spans.text(i) for i in range(len(self)))
+
+
+class ChunkSpans:
+    """Chunks of a complaints frame as offsets into its narratives
+
+    ``rows``/``starts``/``ends`` have one entry per chunk (in narrative
+    order); ``complaint_ids``, ``products``, ``companies`` and ``dates``
+    (days since 1970-01-01, DATE_UNKNOWN if missing) one per frame row.
+    Iterating yields LangChain ``Document``s, built one at a time.
+    """
+
+    def __init__(
+        self,
+        narratives,
+        rows,
+        starts,
+        ends,
+        complaint_ids,
+        products,
+        companies=None,
+        dates=None,
+    ):
+        self.narratives = narratives
+        self.rows = rows
+        self.starts = starts
+        self.ends = ends
+        self.row_complaint_ids = complaint_ids
+        self.row_products = products
+        self.row_companies = companies
+        self.row_dates = dates
+        self.texts = SpanTexts(self)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def complaint_ids(self):
+        return self.row_complaint_ids[self.rows]
+
+    @property
+    def products(self):
+        return self.row_products[self.rows]
+
+    @property
+    def companies(self):
+        if self.row_companies is None:
+            return np.full(len(self), None, dtype=object)
+        return self.row_companies[self.rows]
+
+    @property
+    def dates(self):
+        if self.row_dates is None:
+            return np.full(len(self), DATE_UNKNOWN, dtype=np.int64)
+        return self.row_dates[self.rows]
+
+    @property
+    def numbers(self):
+        """n-th chunk of its complaint (chunks of a row are consecutive)"""
+        first = np.searchsorted(self.rows, self.rows, side="left")
+        return np.arange(len(self)) - first
+
+    def text(self, i):
+        start, end = self.starts[i], self.ends[i]
+        return self.narratives[self.rows[i]][start:end]
+
+    def document(self, i):
+        row = self.rows[i]
+        metadata = {
+            "complaint_id": int(self.row_complaint_ids[row]),
+            "product": self.row_products[row],
+            "start": int(self.starts[i]),
+            "end": int(self.ends[i]),
+        }
+        if self.row_companies is not None and pd.notna(self.row_companies[row]):
+            metadata["company"] = self.row_companies[row]
+        if self.row_dates is not None and self.row_dates[row] != DATE_UNKNOWN:
+            day = np.datetime64(int(self.row_dates[row]), "D")
+            metadata["date_received"] = str(day)
+        return Document(page_content=self.text(i), metadata=metadata)
+
+    def __getitem__(self, i):
+        return self.document(i)
+
+    def __iter__(self):
+        return (self.document(i) for i in range(len(self)))
+
+    def documents(self):
+        return list(self)
@@ -5,31 +5,98 @@
 Vector Store Creation Script for RAG Complaint Analysis
 
 - Loads cleaned complaint narratives
-- Splits text into chunks for efficient embeddings
+- Splits text into chunks for efficient embeddings, as character offsets
+  into the narratives (see chunker.py)
 - Embeds each chunk using SentenceTransformers
-- Stores embeddings + metadata in a FAISS vector database
+- Stores embeddings in a FAISS index and chunk texts + metadata in a
+  memory-mapped chunk store (see mmap_store.py / chunk_store.py)
+- Stores each full narrative once in a side table (see document_store.py);
+  chunks only reference it by complaint_id + character offsets
+- Incremental mode: embeds only new/changed complaints and removes deleted
+  ones, using the manifest written by the previous build (see manifest.py)
+- Sharded mode: partitions complaints into N independent stores, served by
+  one worker process each (see sharded_store.py)
+- Optional near-duplicate detection: one complaint per cluster of
+  templated / copy-pasted narratives is embedded (see dedup.py)
 """
 
+import argparse
 import os
+import shutil
+
+import faiss
+import numpy as np
 import pandas as pd
-from tqdm import tqdm
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain.docstore.document import Document
+from .embedding_stage import (
+    EMBED_BATCH_SIZE,
+    SHARD_SIZE,
+    embed_in_batches,
+    embed_to_shards,
+    iter_shards,
+    load_embeddings_model,
+)
+from .index_factory import (
+    DEFAULT_INDEX_PARAMS,
+    DEFAULT_STORAGE,
+    INDEX_TYPES,
+    STORAGE_TYPES,
+    build_index,
+    read_index,
+    resolve_params,
+)
+from .chunk_store import ChunkStore, has_chunk_store
+from .chunker import ChunkSpans, chunk_spans
+from .mmap_store import (
+    INDEX_FILENAME,
+    VECTORS_FILENAME,
+    MmapVectorStore,
+    save_store,
+    update_store,
+)
+from .embedding_cache import EMBEDDING_CACHE_PATH, with_cache
+from .sharded_store import (
+    PARTITIONS,
+    SHARDS_FILENAME,
+    assign_shards,
+    load_layout,
+    save_layout,
+    shard_dir,
+)
+from ..rag.onnx_backend import BACKENDS, with_backend
+from .dedup import (
+    DEDUP,
+    DEDUP_REPORT_FILENAME,
+    DEDUP_THRESHOLD,
+    deduplicate,
+    duplicate_map,
+    save_dedup_report,
+)
+from .document_store import save_document_store, update_document_store
+from .manifest import (
+    build_manifest,
+    clustered_ids,
+    compute_hashes,
+    diff_manifest,
+    is_compatible,
+    load_manifest,
+    save_manifest,
+)
 
 # --------------------------------------------
 # CONFIG
 # --------------------------------------------
 
-INPUT_CSV_PATH = "data/interim/filtered_complaints.csv"
+INPUT_DATA_PATH = "data/interim/filtered_complaints.parquet"
 VECTOR_STORE_DIR = "vector_store/faiss_index"
 
 CHUNK_SIZE = 300  # Experimented and chosen for short narratives
 CHUNK_OVERLAP = 50  # Small overlap preserves context between chunks
 
 EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BACKEND = os.environ.get("RAG_BACKEND", "torch")  # or "onnx" (int8)
+
+SHARDS_DIRNAME = "embedding_shards"  # Resumable work dir inside the store dir
 
 # --------------------------------------------
 # FUNCTIONS
@@ -38,59 +105,482 @@ EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 
 def load_cleaned_data(path):
     print(f"Loading cleaned complaints data from {path} ...")
-    df = pd.read_csv(path)
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path)
     print(f"Loaded {df.shape[0]} rows.")
     return df
 
 
 def chunk_texts(df, chunk_size=300, chunk_overlap=50):
-    """Split narratives into overlapping chunks"""
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        separators=["\n\n", "\n", ".", " ", ""],
-    )
-
-    documents = []
-    for idx, row in tqdm(df.iterrows(), total=len(df), desc="Chunking narratives"):
-        text = str(row["Cleaned Narrative"])
-        chunks = splitter.split_text(text)
-
-        for chunk in chunks:
-            doc = Document(
-                page_content=chunk,
-                metadata={
-                    "complaint_id": int(row["Complaint ID"]),
-                    "product": row["Product"],
-                    "original_narrative": text,
-                },
-            )
-            documents.append(doc)
+    """Split narratives into overlapping chunks
+
+    Each chunk records where it sits in its narrative (``start``/``end``
+    character offsets); the narrative itself lives in the document store.
+    ``company`` and ``date_received`` are kept for filtering when present.
+    Returns a list of ``Document``s; full builds use ``chunk_spans`` (see
+    chunker.py), which keeps only the offsets.
+    """
+    return chunk_spans(df, chunk_size, chunk_overlap).documents()
 
-    print(f"Created {len(documents)} text chunks.")
-    return documents
 
+def embed_and_store(
+    docs,
+    embedding_model_name,
+    save_dir,
+    embeddings_model=None,
+    batch_size=EMBED_BATCH_SIZE,
+    shard_size=SHARD_SIZE,
+    n_workers=1,
+    keep_shards=False,
+    cache_path=None,
+    index_type="flat",
+    index_params=None,
+    storage=DEFAULT_STORAGE,
+    full_vectors=False,
+):
+    """Embed chunks into resumable shards, then assemble the FAISS index
 
-def embed_and_store(docs, embedding_model_name, save_dir):
-    embeddings_model = HuggingFaceEmbeddings(model_name=embedding_model_name)
+    With ``cache_path`` set, chunk texts embedded by any earlier build (with
+    the same model) are read from the persistent embedding cache.
+    ``index_type``/``index_params`` select an approximate index and
+    ``storage`` how it stores vectors (see index_factory.py); the default is
+    exact flat search over float32. ``full_vectors`` keeps a float32 copy
+    on disk to re-score the candidates of a compressed index.
+    """
+    if not docs:
+        raise ValueError("No chunks to embed.")
+    if isinstance(docs, ChunkSpans):
+        texts = docs.texts  # Sliced out shard by shard while embedding
+    else:
+        texts = [doc.page_content for doc in docs]
+    shard_dir = os.path.join(save_dir, SHARDS_DIRNAME)
+    if embeddings_model is None and n_workers <= 1:
+        embeddings_model = load_embeddings_model(embedding_model_name, batch_size)
 
-    print("Embedding chunks and building FAISS index...")
-    vector_store = FAISS.from_documents(docs, embedding=embeddings_model)
+    print(f"Embedding {len(texts)} chunks (batch_size={batch_size}) ...")
+    shard_paths = embed_to_shards(
+        texts,
+        embedding_model_name,
+        shard_dir,
+        embeddings_model=embeddings_model,
+        batch_size=batch_size,
+        shard_size=shard_size,
+        n_workers=n_workers,
+        cache_path=cache_path,
+    )
+
+    print(f"Building {index_type} ({storage}) FAISS index from embedding shards...")
+    matrices = list(iter_shards(shard_paths))
+    index, _ = build_index(
+        matrices, index_type, storage=storage, **(index_params or {})
+    )
 
-    os.makedirs(save_dir, exist_ok=True)
-    vector_store.save_local(save_dir)
+    save_store(save_dir, index, docs, vectors=matrices if full_vectors else None)
+    if not keep_shards:
+        shutil.rmtree(shard_dir, ignore_errors=True)
     print(f"Vector store saved to: {save_dir}")
 
+    if embeddings_model is None:
+        embeddings_model = load_embeddings_model(embedding_model_name, batch_size)
+    return MmapVectorStore.load(save_dir, embeddings_model)
+
+
+def build_vector_store(
+    df,
+    embedding_model_name,
+    save_dir,
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    embeddings_model=None,
+    dedup=DEDUP,
+    **embed_options,
+):
+    """Full rebuild: index, document store and manifest
+
+    ``dedup`` embeds one complaint per cluster of near-duplicates and
+    writes the shrinkage to ``dedup_report.json``. ``embed_options``
+    (batch_size, shard_size, n_workers, keep_shards, cache_path,
+    index_type, index_params, storage, full_vectors) are passed on to
+    ``embed_and_store``.
+    """
+    # Each product gets one contiguous run of FAISS labels, which product
+    # filters turn into a range scan (see index_factory.id_selector)
+    df = df.sort_values("Product", kind="stable")
+    indexed, duplicates = df, {}
+    if dedup:
+        df, keep, report = deduplicate(df, DEDUP_THRESHOLD)
+        indexed, duplicates = df[keep], duplicate_map(df)
+    documents = chunk_spans(indexed, chunk_size, chunk_overlap)
+    embed_and_store(
+        documents, embedding_model_name, save_dir, embeddings_model, **embed_options
+    )
+    save_document_store(df, save_dir)
+    report_path = os.path.join(save_dir, DEDUP_REPORT_FILENAME)
+    if dedup:
+        report["chunks"] = len(documents)
+        save_dedup_report(report, save_dir)
+    elif os.path.exists(report_path):
+        os.remove(report_path)
+
+    index_type = embed_options.get("index_type", "flat")
+    index_params = resolve_params(
+        index_type,
+        n_vectors=len(documents),
+        **(embed_options.get("index_params") or {}),
+    )
+    manifest = build_manifest(
+        compute_hashes(df),
+        documents,
+        embedding_model_name,
+        chunk_size,
+        chunk_overlap,
+        index={
+            "type": index_type,
+            "params": index_params,
+            "storage": embed_options.get("storage", DEFAULT_STORAGE),
+        },
+        duplicates=duplicates,
+        dedup=DEDUP_THRESHOLD if dedup else None,
+    )
+    save_manifest(manifest, save_dir)
+    return {"added": len(manifest["complaints"]), "changed": 0, "deleted": 0}
+
+
+def update_vector_store(
+    df,
+    embedding_model_name,
+    save_dir,
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    embeddings_model=None,
+    dedup=DEDUP,
+    **embed_options,
+):
+    """Incremental refresh: only embed the delta against the last build
+
+    With ``dedup``, new complaints are clustered among themselves; changes
+    to complaints already in a cluster trigger a full build.
+    """
+    manifest = load_manifest(save_dir)
+    index_type = embed_options.get("index_type", "flat")
+    storage = embed_options.get("storage", DEFAULT_STORAGE)
+    threshold = DEDUP_THRESHOLD if dedup else None
+    if not has_chunk_store(save_dir) or not is_compatible(
+        manifest,
+        embedding_model_name,
+        chunk_size,
+        chunk_overlap,
+        index_type,
+        storage,
+        threshold,
+    ):
+        print("No compatible manifest found, running a full build ...")
+        return build_vector_store(
+            df,
+            embedding_model_name,
+            save_dir,
+            chunk_size,
+            chunk_overlap,
+            embeddings_model,
+            dedup,
+            **embed_options,
+        )
+
+    hashes = compute_hashes(df)
+    added, changed, deleted = diff_manifest(manifest, hashes)
+    stats = {"added": len(added), "changed": len(changed), "deleted": len(deleted)}
+    print(
+        f"Complaints: {len(added)} new, {len(changed)} changed, "
+        f"{len(deleted)} deleted, {len(hashes) - len(added) - len(changed)} unchanged"
+    )
+    if not (added or changed or deleted):
+        print("Vector store already up to date.")
+        return stats
+    if dedup and clustered_ids(manifest) & set(changed + deleted):
+        # Members would lose (or keep a stale) representative
+        print("Near-duplicate clusters changed, running a full build ...")
+        return build_vector_store(
+            df,
+            embedding_model_name,
+            save_dir,
+            chunk_size,
+            chunk_overlap,
+            embeddings_model,
+            dedup,
+            **embed_options,
+        )
+    if index_type == "hnsw" and (changed or deleted):
+        # FAISS HNSW graphs do not support removing vectors
+        print("HNSW index cannot drop vectors, running a full build ...")
+        return build_vector_store(
+            df,
+            embedding_model_name,
+            save_dir,
+            chunk_size,
+            chunk_overlap,
+            embeddings_model,
+            dedup,
+            **embed_options,
+        )
+
+    batch_size = embed_options.get("batch_size", EMBED_BATCH_SIZE)
+    index = read_index(os.path.join(save_dir, INDEX_FILENAME), mmap=False)
+    chunks = ChunkStore.from_dir(save_dir)
+
+    to_embed = set(added) | set(changed)
+    df_delta = df[df["Complaint ID"].astype(int).isin(to_embed)]
+    indexed, duplicates = df_delta, {}
+    if dedup:
+        df_delta, keep, _ = deduplicate(df_delta, DEDUP_THRESHOLD)
+        indexed, duplicates = df_delta[keep], duplicate_map(df_delta)
+    documents = chunk_texts(indexed, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    # Drop stale chunks (and leftovers of an interrupted run) before appending
+    stale = np.isin(chunks.table["complaint_id"], list(to_embed | set(deleted)))
+    labels = chunks.table["label"][~stale]
+    # The full-precision copy is extended whenever the store has one
+    kept_vectors = None
+    vectors_path = os.path.join(save_dir, VECTORS_FILENAME)
+    if embed_options.get("full_vectors") or os.path.exists(vectors_path):
+        if not os.path.exists(vectors_path):
+            print(f"No {VECTORS_FILENAME} to extend, running a full build ...")
+            return build_vector_store(
+                df,
+                embedding_model_name,
+                save_dir,
+                chunk_size,
+                chunk_overlap,
+                embeddings_model,
+                dedup,
+                **embed_options,
+            )
+        kept_vectors = np.load(vectors_path, mmap_mode="r")[~stale]
+    if stale.any():
+        index.remove_ids(faiss.IDSelectorBatch(chunks.table["label"][stale]))
+        if not _keeps_labels(index):
+            labels = np.arange(len(labels))  # positions shift on removal
+
+    new_labels = np.arange(len(documents)) + (labels.max() + 1 if len(labels) else 0)
+    if documents:
+        print(f"Embedding {len(documents)} new chunks ...")
+        if embeddings_model is None:
+            embeddings_model = load_embeddings_model(embedding_model_name, batch_size)
+        cached_model = with_cache(
+            embeddings_model, embedding_model_name, embed_options.get("cache_path")
+        )
+        vectors_new = embed_in_batches(
+            [doc.page_content for doc in documents], cached_model, batch_size
+        )
+        if _keeps_labels(index):
+            index.add_with_ids(vectors_new, new_labels)
+        else:
+            index.add(vectors_new)
+
+    vectors = None
+    if kept_vectors is not None:
+        vectors = [kept_vectors] + ([vectors_new] if documents else [])
+    update_store(
+        save_dir, index, chunks, ~stale, labels, documents, new_labels, vectors
+    )
+    update_document_store(df_delta, deleted, save_dir)
+
+    for cid in deleted:
+        manifest["complaints"].pop(str(cid), None)
+    manifest = build_manifest(
+        {cid: hashes[cid] for cid in to_embed},
+        documents,
+        embedding_model_name,
+        chunk_size,
+        chunk_overlap,
+        base=manifest,
+        duplicates=duplicates,
+        dedup=threshold,
+    )
+    save_manifest(manifest, save_dir)
+    print(f"Vector store updated: {save_dir}")
+    return stats
+
+
+def build_sharded_vector_store(
+    df,
+    embedding_model_name,
+    save_dir,
+    n_shards,
+    partition="hash",
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    embeddings_model=None,
+    incremental=False,
+    dedup=DEDUP,
+    **embed_options,
+):
+    """Partition ``df`` into ``n_shards`` stores under ``save_dir``
+
+    Each shard is a complete store (index, chunks, documents, manifest) in
+    ``shard_NN/``; ``shards.json`` records the partitioning. With
+    ``incremental`` every shard is updated like an unsharded store, as long
+    as the shard count and partition are unchanged.
+    """
+    layout = load_layout(save_dir)
+    if layout and (layout["n_shards"], layout["partition"]) != (n_shards, partition):
+        print("Shard layout changed, running a full build ...")
+        incremental, layout = False, None
+    shards, layout = assign_shards(df, n_shards, partition, layout)
+    if partition == "product" and len(set(shards.tolist())) < n_shards:
+        raise ValueError(f"{n_shards} shards need at least {n_shards} products")
+
+    update = update_vector_store if incremental else build_vector_store
+    stats = {"added": 0, "changed": 0, "deleted": 0}
+    for shard in range(n_shards):
+        print(f"--- Shard {shard + 1}/{n_shards} ---")
+        shard_stats = update(
+            df[shards == shard],
+            embedding_model_name,
+            shard_dir(save_dir, shard),
+            chunk_size,
+            chunk_overlap,
+            embeddings_model,
+            dedup,
+            **embed_options,
+        )
+        for key in stats:
+            stats[key] += shard_stats[key]
+    save_layout(save_dir, layout)
+    return stats
+
+
+def _keeps_labels(index):
+    """IVF indexes store explicit ids; flat/PQ storage renumbers on removal"""
+    try:
+        faiss.extract_index_ivf(index)
+        return True
+    except RuntimeError:
+        return False
+
 
 # --------------------------------------------
 # MAIN
 # --------------------------------------------
 
-if __name__ == "__main__":
-    df_cleaned = load_cleaned_data(INPUT_CSV_PATH)
-    documents = chunk_texts(
-        df_cleaned, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the FAISS vector store")
+    parser.add_argument("--input", default=INPUT_DATA_PATH)
+    parser.add_argument("--output", default=VECTOR_STORE_DIR)
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only embed new/changed complaints and remove deleted ones",
+    )
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Embedding worker processes"
+    )
+    parser.add_argument(
+        "--keep-shards",
+        action="store_true",
+        help="Keep the embedding shards after the index is assembled",
     )
-    embed_and_store(documents, EMBEDDING_MODEL_NAME, VECTOR_STORE_DIR)
+    parser.add_argument(
+        "--cache",
+        default=EMBEDDING_CACHE_PATH,
+        help="Persistent embedding cache file ('' disables it)",
+    )
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument(
+        "--storage",
+        choices=list(STORAGE_TYPES),
+        default=DEFAULT_STORAGE,
+        help="Vector storage in the index (float16 / int8 save RAM)",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Split the store into N shards, each served by its own process",
+    )
+    parser.add_argument(
+        "--partition",
+        choices=PARTITIONS,
+        default="hash",
+        help="Shard by complaint ID (hash) or by product",
+    )
+    parser.add_argument(
+        "--dedup",
+        action=argparse.BooleanOptionalAction,
+        default=DEDUP,
+        help="Embed one complaint per cluster of near-duplicate narratives "
+        "(default: RAG_DEDUP)",
+    )
+    parser.add_argument(
+        "--full-vectors",
+        action="store_true",
+        help="Keep float32 vectors on disk to re-score compressed search results",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=EMBEDDING_BACKEND,
+        help="Embedding inference backend (onnx: int8-quantized ONNX Runtime)",
+    )
+    for name, default in DEFAULT_INDEX_PARAMS.items():
+        parser.add_argument(
+            f"--{name.replace('_', '-')}",
+            dest=name,
+            type=int,
+            default=None,
+            help=f"{name} for approximate index types (default {default})",
+        )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    df_cleaned = load_cleaned_data(args.input)
+
+    embed_options = {
+        "batch_size": args.batch_size,
+        "shard_size": args.shard_size,
+        "n_workers": args.workers,
+        "keep_shards": args.keep_shards,
+        "cache_path": args.cache,
+        "index_type": args.index_type,
+        "storage": args.storage,
+        "full_vectors": args.full_vectors,
+        "index_params": {
+            name: getattr(args, name)
+            for name in DEFAULT_INDEX_PARAMS
+            if getattr(args, name) is not None
+        },
+    }
+
+    # The backend is part of the model name, so switching it triggers a
+    # full rebuild instead of mixing vectors of both backends in one index
+    model_name = with_backend(EMBEDDING_MODEL_NAME, args.backend)
+    if args.shards == 1 and load_layout(args.output):
+        # An unsharded build replaces a sharded one in the same directory
+        os.remove(os.path.join(args.output, SHARDS_FILENAME))
+    if args.shards > 1:
+        build_sharded_vector_store(
+            df_cleaned,
+            model_name,
+            args.output,
+            args.shards,
+            args.partition,
+            incremental=args.incremental,
+            dedup=args.dedup,
+            **embed_options,
+        )
+    elif args.incremental:
+        update_vector_store(
+            df_cleaned, model_name, args.output, dedup=args.dedup, **embed_options
+        )
+    else:
+        build_vector_store(
+            df_cleaned, model_name, args.output, dedup=args.dedup, **embed_options
+        )
 
     print("✅ Vector store creation complete.")
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# src/embeddings/dedup.py
+
+"""
+Near-Duplicate Complaint Detection (MinHash + LSH)
+
+- Runs between ``clean_narratives`` and chunking: templated and
+  copy-pasted narratives (form letters, repeated submissions) are embedded
+  once instead of once per copy
+- Each narrative becomes a set of word 3-grams; NUM_PERM MinHash values
+  per narrative estimate the Jaccard similarity of two sets
+- LSH: signatures are cut into bands of BAND_ROWS values; complaints of
+  the same product that agree on a whole band become candidates, and a
+  candidate pair is kept when its estimated similarity reaches the
+  threshold
+- Each cluster is indexed through one representative (its longest
+  narrative); the IDs of the other members are kept in the document store
+  (``duplicates``), so nothing is lost for lookups or counts
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+DEDUP = os.environ.get("RAG_DEDUP", "0") == "1"
+DEDUP_THRESHOLD = float(os.environ.get("RAG_DEDUP_THRESHOLD", "0.8"))  # Jaccard
+NUM_PERM = 64  # MinHash values per narrative
+BAND_ROWS = 4  # 16 bands: pairs at 0.8 similarity are found 99.98% of the time
+SHINGLE_SIZE = 3  # Words per shingle
+SEED = 42
+BLOCK_SIZE = 50_000  # Shingles hashed per numpy block
+
+DUPLICATES_COLUMN = "Duplicate IDs"  # Space-separated member IDs
+DEDUP_REPORT_FILENAME = "dedup_report.json"
+TOP_CLUSTERS = 10  # Largest clusters listed in the report
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def shingles(texts, shingle_size=SHINGLE_SIZE):
+    """Hashed word shingles of all ``texts``, back to back
+
+    Returns ``(hashes, starts, has_text)``: ``hashes[starts[i]:starts[i+1]]``
+    belong to text i; texts without words get no shingles.
+    """
+    vocabulary = {}
+    parts = []
+    counts = np.zeros(len(texts), dtype=np.int64)
+    # Polynomial hash of the word ids (odd multipliers, wraps mod 2**64)
+    multipliers = np.array(
+        [pow(0x9E3779B97F4A7C15, j + 1, 2**64) for j in range(shingle_size)],
+        dtype=np.uint64,
+    )
+    for i, text in enumerate(texts):
+        ids = [vocabulary.setdefault(word, len(vocabulary)) for word in text.split()]
+        if not ids:
+            continue
+        ids = np.array(ids, dtype=np.uint64) + np.uint64(1)
+        n = max(len(ids) - shingle_size + 1, 1)  # Short texts: one shingle
+        hashes = np.zeros(n, dtype=np.uint64)
+        for j in range(min(shingle_size, len(ids))):
+            hashes += ids[j : j + n] * multipliers[j]
+        parts.append(hashes)
+        counts[i] = n
+    hashes = np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint64)
+    starts = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=starts[1:])
+    return hashes, starts, counts > 0
+
+
+def minhash_signatures(texts, num_perm=NUM_PERM, seed=SEED):
+    """``(n_texts, num_perm)`` uint32 MinHash signatures and ``has_text``
+
+    Multiply-shift hashing: ``(a * x + b) >> 32`` with random odd ``a``;
+    texts without words keep the maximum value everywhere.
+    """
+    hashes, starts, has_text = shingles(texts)
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+
+    signatures = np.full((len(texts), num_perm), np.iinfo(np.uint32).max, np.uint32)
+    rows = np.flatnonzero(has_text)
+    # Whole texts per block, so every text's minimum is taken in one go
+    block_ids = starts[rows] // BLOCK_SIZE
+    bounds = np.flatnonzero(np.r_[True, block_ids[1:] != block_ids[:-1], True])
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        block = rows[lo:hi]
+        first = starts[block[0]]
+        x = hashes[first : starts[block[-1] + 1]]
+        values = (x[:, None] * a[None, :] + b[None, :]) >> np.uint64(32)
+        signatures[block] = np.minimum.reduceat(
+            values.astype(np.uint32), starts[block] - first, axis=0
+        )
+    return signatures, has_text
+
+
+def _find(parents, i):
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+
+def cluster_signatures(
+    signatures, groups=None, threshold=DEDUP_THRESHOLD, band_rows=BAND_ROWS
+):
+    """Cluster root (a row number) of every row
+
+    Rows are only compared within the same ``groups`` value (e.g. product).
+    """
+    n, num_perm = signatures.shape
+    groups = np.zeros(n, dtype=np.int64) if groups is None else np.asarray(groups)
+    parents = np.arange(n)
+    for start in range(0, num_perm - band_rows + 1, band_rows):
+        band = np.ascontiguousarray(signatures[:, start : start + band_rows])
+        keys = np.column_stack([groups.astype(np.int64), band.astype(np.int64)])
+        _, bucket = np.unique(keys, axis=0, return_inverse=True)
+        bucket = bucket.ravel()
+        order = np.argsort(bucket, kind="stable")
+        sorted_buckets = bucket[order]
+        is_first = np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]]
+        leaders = order[is_first][np.cumsum(is_first) - 1]
+        members = order[~is_first]
+        leaders = leaders[~is_first]
+        if not len(members):
+            continue
+        # Verify against the bucket's first row: bands also collide by chance
+        similar = (signatures[members] == signatures[leaders]).mean(axis=1)
+        for leader, member in zip(
+            leaders[similar >= threshold], members[similar >= threshold]
+        ):
+            root_a, root_b = _find(parents, leader), _find(parents, member)
+            if root_a != root_b:
+                parents[max(root_a, root_b)] = min(root_a, root_b)
+    return np.array([_find(parents, i) for i in range(n)])
+
+
+def deduplicate(df, threshold=DEDUP_THRESHOLD):
+    """Mark near-duplicate complaints of ``df``
+
+    Returns ``(df, keep, report)``: a copy of ``df`` whose representatives
+    list their members in DUPLICATES_COLUMN, the boolean mask of rows to
+    index (one per cluster) and the shrinkage report.
+    """
+    texts = [str(text) for text in df["Cleaned Narrative"]]
+    signatures, has_text = minhash_signatures(texts)
+    products = pd.factorize(df["Product"].astype(object))[0]
+    # Texts without words never count as duplicates of each other
+    groups = np.where(has_text, products, -1 - np.arange(len(df)))
+    roots = cluster_signatures(signatures, groups, threshold)
+
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    # Representative: the longest narrative of each cluster (first on ties)
+    order = np.lexsort((np.arange(len(df)), -lengths, roots))
+    is_first = np.r_[True, roots[order][1:] != roots[order][:-1]]
+    representative = np.empty(len(df), dtype=np.int64)
+    representative[order] = order[is_first][np.cumsum(is_first) - 1]
+    keep = representative == np.arange(len(df))
+
+    complaint_ids = df["Complaint ID"].to_numpy(dtype=np.int64)
+    members = {}
+    for row in np.flatnonzero(~keep):
+        members.setdefault(representative[row], []).append(int(complaint_ids[row]))
+    marked = df.copy()
+    column = np.full(len(df), None, dtype=object)
+    for rep, ids in members.items():
+        column[rep] = " ".join(str(cid) for cid in sorted(ids))
+    marked[DUPLICATES_COLUMN] = column
+
+    sizes = sorted(
+        ((len(ids) + 1, int(complaint_ids[rep])) for rep, ids in members.items()),
+        reverse=True,
+    )
+    report = {
+        "threshold": threshold,
+        "complaints": len(df),
+        "indexed": int(keep.sum()),
+        "duplicates": int((~keep).sum()),
+        "clusters": len(members),
+        "characters": int(lengths.sum()),
+        "indexed_characters": int(lengths[keep].sum()),
+        "shrink": round(float((~keep).mean()) if len(df) else 0.0, 4),
+        "largest_clusters": [
+            {"representative": cid, "size": size} for size, cid in sizes[:TOP_CLUSTERS]
+        ],
+    }
+    print(
+        f"Near-duplicates: {report['duplicates']} of {len(df)} complaints in "
+        f"{report['clusters']} clusters, indexing {report['indexed']} "
+        f"({report['shrink']:.1%} fewer)"
+    )
+    return marked, keep, report
+
+
+def duplicate_map(df):
+    """complaint_id -> representative ID, for the members marked in ``df``"""
+    if DUPLICATES_COLUMN not in df.columns:
+        return {}
+    mapping = {}
+    for cid, members in zip(df["Complaint ID"], df[DUPLICATES_COLUMN]):
+        if isinstance(members, str):
+            for member in members.split():
+                mapping[int(member)] = int(cid)
+    return mapping
+
+
+def save_dedup_report(report, save_dir):
+    os.makedirs(save_dir, exist_ok=True)
+    path = os.path.join(save_dir, DEDUP_REPORT_FILENAME)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# src/embeddings/document_store.py
+
+"""
+Complaint Document Store
+
+- Keeps each complaint narrative + per-complaint fields exactly once
+- Stored as a small SQLite side table next to the FAISS index
+- Chunks only carry ``complaint_id`` and ``start``/``end`` character offsets
+- Full narratives are looked up lazily, only when a UI needs them
+"""
+
+import os
+import sqlite3
+import threading
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+DOCSTORE_FILENAME = "complaints.sqlite"
+
+# DataFrame column -> SQLite column (optional ones are kept when present)
+DOCSTORE_COLUMNS = {
+    "Complaint ID": "complaint_id",
+    "Product": "product",
+    "Issue": "issue",
+    "Company": "company",
+    "Date received": "date_received",
+    "Cleaned Narrative": "narrative",
+    "Duplicate IDs": "duplicates",  # Near-duplicates indexed through this one
+}
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def _prepare_table(df):
+    """Side-table rows (one per complaint) as plain Python values"""
+    columns = [col for col in DOCSTORE_COLUMNS if col in df.columns]
+    table = df[columns].rename(columns=DOCSTORE_COLUMNS)
+    table = table.drop_duplicates(subset="complaint_id", keep="last")
+    if "date_received" in table.columns:
+        table["date_received"] = table["date_received"].astype(str)
+    # Plain Python values (None for missing) so sqlite3 can bind them
+    return table.astype(object).where(table.notna(), None)
+
+
+def save_document_store(df, save_dir, filename=DOCSTORE_FILENAME):
+    """Write one row per complaint to ``<save_dir>/<filename>``"""
+    table = _prepare_table(df)
+
+    os.makedirs(save_dir, exist_ok=True)
+    path = os.path.join(save_dir, filename)
+    if os.path.exists(path):
+        os.remove(path)
+
+    column_defs = ", ".join(
+        "complaint_id INTEGER PRIMARY KEY" if col == "complaint_id" else f"{col} TEXT"
+        for col in table.columns
+    )
+    with sqlite3.connect(path) as conn:
+        conn.execute(f"CREATE TABLE complaints ({column_defs})")
+        placeholders = ", ".join("?" for _ in table.columns)
+        conn.executemany(
+            f"INSERT INTO complaints VALUES ({placeholders})",
+            table.itertuples(index=False, name=None),
+        )
+    conn.close()
+    print(f"Document store saved to: {path} ({len(table)} complaints)")
+    return path
+
+
+def update_document_store(df, deleted_ids, save_dir, filename=DOCSTORE_FILENAME):
+    """Upsert the complaints in ``df`` and drop ``deleted_ids`` in place"""
+    path = os.path.join(save_dir, filename)
+    if not os.path.exists(path):
+        return save_document_store(df, save_dir, filename)
+
+    table = _prepare_table(df)
+    with sqlite3.connect(path) as conn:
+        existing = [row[1] for row in conn.execute("PRAGMA table_info(complaints)")]
+        table = table[[col for col in table.columns if col in existing]]
+        if len(table):
+            columns = ", ".join(table.columns)
+            placeholders = ", ".join("?" for _ in table.columns)
+            conn.executemany(
+                f"INSERT OR REPLACE INTO complaints ({columns}) "
+                f"VALUES ({placeholders})",
+                table.itertuples(index=False, name=None),
+            )
+        conn.executemany(
+            "DELETE FROM complaints WHERE complaint_id = ?",
+            [(int(cid),) for cid in deleted_ids],
+        )
+    conn.close()
+    print(
+        f"Document store updated: {path} "
+        f"({len(table)} upserted, {len(deleted_ids)} deleted)"
+    )
+    return path
+
+
+def has_document_store(save_dir, filename=DOCSTORE_FILENAME):
+    return os.path.exists(os.path.join(save_dir, filename))
+
+
+class DocumentStore:
+    """Read-only, thread-safe lookup of complaints by ``complaint_id``"""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_dir(cls, save_dir, filename=DOCSTORE_FILENAME):
+        return cls(os.path.join(save_dir, filename))
+
+    def _connection(self):
+        # Opened on first lookup, so loading the vector store stays cheap
+        if self._conn is None:
+            uri = f"file:{self.path}?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+        return self._conn
+
+    def get_record(self, complaint_id):
+        """Return all stored fields of one complaint (or None)"""
+        with self._lock:
+            row = (
+                self._connection()
+                .execute(
+                    "SELECT * FROM complaints WHERE complaint_id = ?",
+                    (int(complaint_id),),
+                )
+                .fetchone()
+            )
+        return dict(row) if row is not None else None
+
+    def get_narrative(self, complaint_id):
+        """Return the full (cleaned) narrative of one complaint (or None)"""
+        record = self.get_record(complaint_id)
+        return record["narrative"] if record is not None else None
+
+    def get_duplicates(self, complaint_id):
+        """IDs of the near-duplicates represented by one complaint"""
+        record = self.get_record(complaint_id)
+        members = record.get("duplicates") if record is not None else None
+        return [int(cid) for cid in members.split()] if members else []
+
+    def get_records(self, complaint_ids):
+        """Fetch several complaints in one query, keyed by ``complaint_id``"""
+        ids = sorted({int(cid) for cid in complaint_ids})
+        if not ids:
+            return {}
+        placeholders = ", ".join("?" for _ in ids)
+        with self._lock:
+            rows = (
+                self._connection()
+                .execute(
+                    f"SELECT * FROM complaints WHERE complaint_id IN ({placeholders})",
+                    ids,
+                )
+                .fetchall()
+            )
+        return {row["complaint_id"]: dict(row) for row in rows}
+
+    def __len__(self):
+        with self._lock:
+            return (
+                self._connection().execute("SELECT COUNT(*) FROM complaints").fetchone()
+            )[0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
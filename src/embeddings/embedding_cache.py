@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# src/embeddings/embedding_cache.py
+
+"""
+Persistent Embedding Cache
+
+- Content-addressed: key = hash(model name, whitespace-normalized text)
+- Stored in one SQLite file, shared by the vector store build and by
+  query-time embedding (and safe to use from several processes)
+- Bounded by a maximum number of entries, least recently used are evicted
+- ``CachedEmbeddings`` wraps any LangChain embeddings model with the cache
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from langchain_core.embeddings import Embeddings
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+# Empty string disables the cache
+EMBEDDING_CACHE_PATH = os.environ.get(
+    "RAG_EMBEDDING_CACHE", "vector_store/embedding_cache.sqlite"
+)
+EMBEDDING_CACHE_MAX_ENTRIES = int(
+    os.environ.get("RAG_EMBEDDING_CACHE_MAX_ENTRIES", "2000000")
+)
+
+EVICT_FRACTION = 0.1  # Share of max_entries dropped per eviction round
+_SQLITE_MAX_PARAMS = 900
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+def cache_key(namespace, text):
+    payload = f"{namespace}\x00{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()
+
+
+def _batches(items, size=_SQLITE_MAX_PARAMS):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+class EmbeddingCache:
+    """SQLite-backed vector cache with LRU eviction by entry count"""
+
+    def __init__(self, path, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._conn = None
+        self._count = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Connections don't survive pickling (e.g. to worker processes)
+        state = self.__dict__.copy()
+        state.update(_conn=None, _count=None, _lock=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, namespace TEXT, vector BLOB, last_used REAL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings (last_used)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get_many(self, namespace, texts):
+        """Cached vectors for ``texts`` (None where missing)"""
+        keys = [cache_key(namespace, text) for text in texts]
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            for batch in _batches(sorted(set(keys))):
+                placeholders = ", ".join("?" for _ in batch)
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                conn.commit()
+        return [
+            np.frombuffer(found[key], dtype="float32") if key in found else None
+            for key in keys
+        ]
+
+    def put_many(self, namespace, texts, vectors):
+        now = time.time()
+        rows = [
+            (
+                cache_key(namespace, text),
+                namespace,
+                np.asarray(vec, "float32").tobytes(),
+                now,
+            )
+            for text, vec in zip(texts, vectors)
+        ]
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?, ?)", rows
+            )
+            conn.commit()
+            if self._count is None:
+                self._count = self._count_rows(conn)
+            else:
+                self._count += max(cursor.rowcount, 0)
+            if self._count > self.max_entries:
+                self._evict(conn)
+
+    def _count_rows(self, conn):
+        return conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _evict(self, conn):
+        # Other processes may have written too: recount before deleting
+        self._count = self._count_rows(conn)
+        target = int(self.max_entries * (1 - EVICT_FRACTION))
+        n_evict = self._count - target
+        if n_evict <= 0:
+            return
+        conn.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            "SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (n_evict,),
+        )
+        conn.commit()
+        self._count -= n_evict
+        print(f"Embedding cache: evicted {n_evict} least recently used entries.")
+
+    def __len__(self):
+        with self._lock:
+            return self._count_rows(self._connection())
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM embeddings")
+            conn.commit()
+            self._count = 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain embeddings that only compute vectors missing from the cache"""
+
+    def __init__(self, embeddings, cache, model_name):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+
+    def _embed(self, namespace, texts, embed_fn):
+        vectors = self.cache.get_many(namespace, texts)
+        missing = list(
+            dict.fromkeys(text for text, vec in zip(texts, vectors) if vec is None)
+        )
+        self.hits += len(texts) - sum(vec is None for vec in vectors)
+        self.misses += len(missing)
+        if missing:
+            computed = embed_fn(missing)
+            self.cache.put_many(namespace, missing, computed)
+            lookup = dict(zip(missing, computed))
+            vectors = [
+                vec if vec is not None else lookup[text]
+                for text, vec in zip(texts, vectors)
+            ]
+        return [np.asarray(vec, dtype="float32").tolist() for vec in vectors]
+
+    def embed_documents(self, texts):
+        return self._embed(
+            self.model_name, list(texts), self.embeddings.embed_documents
+        )
+
+    def embed_query(self, text):
+        # Query and document embeddings may differ for some models
+        return self._embed(
+            f"{self.model_name}#query",
+            [text],
+            lambda texts: [self.embeddings.embed_query(t) for t in texts],
+        )[0]
+
+
+def with_cache(embeddings, model_name, path=EMBEDDING_CACHE_PATH, max_entries=None):
+    """Wrap ``embeddings`` with the persistent cache (no-op if ``path`` is empty)"""
+    if not path or isinstance(embeddings, CachedEmbeddings):
+        return embeddings
+    cache = EmbeddingCache(path, max_entries or EMBEDDING_CACHE_MAX_ENTRIES)
+    return CachedEmbeddings(embeddings, cache, model_name)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# src/embeddings/embedding_stage.py
+
+"""
+Batched, Resumable Embedding Stage
+
+- Embeds chunks in fixed-size batches
+- Writes embeddings to on-disk ``.npy`` shards as it goes
+- Re-running after a crash skips shards that are already complete
+- Optionally spreads shards over several CPU worker processes
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from tqdm import tqdm
+
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+from ..rag.onnx_backend import load_onnx_embedder, split_backend
+from .embedding_cache import with_cache
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+EMBED_BATCH_SIZE = 256  # Texts per embedding call
+SHARD_SIZE = 20_000  # Chunks per on-disk shard (= unit of resume)
+PROGRESS_FILENAME = "progress.json"
+
+_worker_embeddings = None
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def load_embeddings_model(model_name, batch_size=EMBED_BATCH_SIZE):
+    """``model_name`` may carry a backend suffix (see rag/onnx_backend.py)"""
+    base_name, backend = split_backend(model_name)
+    if backend == "onnx":
+        return load_onnx_embedder(base_name, {"batch_size": batch_size})
+    return HuggingFaceEmbeddings(
+        model_name=base_name, encode_kwargs={"batch_size": batch_size}
+    )
+
+
+def embed_in_batches(texts, embeddings_model, batch_size=EMBED_BATCH_SIZE):
+    """Embed ``texts`` batch by batch into one float32 matrix"""
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start : start + batch_size]
+        vectors.append(np.asarray(embeddings_model.embed_documents(batch), "float32"))
+    if not vectors:
+        return np.zeros((0, 0), dtype="float32")
+    return np.vstack(vectors)
+
+
+def shard_path(shard_dir, shard_index):
+    return os.path.join(shard_dir, f"shard_{shard_index:05d}.npy")
+
+
+def _fingerprint(texts, embedding_model_name, shard_size):
+    """Identifies the exact job, so stale shards are never reused"""
+    digest = hashlib.sha1(f"{embedding_model_name}|{shard_size}".encode("utf-8"))
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def _prepare_shard_dir(shard_dir, fingerprint, n_shards):
+    """Keep completed shards only if they belong to the same job"""
+    progress_path = os.path.join(shard_dir, PROGRESS_FILENAME)
+    if os.path.exists(progress_path):
+        with open(progress_path) as f:
+            progress = json.load(f)
+        if progress.get("fingerprint") != fingerprint:
+            print("Existing shards belong to a different job, starting over ...")
+            shutil.rmtree(shard_dir)
+
+    os.makedirs(shard_dir, exist_ok=True)
+    with open(progress_path, "w") as f:
+        json.dump({"fingerprint": fingerprint, "n_shards": n_shards}, f)
+
+
+def _write_shard(path, texts, embeddings_model, batch_size):
+    vectors = embed_in_batches(texts, embeddings_model, batch_size)
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, vectors)
+    os.replace(tmp_path, path)  # a shard only "exists" once fully written
+    return path
+
+
+def _init_worker(
+    embedding_model_name, embeddings_model, batch_size, n_threads, cache_path
+):
+    global _worker_embeddings
+    import torch
+
+    torch.set_num_threads(n_threads)
+    if embeddings_model is None:
+        embeddings_model = load_embeddings_model(embedding_model_name, batch_size)
+    _worker_embeddings = with_cache(embeddings_model, embedding_model_name, cache_path)
+
+
+def _worker_write_shard(path, texts, batch_size):
+    return _write_shard(path, texts, _worker_embeddings, batch_size)
+
+
+def embed_to_shards(
+    texts,
+    embedding_model_name,
+    shard_dir,
+    embeddings_model=None,
+    batch_size=EMBED_BATCH_SIZE,
+    shard_size=SHARD_SIZE,
+    n_workers=1,
+    cache_path=None,
+):
+    """Embed ``texts`` into ``shard_dir`` and return the ordered shard paths
+
+    Shards that already exist from an interrupted run of the same job are
+    skipped. With ``n_workers > 1`` each worker process loads its own model
+    (or receives a pickled copy of ``embeddings_model``). ``cache_path``
+    enables the persistent embedding cache (see embedding_cache.py).
+    """
+    n_shards = (len(texts) + shard_size - 1) // shard_size
+    fingerprint = _fingerprint(texts, embedding_model_name, shard_size)
+    _prepare_shard_dir(shard_dir, fingerprint, n_shards)
+
+    paths = [shard_path(shard_dir, i) for i in range(n_shards)]
+    todo = [i for i, path in enumerate(paths) if not os.path.exists(path)]
+    if len(todo) < n_shards:
+        print(f"Resuming: {n_shards - len(todo)}/{n_shards} shards already done.")
+
+    def shard_texts(i):
+        return texts[i * shard_size : (i + 1) * shard_size]
+
+    progress = tqdm(total=len(todo), desc="Embedding shards")
+    if n_workers > 1 and len(todo) > 1:
+        n_threads = max(1, (os.cpu_count() or 1) // n_workers)
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_worker,
+            initargs=(
+                embedding_model_name,
+                embeddings_model,
+                batch_size,
+                n_threads,
+                cache_path,
+            ),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _worker_write_shard, paths[i], shard_texts(i), batch_size
+                )
+                for i in todo
+            ]
+            for future in as_completed(futures):
+                future.result()
+                progress.update(1)
+    else:
+        if todo and embeddings_model is None:
+            embeddings_model = load_embeddings_model(embedding_model_name, batch_size)
+        embeddings_model = with_cache(
+            embeddings_model, embedding_model_name, cache_path
+        )
+        for i in todo:
+            _write_shard(paths[i], shard_texts(i), embeddings_model, batch_size)
+            progress.update(1)
+    progress.close()
+    return paths
+
+
+def iter_shards(paths, mmap=True):
+    """Yield shard matrices in order (memory-mapped by default)"""
+    for path in paths:
+        yield np.load(path, mmap_mode="r" if mmap else None)
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# src/embeddings/evaluate_index.py
+
+"""
+Index Recall / Latency Report
+
+- Loads the chunk vectors of a built vector store (its full-precision
+  ``vectors.npy`` when there is one) or embedding shards
+- Holds out ``n_queries`` of them as queries and builds every requested
+  index configuration on the rest, so no query finds itself at rank 1
+- Reports recall@k against the exact flat index, per-query latency and
+  index size, so an approximate index can be chosen with known accuracy loss
+- Compressed storage (``storage=float16`` / ``storage=int8``) shows the
+  memory saved against float32 vectors; ``rescore=N`` re-scores the top
+  k * N candidates with the full-precision vectors, like a store built
+  with ``--full-vectors``
+
+Example:
+    python -m src.embeddings.evaluate_index \\
+        --configs flat ivf:nlist=1024,nprobe=8 hnsw:M=32,ef_search=64 \\
+        ivfpq:nlist=1024,nprobe=16,pq_m=48 flat:storage=int8,rescore=4
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+
+import faiss
+import numpy as np
+
+from .index_factory import build_index, rescore
+from .mmap_store import VECTORS_FILENAME
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+VECTOR_STORE_DIR = "vector_store/faiss_index"
+REPORT_PATH = "reports/index_report.json"
+
+DEFAULT_CONFIGS = [
+    "flat",
+    "ivf:nprobe=8",
+    "ivf:nprobe=32",
+    "hnsw:ef_search=32",
+    "hnsw:ef_search=128",
+    "ivfpq:nprobe=16",
+    "flat:storage=float16",
+    "flat:storage=int8",
+    "flat:storage=int8,rescore=4",
+    "hnsw:ef_search=64,storage=int8",
+    "hnsw:ef_search=64,storage=int8,rescore=4",
+]
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def parse_config(spec):
+    """``"ivf:nlist=1024,nprobe=8"`` -> ``("ivf", {"nlist": 1024, "nprobe": 8})``"""
+    index_type, _, raw_params = spec.partition(":")
+    params = {}
+    for item in filter(None, raw_params.split(",")):
+        key, _, value = item.partition("=")
+        value = value.strip()
+        params[key.strip()] = int(value) if value.isdigit() else value
+    return index_type.strip(), params
+
+
+def load_vectors(path):
+    """Vectors from a saved store or a directory of shards
+
+    ``vectors.npy`` is preferred: vectors reconstructed from a compressed
+    (PQ / SQ) ``index.faiss`` are lossy and would bias the exact baseline.
+    """
+    shard_paths = sorted(glob.glob(os.path.join(path, "shard_*.npy")))
+    if shard_paths:
+        return np.vstack([np.load(p) for p in shard_paths]).astype("float32")
+    vectors_path = os.path.join(path, VECTORS_FILENAME)
+    if os.path.exists(vectors_path):
+        return np.load(vectors_path).astype("float32")
+
+    index = faiss.read_index(os.path.join(path, "index.faiss"))
+    try:
+        return index.reconstruct_n(0, index.ntotal)
+    except RuntimeError:
+        # IVF indexes need a direct map before vectors can be reconstructed
+        faiss.extract_index_ivf(index).make_direct_map()
+        return index.reconstruct_n(0, index.ntotal)
+
+
+def recall_at_k(approx_ids, exact_ids):
+    k = exact_ids.shape[1]
+    hits = [len(set(a) & set(e)) for a, e in zip(approx_ids, exact_ids)]
+    return float(np.mean(hits)) / k
+
+
+def split_queries(n_vectors, n_queries, seed=0):
+    """``(query_ids, indexed_ids)``: held-out queries (at most half of the
+    vectors) and the rows that get indexed"""
+    rng = np.random.default_rng(seed)
+    held_out = np.zeros(n_vectors, dtype=bool)
+    n_queries = min(n_queries, n_vectors // 2)
+    held_out[rng.choice(n_vectors, size=n_queries, replace=False)] = True
+    return np.flatnonzero(held_out), np.flatnonzero(~held_out)
+
+
+def evaluate_configs(vectors, configs, k=5, n_queries=500, seed=0):
+    """Build each configuration and measure it against exact search
+
+    Queries are held out of the indexed vectors.
+    """
+    query_ids, indexed_ids = split_queries(len(vectors), n_queries, seed)
+    queries = vectors[query_ids]
+    vectors = np.ascontiguousarray(vectors[indexed_ids])
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, exact_ids = exact.search(queries, k)
+
+    raw_mb = vectors.nbytes / 2**20
+    results = []
+    for spec in configs:
+        index_type, params = parse_config(spec)
+        n_rescore = params.pop("rescore", 0)
+        storage = params.pop("storage", "float32")
+        start = time.perf_counter()
+        index, resolved = build_index(
+            [vectors], index_type, seed=seed, storage=storage, **params
+        )
+        build_seconds = time.perf_counter() - start
+
+        # Single-query latency is what an interactive user experiences
+        latencies = []
+        approx_ids = np.empty_like(exact_ids)
+        for i, query in enumerate(queries):
+            start = time.perf_counter()
+            query = query[None, :]
+            if n_rescore:
+                _, ids = index.search(query, k * n_rescore)
+                _, ids = rescore(query, ids, vectors.__getitem__, k)
+            else:
+                _, ids = index.search(query, k)
+            latencies.append(time.perf_counter() - start)
+            approx_ids[i] = ids[0]
+        index_mb = faiss.serialize_index(index).nbytes / 2**20
+
+        latencies_ms = np.array(latencies) * 1000
+        results.append(
+            {
+                "config": spec,
+                "index_type": index_type,
+                "params": resolved if index_type != "flat" else {},
+                "storage": storage,
+                "rescore": n_rescore,
+                "queries": len(queries),
+                "indexed": len(vectors),
+                f"recall@{k}": round(recall_at_k(approx_ids, exact_ids), 4),
+                "latency_ms_mean": round(float(latencies_ms.mean()), 4),
+                "latency_ms_p95": round(float(np.percentile(latencies_ms, 95)), 4),
+                "build_seconds": round(build_seconds, 3),
+                "index_mb": round(index_mb, 3),
+                "memory_saved": round(1 - index_mb / raw_mb, 4),
+            }
+        )
+    return results
+
+
+def format_report(results, k=5):
+    header = (
+        f"| config | recall@{k} | mean ms | p95 ms | build s | size MB | saved |\n"
+        "|---|---|---|---|---|---|---|"
+    )
+    rows = [
+        f"| {r['config']} | {r[f'recall@{k}']:.3f} | {r['latency_ms_mean']:.3f} "
+        f"| {r['latency_ms_p95']:.3f} | {r['build_seconds']:.2f} "
+        f"| {r['index_mb']:.1f} | {r['memory_saved']:.0%} |"
+        for r in results
+    ]
+    return "\n".join([header] + rows)
+
+
+# --------------------------------------------
+# MAIN
+# --------------------------------------------
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Recall/latency of index types")
+    parser.add_argument(
+        "--vectors",
+        default=VECTOR_STORE_DIR,
+        help="Vector store dir (index.faiss) or embedding shard dir",
+    )
+    parser.add_argument("--configs", nargs="+", default=DEFAULT_CONFIGS)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--n-queries", type=int, default=500)
+    parser.add_argument("--output", default=REPORT_PATH)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    vectors = load_vectors(args.vectors)
+    print(f"Loaded {vectors.shape[0]} vectors of dim {vectors.shape[1]}.")
+
+    results = evaluate_configs(
+        vectors, args.configs, k=args.k, n_queries=args.n_queries
+    )
+    print(format_report(results, k=args.k))
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved report → {args.output}")
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# src/embeddings/index_factory.py
+
+"""
+FAISS Index Types for the Vector Store
+
+- ``flat``  : exact brute-force search (LangChain's default)
+- ``ivf``   : inverted file over k-means cells (nlist / nprobe)
+- ``hnsw``  : graph-based search (M / ef_construction / ef_search)
+- ``ivfpq`` : IVF with product-quantized vectors (nlist / nprobe / pq_m / nbits)
+- ``pq``    : product quantization with exhaustive search (pq_m / nbits)
+
+``flat``, ``ivf`` and ``hnsw`` can store their vectors compressed
+(``storage``): ``float16`` halves the memory, ``int8`` scalar quantization
+(per-dimension min/max, trained on a sample) quarters it. ``rescore``
+re-ranks the candidates of a compressed index with exact distances.
+
+All types use L2 distance, like the flat index they replace, so LangChain's
+``FAISS`` wrapper and its scores work unchanged.
+"""
+
+import faiss
+import numpy as np
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq", "pq")
+
+DEFAULT_INDEX_PARAMS = {
+    "nlist": 1024,  # IVF cells
+    "nprobe": 16,  # IVF cells visited per query
+    "M": 32,  # HNSW neighbours per node
+    "ef_construction": 200,
+    "ef_search": 64,  # HNSW candidate list size per query
+    "pq_m": 48,  # PQ sub-quantizers (must divide the dimension, 384 for MiniLM)
+    "nbits": 8,  # Bits per PQ code
+}
+
+STORAGE_TYPES = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}
+DEFAULT_STORAGE = "float32"
+
+MIN_POINTS_PER_CELL = 39  # FAISS warns below this many training points per cell
+MAX_TRAINING_VECTORS = 200_000
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def resolve_params(index_type, n_vectors=None, **params):
+    """Fill in defaults and shrink nlist for small corpora"""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, use one of {INDEX_TYPES}")
+    unknown = set(params) - set(DEFAULT_INDEX_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown index parameters: {sorted(unknown)}")
+
+    resolved = {**DEFAULT_INDEX_PARAMS, **params}
+    if n_vectors is not None and index_type in ("ivf", "ivfpq"):
+        resolved["nlist"] = max(
+            1, min(resolved["nlist"], n_vectors // MIN_POINTS_PER_CELL)
+        )
+    return resolved
+
+
+def check_storage(index_type, storage):
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage {storage!r}, use one of {STORAGE_TYPES}")
+    if storage != DEFAULT_STORAGE and index_type in ("pq", "ivfpq"):
+        raise ValueError(f"{index_type} vectors are already compressed")
+
+
+def factory_string(index_type, params, storage=DEFAULT_STORAGE):
+    codec = STORAGE_TYPES[storage]
+    if index_type == "flat":
+        return codec
+    if index_type == "ivf":
+        return f"IVF{params['nlist']},{codec}"
+    if index_type == "hnsw":
+        return f"HNSW{params['M']}" + ("" if codec == "Flat" else f"_{codec}")
+    if index_type == "ivfpq":
+        return f"IVF{params['nlist']},PQ{params['pq_m']}x{params['nbits']}"
+    return f"PQ{params['pq_m']}x{params['nbits']}"
+
+
+def make_index(dim, index_type="flat", storage=DEFAULT_STORAGE, **params):
+    """Create an empty (possibly untrained) index"""
+    check_storage(index_type, storage)
+    index = faiss.index_factory(
+        dim, factory_string(index_type, params, storage), faiss.METRIC_L2
+    )
+    if index_type == "hnsw":
+        index.hnsw.efConstruction = params["ef_construction"]
+    return index
+
+
+def set_search_params(index, nprobe=None, ef_search=None, **_):
+    """Apply query-time knobs (they are persisted with the index)"""
+    space = faiss.ParameterSpace()
+    if nprobe is not None and _is_ivf(index):
+        space.set_index_parameter(index, "nprobe", nprobe)
+    if ef_search is not None and _is_hnsw(index):
+        space.set_index_parameter(index, "efSearch", ef_search)
+    return index
+
+
+def _is_ivf(index):
+    try:
+        faiss.extract_index_ivf(index)
+        return True
+    except RuntimeError:
+        return False
+
+
+def _is_hnsw(index):
+    return isinstance(faiss.downcast_index(index), faiss.IndexHNSW)
+
+
+def training_size(index_type, params, storage=DEFAULT_STORAGE):
+    if index_type in ("ivf", "ivfpq"):
+        n = params["nlist"] * MIN_POINTS_PER_CELL * 4
+    elif index_type == "pq":
+        n = (2 ** params["nbits"]) * MIN_POINTS_PER_CELL
+    else:
+        n = 0
+    if storage == "int8":  # per-dimension value ranges, from a large sample
+        n = MAX_TRAINING_VECTORS
+    return min(n, MAX_TRAINING_VECTORS)
+
+
+def sample_training_vectors(matrices, n, seed=0):
+    """Uniform row sample across a list of (memory-mapped) matrices"""
+    sizes = [len(m) for m in matrices]
+    total = sum(sizes)
+    rng = np.random.default_rng(seed)
+    picks = np.sort(rng.choice(total, size=min(n, total), replace=False))
+
+    samples = []
+    offset = 0
+    for matrix, size in zip(matrices, sizes):
+        local = picks[(picks >= offset) & (picks < offset + size)] - offset
+        if len(local):
+            samples.append(np.asarray(matrix[local], dtype="float32"))
+        offset += size
+    return np.vstack(samples)
+
+
+def build_index(matrices, index_type="flat", seed=0, storage=DEFAULT_STORAGE, **params):
+    """Train (if needed) and fill an index from a list of vector matrices"""
+    n_vectors = sum(len(m) for m in matrices)
+    params = resolve_params(index_type, n_vectors=n_vectors, **params)
+    dim = matrices[0].shape[1]
+    index = make_index(dim, index_type, storage, **params)
+
+    if not index.is_trained:
+        train = sample_training_vectors(
+            matrices, training_size(index_type, params, storage), seed
+        )
+        if index_type in ("pq", "ivfpq") and len(train) < 2 ** params["nbits"]:
+            raise ValueError(
+                f"{index_type} with nbits={params['nbits']} needs at least "
+                f"{2 ** params['nbits']} vectors, got {len(train)}"
+            )
+        print(
+            f"Training {factory_string(index_type, params, storage)} "
+            f"on {len(train)} vectors"
+        )
+        index.train(train)
+
+    for matrix in matrices:
+        index.add(np.ascontiguousarray(matrix, dtype="float32"))
+    set_search_params(index, **params)
+    return index, params
+
+
+def read_index(path, mmap=True):
+    """Load a saved index, memory-mapping its vectors/codes when ``mmap``
+
+    A mapped index is read-only; open it with ``mmap=False`` to modify it.
+    """
+    if not mmap:
+        return faiss.read_index(path)
+    try:
+        # Flat, PQ and HNSW storage
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_MMAP_IFC)
+    except RuntimeError:
+        # IVF inverted lists only support the plain mmap flag
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP)
+
+
+def id_selector(labels):
+    """FAISS selector for sorted ``labels``; a contiguous run (e.g. one
+    product of a build ordered by product) becomes a range that flat
+    indexes scan without touching the rest of the vectors"""
+    if len(labels) and labels[-1] - labels[0] + 1 == len(labels):
+        return faiss.IDSelectorRange(int(labels[0]), int(labels[-1]) + 1, True)
+    return faiss.IDSelectorBatch(np.ascontiguousarray(labels, dtype="int64"))
+
+
+def search_parameters(index, selector, exhaustive=False):
+    """Search parameters restricting ``index`` to ``selector``
+
+    None for index types that cannot filter during search (plain PQ).
+    ``exhaustive`` makes IVF indexes visit every cell.
+    """
+    if _is_ivf(index):
+        ivf = faiss.extract_index_ivf(index)
+        nprobe = ivf.nlist if exhaustive else ivf.nprobe
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+    base = faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+    if isinstance(base, (faiss.IndexFlat, faiss.IndexScalarQuantizer)):
+        return faiss.SearchParameters(sel=selector)
+    return None
+
+
+def exhaustive_search(index, query, labels, selector, k, block_size=65_536):
+    """Exact top-k among ``labels`` (same output layout as ``index.search``)"""
+    if _is_ivf(index):
+        params = search_parameters(index, selector, exhaustive=True)
+        return index.search(query, k, params=params)
+
+    scores = []
+    for start in range(0, len(labels), block_size):
+        block = labels[start : start + block_size]
+        vectors = index.reconstruct_batch(block)
+        scores.append(((vectors - query) ** 2).sum(axis=1))
+    scores = np.concatenate(scores) if scores else np.zeros(0, dtype="float32")
+
+    top = np.argsort(scores, kind="stable")[:k]
+    out_scores = np.full((1, k), np.inf, dtype="float32")
+    out_labels = np.full((1, k), -1, dtype="int64")
+    out_scores[0, : len(top)] = scores[top]
+    out_labels[0, : len(top)] = labels[top]
+    return out_scores, out_labels
+
+
+def rescore(queries, candidates, lookup, k):
+    """Exact top-k among each query's ``candidates`` (labels, -1 = none)
+
+    ``lookup(labels)`` returns the full-precision vectors of ``labels``.
+    """
+    out_scores = np.full((len(queries), k), np.inf, dtype="float32")
+    out_labels = np.full((len(queries), k), -1, dtype="int64")
+    for i, (query, labels) in enumerate(zip(queries, candidates)):
+        labels = labels[labels >= 0]
+        if not len(labels):
+            continue
+        vectors = np.asarray(lookup(labels), dtype="float32")
+        scores = ((vectors - query) ** 2).sum(axis=1)
+        top = np.argsort(scores, kind="stable")[:k]
+        out_scores[i, : len(top)] = scores[top]
+        out_labels[i, : len(top)] = labels[top]
+    return out_scores, out_labels
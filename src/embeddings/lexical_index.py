@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# src/embeddings/lexical_index.py
+
+"""
+On-Disk BM25 Inverted Index over Chunk Texts
+
+- Built next to the chunk store on every save, so it always covers exactly
+  the chunks in ``chunks.npy``; incremental builds patch it
+  (``patch_lexical_index``): only the new chunks are tokenized, the BM25
+  weights of the kept postings are recomputed from their stored counts
+- ``lexical_offsets.npy``: start of each term's postings
+- ``lexical_rows.npy`` / ``lexical_weights.npy``: postings (chunk row,
+  precomputed BM25 weight), grouped by term
+- ``lexical_tf.npy`` / ``lexical_lengths.npy``: term count per posting and
+  tokens per chunk, what a patch needs to recompute the weights
+- ``lexical.json``: vocabulary, BM25 parameters and the build id of the
+  chunk store it was built from
+- Query scoring only touches the postings of the query terms and is fully
+  vectorized (no per-document Python loop); arrays are memory-mapped
+"""
+
+import json
+import os
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from .chunk_store import _replace
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+LEXICAL_HEADER_FILENAME = "lexical.json"
+LEXICAL_OFFSETS_FILENAME = "lexical_offsets.npy"
+LEXICAL_ROWS_FILENAME = "lexical_rows.npy"
+LEXICAL_WEIGHTS_FILENAME = "lexical_weights.npy"
+LEXICAL_TF_FILENAME = "lexical_tf.npy"
+LEXICAL_LENGTHS_FILENAME = "lexical_lengths.npy"
+FORMAT_VERSION = 1
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+REDACTED = re.compile(r"x+")  # CFPB masks names, dates and amounts as XXXX
+STOP_WORDS = frozenset(
+    "a about after all also am an and any are as at be been before being but "
+    "by can could did do does for from had has have he her him his how i if "
+    "in into is it its me my of on or our she so than that the their them "
+    "then there these they this to was we were what when where which who "
+    "why will with would you your".split()
+)
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def tokenize(text):
+    """Lower-cased word tokens without stop words and XXXX redactions"""
+    return [
+        token
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOP_WORDS and not REDACTED.fullmatch(token)
+    ]
+
+
+def has_lexical_index(save_dir):
+    return os.path.exists(os.path.join(save_dir, LEXICAL_HEADER_FILENAME))
+
+
+def _count_terms(texts, vocabulary, first_row=0):
+    """``(terms, rows, tf, lengths)`` of ``texts``; new terms are added to
+    ``vocabulary`` (term -> id)"""
+    term_ids = array("i")
+    row_ids = array("i")
+    freqs = array("i")
+    lengths = array("i")
+    for row, text in enumerate(texts, first_row):
+        tokens = tokenize(text)
+        lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+            row_ids.append(row)
+            freqs.append(tf)
+    return tuple(
+        np.frombuffer(values, dtype=np.int32)
+        for values in (term_ids, row_ids, freqs, lengths)
+    )
+
+
+def _bm25_postings(n_terms, terms, rows, tf, doc_len, k1=BM25_K1, b=BM25_B):
+    """``(offsets, rows, weights, tf)`` grouped by term, rows ascending"""
+    n_docs = len(doc_len)
+    df = np.bincount(terms, minlength=n_terms)
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+    avg_len = max(float(doc_len.mean()), 1.0) if n_docs else 1.0
+    counts = tf.astype(np.float32)
+    norm = k1 * (1 - b + b * doc_len[rows].astype(np.float32) / avg_len)
+    weights = idf[terms] * counts * (k1 + 1) / (counts + norm)
+
+    order = np.lexsort((rows, terms))
+    offsets = np.zeros(n_terms + 1, dtype=np.int64)
+    np.cumsum(df, out=offsets[1:])
+    return (
+        offsets,
+        rows[order].astype(np.int32),
+        weights[order].astype(np.float32),
+        tf[order].astype(np.int32),
+    )
+
+
+def build_postings(texts, k1=BM25_K1, b=BM25_B):
+    """``(vocabulary, offsets, rows, weights)`` for ``texts`` (one per row)"""
+    vocabulary = {}
+    terms, rows, tf, lengths = _count_terms(texts, vocabulary)
+    offsets, rows, weights, _ = _bm25_postings(
+        len(vocabulary), terms, rows, tf, lengths, k1, b
+    )
+    return list(vocabulary), offsets, rows, weights
+
+
+def write_lexical_index(save_dir, chunks):
+    """Index the texts of ``chunks`` (a ChunkStore) in ``save_dir``"""
+    vocabulary = {}
+    terms, rows, tf, lengths = _count_terms(
+        (chunks.text(row) for row in range(len(chunks))), vocabulary
+    )
+    postings = _bm25_postings(len(vocabulary), terms, rows, tf, lengths)
+    _write_postings(save_dir, list(vocabulary), *postings, lengths, chunks.build_id)
+
+
+def patch_lexical_index(save_dir, build_id, row_map, new_texts, chunks):
+    """Incremental ``write_lexical_index`` after ``patch_chunk_store``
+
+    ``build_id``: chunk store the current index was built from; ``row_map``:
+    new row of every old row (-1: dropped); ``new_texts``: the appended
+    chunks, in row order; ``chunks``: the patched ChunkStore. Falls back to
+    a full rebuild when the index is missing, stale or has no stored counts.
+    """
+    paths = [
+        os.path.join(save_dir, filename)
+        for filename in (
+            LEXICAL_OFFSETS_FILENAME,
+            LEXICAL_ROWS_FILENAME,
+            LEXICAL_TF_FILENAME,
+            LEXICAL_LENGTHS_FILENAME,
+        )
+    ]
+    header = None
+    if has_lexical_index(save_dir) and all(map(os.path.exists, paths)):
+        with open(os.path.join(save_dir, LEXICAL_HEADER_FILENAME)) as f:
+            header = json.load(f)
+    if header is None or header.get("build_id") != build_id:
+        return write_lexical_index(save_dir, chunks)
+
+    offsets, rows, tf, lengths = (np.load(path) for path in paths)
+    terms = np.repeat(np.arange(len(offsets) - 1, dtype=np.int32), np.diff(offsets))
+    rows = row_map[rows]
+    kept = rows >= 0
+    terms, rows, tf = terms[kept], rows[kept], tf[kept]
+    lengths = lengths[row_map >= 0]
+
+    vocabulary = {term: i for i, term in enumerate(header["vocabulary"])}
+    new_terms, new_rows, new_tf, new_lengths = _count_terms(
+        new_texts, vocabulary, first_row=len(lengths)
+    )
+    terms = np.concatenate([terms, new_terms])
+    rows = np.concatenate([rows, new_rows])
+    tf = np.concatenate([tf, new_tf])
+    lengths = np.concatenate([lengths, new_lengths])
+
+    # Terms of dropped chunks only leave the vocabulary
+    used, terms = np.unique(terms, return_inverse=True)
+    names = list(vocabulary)
+    vocabulary = [names[i] for i in used]
+    postings = _bm25_postings(len(vocabulary), terms.reshape(-1), rows, tf, lengths)
+    _write_postings(save_dir, vocabulary, *postings, lengths, chunks.build_id)
+
+
+def _write_postings(
+    save_dir, vocabulary, offsets, rows, weights, tf, lengths, build_id
+):
+    def writer(values):
+        def write(path):
+            with open(path, "wb") as f:
+                np.save(f, values)
+
+        return write
+
+    for filename, values in (
+        (LEXICAL_OFFSETS_FILENAME, offsets),
+        (LEXICAL_ROWS_FILENAME, rows),
+        (LEXICAL_WEIGHTS_FILENAME, weights),
+        (LEXICAL_TF_FILENAME, tf),
+        (LEXICAL_LENGTHS_FILENAME, lengths),
+    ):
+        _replace(os.path.join(save_dir, filename), writer(values))
+
+    def write_header(path):
+        with open(path, "w") as f:
+            header = {
+                "version": FORMAT_VERSION,
+                "build_id": build_id,
+                "k1": BM25_K1,
+                "b": BM25_B,
+                "vocabulary": vocabulary,
+            }
+            json.dump(header, f)
+
+    # The header goes last: it marks the index as complete
+    _replace(os.path.join(save_dir, LEXICAL_HEADER_FILENAME), write_header)
+
+
+class LexicalIndex:
+    """BM25 search over chunk rows"""
+
+    def __init__(self, vocabulary, offsets, rows, weights, build_id=None):
+        self.vocabulary = {term: i for i, term in enumerate(vocabulary)}
+        self.offsets = offsets
+        self.rows = rows
+        self.weights = weights
+        self.build_id = build_id
+
+    @classmethod
+    def from_dir(cls, save_dir, mmap=True):
+        with open(os.path.join(save_dir, LEXICAL_HEADER_FILENAME)) as f:
+            header = json.load(f)
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported lexical index version {header['version']}")
+        mmap_mode = "r" if mmap else None
+        arrays = [
+            np.load(os.path.join(save_dir, filename), mmap_mode=mmap_mode)
+            for filename in (
+                LEXICAL_OFFSETS_FILENAME,
+                LEXICAL_ROWS_FILENAME,
+                LEXICAL_WEIGHTS_FILENAME,
+            )
+        ]
+        return cls(header["vocabulary"], *arrays, header.get("build_id"))
+
+    def search(self, query, k, allowed_rows=None):
+        """Top-k ``(rows, scores)`` for ``query``, best first
+
+        ``allowed_rows`` (sorted) restricts the result, e.g. to a filter.
+        """
+        term_ids = {self.vocabulary.get(token) for token in tokenize(query)}
+        term_ids.discard(None)
+        if not term_ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        spans = [(self.offsets[t], self.offsets[t + 1]) for t in sorted(term_ids)]
+        rows = np.concatenate([self.rows[start:end] for start, end in spans])
+        weights = np.concatenate([self.weights[start:end] for start, end in spans])
+        if allowed_rows is not None:
+            if len(allowed_rows) == 0:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            pos = np.searchsorted(allowed_rows, rows)
+            pos = np.minimum(pos, len(allowed_rows) - 1)
+            keep = allowed_rows[pos] == rows
+            rows, weights = rows[keep], weights[keep]
+
+        candidates, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.lexsort((candidates[top], -scores[top]))][:k]
+        return candidates[top].astype(np.int64), scores[top].astype(np.float32)
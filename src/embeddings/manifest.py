@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# src/embeddings/manifest.py
+
+"""
+Vector Store Manifest
+
+- Records, per complaint, a hash of the content that was indexed (text,
+  product and the filter / document store fields) and how many chunks it
+  produced
+- Lets incremental builds find new, changed and deleted complaints
+- Chunk IDs are derived from (complaint_id, chunk number): ``<cid>-<n>``
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .chunker import ChunkSpans
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+MANIFEST_FILENAME = "manifest.json"
+# Optional columns that also end up in the chunks' filter metadata or the
+# document store: a change to them re-indexes the complaint
+HASHED_COLUMNS = ("Issue", "Company", "Date received")
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def content_hash(product, narrative, *fields):
+    """Hash of everything that ends up in a complaint's chunks and its
+    document store row (``fields``: HASHED_COLUMNS values, None if missing)"""
+    fields = ["" if value is None or value != value else value for value in fields]
+    while fields and fields[-1] == "":  # Same hash as before the fields existed
+        fields.pop()
+    payload = "\x1f".join(str(v) for v in [product, narrative, *fields])
+    payload = payload.encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()
+
+
+def chunk_id(complaint_id, number):
+    return f"{int(complaint_id)}-{number}"
+
+
+def compute_hashes(df):
+    """Map complaint_id -> content hash for a cleaned complaints frame"""
+    fields = [
+        df[col] if col in df.columns else [None] * len(df) for col in HASHED_COLUMNS
+    ]
+    return {
+        int(cid): content_hash(product, narrative, *values)
+        for cid, product, narrative, *values in zip(
+            df["Complaint ID"], df["Product"], df["Cleaned Narrative"], *fields
+        )
+    }
+
+
+def build_manifest(
+    hashes,
+    docs,
+    embedding_model_name,
+    chunk_size,
+    chunk_overlap,
+    base=None,
+    index=None,
+    duplicates=None,
+    dedup=None,
+):
+    """Create (or extend ``base``) a manifest from hashes + produced chunks
+
+    ``index`` describes the FAISS index type and parameters of the build.
+    ``duplicates`` maps near-duplicate complaints (not indexed) to their
+    representative; ``dedup`` is the similarity threshold used (None: off).
+    """
+    if isinstance(docs, ChunkSpans):
+        cids, n_chunks = np.unique(docs.complaint_ids, return_counts=True)
+        counts = dict(zip(cids.tolist(), n_chunks.tolist()))
+    else:
+        counts = {}
+        for doc in docs:
+            cid = int(doc.metadata["complaint_id"])
+            counts[cid] = counts.get(cid, 0) + 1
+
+    complaints = dict(base["complaints"]) if base else {}
+    for cid, digest in hashes.items():
+        complaints[str(cid)] = {"hash": digest, "n_chunks": counts.get(cid, 0)}
+        if duplicates and cid in duplicates:
+            complaints[str(cid)]["duplicate_of"] = duplicates[cid]
+
+    if index is None:
+        index = base.get("index") if base else None
+    return {
+        "embedding_model": embedding_model_name,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "index": index or {"type": "flat", "params": {}},
+        "dedup": dedup,
+        "complaints": complaints,
+    }
+
+
+def index_type_of(manifest):
+    return manifest.get("index", {}).get("type", "flat")
+
+
+def storage_of(manifest):
+    return manifest.get("index", {}).get("storage", "float32")
+
+
+def is_compatible(
+    manifest,
+    embedding_model_name,
+    chunk_size,
+    chunk_overlap,
+    index_type="flat",
+    storage="float32",
+    dedup=None,
+):
+    """An existing index can only be extended with the same build settings"""
+    return (
+        manifest is not None
+        and manifest.get("embedding_model") == embedding_model_name
+        and manifest.get("chunk_size") == chunk_size
+        and manifest.get("chunk_overlap") == chunk_overlap
+        and index_type_of(manifest) == index_type
+        and storage_of(manifest) == storage
+        and manifest.get("dedup") == dedup
+    )
+
+
+def clustered_ids(manifest):
+    """Complaints in a near-duplicate cluster (members and representatives)"""
+    ids = set()
+    for cid, entry in manifest["complaints"].items():
+        if "duplicate_of" in entry:
+            ids.update((int(cid), int(entry["duplicate_of"])))
+    return ids
+
+
+def diff_manifest(manifest, hashes):
+    """Split complaint IDs into (added, changed, deleted) vs. the manifest"""
+    previous = {
+        int(cid): entry["hash"] for cid, entry in manifest["complaints"].items()
+    }
+    added = [cid for cid in hashes if cid not in previous]
+    changed = [
+        cid
+        for cid, digest in hashes.items()
+        if cid in previous and previous[cid] != digest
+    ]
+    deleted = [cid for cid in previous if cid not in hashes]
+    return added, changed, deleted
+
+
+def save_manifest(manifest, save_dir, filename=MANIFEST_FILENAME):
+    os.makedirs(save_dir, exist_ok=True)
+    path = os.path.join(save_dir, filename)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_manifest(save_dir, filename=MANIFEST_FILENAME):
+    path = os.path.join(save_dir, filename)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
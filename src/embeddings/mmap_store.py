@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# src/embeddings/mmap_store.py
+
+"""
+Memory-Mapped Vector Store
+
+- ``index.faiss`` (any type from index_factory.py) plus the chunk store
+  (see chunk_store.py), both opened memory-mapped
+- Cold start only maps files; pages are loaded on first use and shared by
+  all processes serving the same store
+- No pickle anywhere: replaces ``FAISS.load_local(...,
+  allow_dangerous_deserialization=True)``
+- Exposes the ``similarity_search`` family the RAG pipeline uses
+- Metadata filters (see ``ChunkStore.select``) are applied inside the FAISS
+  search through ID selectors, so a filtered query returns k matches
+- Hybrid search fuses the dense ranking with BM25 over the on-disk
+  inverted index (see lexical_index.py) by reciprocal rank fusion
+- A compressed index (float16 / int8 storage) can be paired with the
+  float32 vectors in ``vectors.npy``: its top candidates are re-scored
+  exactly, reading only those rows from disk
+
+Convert a store built before this format (``index.pkl``) with:
+    python -m src.embeddings.mmap_store --convert vector_store/faiss_index
+"""
+
+import argparse
+import json
+import os
+
+import faiss
+import numpy as np
+
+from .chunk_store import (
+    ChunkStore,
+    has_chunk_store,
+    patch_chunk_store,
+    write_chunk_store,
+)
+from .index_factory import (
+    exhaustive_search,
+    id_selector,
+    read_index,
+    rescore,
+    search_parameters,
+)
+from .lexical_index import (
+    LexicalIndex,
+    has_lexical_index,
+    patch_lexical_index,
+    write_lexical_index,
+)
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+INDEX_FILENAME = "index.faiss"
+LEGACY_DOCSTORE_FILENAME = "index.pkl"
+VECTORS_FILENAME = "vectors.npy"  # Optional full-precision copy, row order
+
+MAX_CACHED_FILTERS = 128  # Selectors kept per store (one per distinct filter)
+HYBRID_CANDIDATES = 50  # Candidates taken from each ranking before fusion
+RRF_K = 60  # Reciprocal rank fusion: score = sum of 1 / (RRF_K + rank)
+# With vectors.npy, k * this many candidates are re-scored exactly; 0: off
+RESCORE_CANDIDATES = int(os.environ.get("RAG_RESCORE_CANDIDATES", "4"))
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def write_vectors(save_dir, matrices):
+    """Stream float32 ``matrices`` (in chunk order) into ``vectors.npy``"""
+    path = os.path.join(save_dir, VECTORS_FILENAME)
+    n_rows = sum(len(m) for m in matrices)
+    out = np.lib.format.open_memmap(
+        path + ".tmp.npy",
+        mode="w+",
+        dtype="float32",
+        shape=(n_rows, matrices[0].shape[1]),
+    )
+    offset = 0
+    for matrix in matrices:
+        out[offset : offset + len(matrix)] = matrix
+        offset += len(matrix)
+    out.flush()
+    del out
+    os.replace(path + ".tmp.npy", path)
+
+
+def save_store(save_dir, index, docs, labels=None, vectors=None):
+    """Write ``index`` and its chunks (``labels`` default to positions)
+
+    ``vectors``: float32 matrices of the chunks (in ``docs`` order), kept
+    on disk for exact re-scoring; without them a stale copy is removed.
+    """
+    os.makedirs(save_dir, exist_ok=True)
+    index_path = os.path.join(save_dir, INDEX_FILENAME)
+    faiss.write_index(index, index_path + ".tmp")
+    os.replace(index_path + ".tmp", index_path)
+    write_chunk_store(save_dir, docs, labels)
+    write_lexical_index(save_dir, ChunkStore.from_dir(save_dir, mmap=False))
+    _save_vectors(save_dir, vectors)
+
+    legacy_path = os.path.join(save_dir, LEGACY_DOCSTORE_FILENAME)
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+
+
+def update_store(
+    save_dir, index, chunks, keep, kept_labels, docs, new_labels, vectors=None
+):
+    """Incremental ``save_store``: keep rows ``keep`` (a mask) of ``chunks``
+    (the store in ``save_dir``) relabelled ``kept_labels`` and append
+    ``docs`` with ``new_labels``
+
+    Only the new chunks are encoded and tokenized (see ``patch_chunk_store``
+    and ``patch_lexical_index``).
+    """
+    index_path = os.path.join(save_dir, INDEX_FILENAME)
+    faiss.write_index(index, index_path + ".tmp")
+    os.replace(index_path + ".tmp", index_path)
+    rows = patch_chunk_store(save_dir, chunks, keep, kept_labels, docs, new_labels)
+    patched = ChunkStore.from_dir(save_dir)
+    n_kept = int(np.count_nonzero(keep))
+    patch_lexical_index(
+        save_dir,
+        chunks.build_id,
+        rows,
+        (patched.text(row) for row in range(n_kept, len(patched))),
+        patched,
+    )
+    _save_vectors(save_dir, vectors)
+
+
+def _save_vectors(save_dir, vectors):
+    # Without vectors a stale copy is removed
+    if vectors:
+        write_vectors(save_dir, vectors)
+    elif os.path.exists(os.path.join(save_dir, VECTORS_FILENAME)):
+        os.remove(os.path.join(save_dir, VECTORS_FILENAME))
+
+
+class SearchMixin:
+    """LangChain-style ``similarity_search`` family on top of ``search`` /
+    ``hybrid_search`` and ``embeddings``"""
+
+    def hybrid_search_with_score(self, query, k=4, filter=None):
+        embedding = self.embeddings.embed_query(query)
+        return self.hybrid_search([query], [embedding], k, filter)[0]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None):
+        return self.search([embedding], k, filter)[0]
+
+    def similarity_search_by_vectors(self, embeddings, k=4, filter=None):
+        return [
+            [doc for doc, _ in results]
+            for results in self.search(embeddings, k, filter)
+        ]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None):
+        results = self.similarity_search_with_score_by_vector(embedding, k, filter)
+        return [doc for doc, _ in results]
+
+    def similarity_search_with_score(self, query, k=4, filter=None):
+        embedding = self.embeddings.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k, filter)
+
+    def similarity_search(self, query, k=4, filter=None):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+
+class MmapVectorStore(SearchMixin):
+    """Read-only FAISS index + chunk store"""
+
+    def __init__(self, index, chunks, embeddings, lexical=None, vectors=None):
+        self.index = index
+        self.chunks = chunks
+        self.embeddings = embeddings
+        self.lexical = lexical
+        self.vectors = vectors  # full precision, for re-scoring
+        self._selections = {}
+
+    @property
+    def version(self):
+        """Build id of the loaded data; changes whenever the store is rebuilt"""
+        return self.chunks.build_id
+
+    @classmethod
+    def load(cls, save_dir, embeddings, mmap=True):
+        index = read_index(os.path.join(save_dir, INDEX_FILENAME), mmap=mmap)
+        chunks = ChunkStore.from_dir(save_dir, mmap=mmap)
+        lexical = None
+        if has_lexical_index(save_dir):
+            lexical = LexicalIndex.from_dir(save_dir, mmap=mmap)
+            if lexical.build_id != chunks.build_id:
+                print(f"Ignoring the lexical index in {save_dir}: out of date")
+                lexical = None
+        vectors = None
+        vectors_path = os.path.join(save_dir, VECTORS_FILENAME)
+        if RESCORE_CANDIDATES > 0 and os.path.exists(vectors_path):
+            vectors = np.load(vectors_path, mmap_mode="r" if mmap else None)
+            if len(vectors) != len(chunks.table):
+                print(f"Ignoring {VECTORS_FILENAME} in {save_dir}: out of date")
+                vectors = None
+        return cls(index, chunks, embeddings, lexical, vectors)
+
+    def _selection(self, filter):
+        """Matching labels + FAISS selector for ``filter`` (cached)"""
+        key = json.dumps(filter, sort_keys=True, default=list)
+        selection = self._selections.get(key)
+        if selection is None:
+            labels = self.chunks.select(filter)
+            selection = (labels, id_selector(labels))
+            if len(self._selections) >= MAX_CACHED_FILTERS:
+                self._selections.pop(next(iter(self._selections)), None)
+            self._selections[key] = selection
+        return selection
+
+    def _filtered_search(self, queries, k, filter):
+        labels, selector = self._selection(filter)
+        n_expected = min(k, len(labels))
+        if n_expected == 0:
+            n = len(queries)
+            return np.zeros((n, 0), "float32"), np.zeros((n, 0), "int64")
+
+        params = search_parameters(self.index, selector)
+        if params is not None:
+            scores, found = self.index.search(queries, k, params=params)
+        else:
+            scores = np.full((len(queries), k), np.inf, dtype="float32")
+            found = np.full((len(queries), k), -1, dtype="int64")
+        # The probed IVF cells / HNSW neighbourhood held too few matches (or
+        # the index cannot filter): search all matching vectors
+        for i in np.flatnonzero((found >= 0).sum(axis=1) < n_expected):
+            scores[i], found[i] = exhaustive_search(
+                self.index, queries[i : i + 1], labels, selector, k
+            )
+        return scores, found
+
+    def _search_labels(self, queries, k, filter):
+        queries = np.asarray(queries, dtype="float32").reshape(-1, self.index.d)
+        n = k * RESCORE_CANDIDATES if self.vectors is not None else k
+        if _is_filtered(filter):
+            scores, labels = self._filtered_search(queries, n, filter)
+        else:
+            scores, labels = self.index.search(queries, n)
+        if self.vectors is None:
+            return scores, labels
+        return rescore(queries, labels, self._full_vectors, k)
+
+    def _full_vectors(self, labels):
+        rows = self.chunks.rows_for_labels(labels)
+        order = np.argsort(rows)  # sorted reads from the memory-mapped file
+        vectors = np.empty((len(rows), self.vectors.shape[1]), dtype="float32")
+        vectors[order] = self.vectors[rows[order]]
+        return vectors
+
+    def _documents(self, labels, scores):
+        rows = self.chunks.rows_for_labels(labels)
+        return [
+            (self.chunks.document(row), float(score))
+            for row, score in zip(rows, scores)
+            if row >= 0
+        ]
+
+    def search(self, queries, k=4, filter=None):
+        """(document, score) lists for a batch of query vectors, one search"""
+        scores, labels = self._search_labels(queries, k, filter)
+        return [
+            self._documents(row_labels, row_scores)
+            for row_scores, row_labels in zip(scores, labels)
+        ]
+
+    def hybrid_search(self, texts, queries, k=4, filter=None):
+        """(document, fused score) lists for query texts + their vectors
+
+        Without a lexical index this is a plain dense search.
+        """
+        if self.lexical is None:
+            return self.search(queries, k, filter)
+
+        n_candidates = max(k, HYBRID_CANDIDATES)
+        _, dense_labels = self._search_labels(queries, n_candidates, filter)
+        allowed_rows = None
+        if _is_filtered(filter):
+            labels, _ = self._selection(filter)
+            allowed_rows = self.chunks.rows_for_labels(labels)
+
+        results = []
+        for text, row_labels in zip(texts, dense_labels):
+            lexical_rows, _ = self.lexical.search(text, n_candidates, allowed_rows)
+            lexical_labels = self.chunks.table["label"][lexical_rows]
+            fused = {}
+            for ranking in (row_labels[row_labels >= 0], lexical_labels):
+                for rank, label in enumerate(ranking.tolist()):
+                    fused[label] = fused.get(label, 0.0) + 1.0 / (RRF_K + rank + 1)
+            best = sorted(fused.items(), key=lambda item: -item[1])[:k]
+            results.append(
+                self._documents([label for label, _ in best], [s for _, s in best])
+            )
+        return results
+
+
+def _is_filtered(filter):
+    return any(value is not None for value in (filter or {}).values())
+
+
+def convert_legacy_store(save_dir):
+    """Rewrite an ``index.faiss`` + ``index.pkl`` store in the mmap format
+
+    Unpickles ``index.pkl`` once, so only run it on stores you built.
+    """
+    from langchain_community.vectorstores import FAISS
+
+    vector_store = FAISS.load_local(
+        save_dir, embeddings=None, allow_dangerous_deserialization=True
+    )
+    ids = [
+        vector_store.index_to_docstore_id[i] for i in range(vector_store.index.ntotal)
+    ]
+    docs = [vector_store.docstore.search(doc_id) for doc_id in ids]
+    save_store(save_dir, vector_store.index, docs)
+    print(f"Converted {len(docs)} chunks in {save_dir} to the mmap format.")
+
+
+# --------------------------------------------
+# MAIN
+# --------------------------------------------
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Memory-mapped vector store tools")
+    parser.add_argument(
+        "--convert",
+        metavar="DIR",
+        required=True,
+        help="Convert a pickle-based store in DIR to the mmap format",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if has_chunk_store(args.convert):
+        print(f"{args.convert} is already in the mmap format.")
+    else:
+        convert_legacy_store(args.convert)
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# src/embeddings/sharded_store.py
+
+"""
+Sharded Vector Store (Scatter-Gather Retrieval)
+
+- A sharded build is a directory of ordinary stores (``shard_00/``,
+  ``shard_01/``, ...) plus ``shards.json``; complaints are partitioned by
+  complaint ID (``hash``) or by product (``product``, whole products per
+  shard, balanced by size)
+- Each shard is served by its own worker process (``ProcessShard``), which
+  memory-maps only its part of the corpus and searches on its own cores;
+  ``LocalShard`` runs a shard in-process (tests, small machines) and stands
+  in for a remote node
+- A query is embedded once, fanned out to every shard that can match the
+  filter, and the per-shard top-k lists are merged: for dense search the
+  merged top-k is exactly the top-k of one big index
+- Shards that don't answer within the timeout (or died) are skipped, the
+  answer is built from the others; ``partial`` tells the caller, so such
+  results are not cached
+"""
+
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, wait
+
+import numpy as np
+
+from ..rag import telemetry
+from .chunk_store import _as_set
+from .document_store import DocumentStore
+from .mmap_store import MmapVectorStore, SearchMixin
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+SHARDS_FILENAME = "shards.json"
+PARTITIONS = ("hash", "product")
+
+SHARD_TIMEOUT = float(os.environ.get("RAG_SHARD_TIMEOUT", "2.0"))  # seconds
+SHARD_WORKERS = os.environ.get("RAG_SHARD_WORKERS", "process")  # or "local"
+WORKER_START_TIMEOUT = 120  # seconds for a worker to map its shard
+
+# --------------------------------------------
+# BUILD SIDE
+# --------------------------------------------
+
+
+def shard_dir(save_dir, shard):
+    return os.path.join(save_dir, f"shard_{shard:02d}")
+
+
+def is_sharded_store(save_dir):
+    return os.path.exists(os.path.join(save_dir, SHARDS_FILENAME))
+
+
+def load_layout(save_dir):
+    """``shards.json`` of a sharded build (None if there is none)"""
+    path = os.path.join(save_dir, SHARDS_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_layout(save_dir, layout):
+    os.makedirs(save_dir, exist_ok=True)
+    path = os.path.join(save_dir, SHARDS_FILENAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(layout, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def assign_shards(df, n_shards, partition="hash", layout=None):
+    """Shard number of every row of ``df`` and the layout recording it
+
+    ``layout`` (from an earlier build) keeps products on their shard; new
+    products go to the shard with the fewest complaints.
+    """
+    if partition not in PARTITIONS:
+        raise ValueError(f"Unknown partition {partition!r}, use one of {PARTITIONS}")
+    if partition == "hash":
+        shards = df["Complaint ID"].to_numpy(dtype=np.int64) % n_shards
+        return shards, {"n_shards": n_shards, "partition": partition}
+
+    products = dict((layout or {}).get("products", {}))
+    counts = df["Product"].value_counts()
+    load = np.zeros(n_shards, dtype=np.int64)
+    for product, shard in products.items():
+        load[shard] += counts.get(product, 0)
+    for product, count in counts.items():  # largest first
+        if product not in products:
+            shard = int(np.argmin(load))
+            products[product] = shard
+            load[shard] += count
+    shards = df["Product"].map(products).to_numpy(dtype=np.int64)
+    layout = {"n_shards": n_shards, "partition": partition, "products": products}
+    return shards, layout
+
+
+# --------------------------------------------
+# SERVING SIDE
+# --------------------------------------------
+
+
+def _shard_info(store):
+    return {
+        "version": store.version,
+        "lexical": store.lexical is not None,
+        "products": sorted(p for p in store.chunks.products if p),
+    }
+
+
+def _serve(shard_path, conn, n_threads):
+    """Worker process: map one shard, answer search requests until EOF"""
+    import faiss
+
+    faiss.omp_set_num_threads(n_threads)
+    try:
+        store = MmapVectorStore.load(shard_path, embeddings=None)
+    except Exception as exc:
+        conn.send((None, False, repr(exc)))
+        return
+    conn.send((None, True, _shard_info(store)))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        request_id, method, args = message
+        try:
+            result = getattr(store, method)(*args)
+        except Exception as exc:  # Reported to the caller, worker keeps going
+            conn.send((request_id, False, repr(exc)))
+        else:
+            conn.send((request_id, True, result))
+
+
+class LocalShard:
+    """Shard searched in this process (also the stand-in for a remote node)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.store = MmapVectorStore.load(path, embeddings=None)
+        self.info = _shard_info(self.store)
+
+    def submit(self, method, *args):
+        future = Future()
+        try:
+            future.set_result(getattr(self.store, method)(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+    def close(self):
+        pass
+
+
+class ProcessShard:
+    """Shard searched by a dedicated worker process, over a pipe"""
+
+    def __init__(self, path, n_threads=1):
+        self.path = path
+        context = multiprocessing.get_context("spawn")  # no inherited threads
+        self._conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_serve, args=(path, child_conn, n_threads), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        if not self._conn.poll(WORKER_START_TIMEOUT):
+            self.process.kill()
+            raise TimeoutError(f"Shard worker for {path} did not start")
+        _, ok, info = self._conn.recv()
+        if not ok:
+            raise RuntimeError(f"Shard worker for {path} failed: {info}")
+        self.info = info
+
+        self._ids = itertools.count()
+        self._pending = {}
+        self._send_lock = threading.Lock()
+        self._receiver = threading.Thread(target=self._receive, daemon=True)
+        self._receiver.start()
+
+    def _receive(self):
+        while True:
+            try:
+                request_id, ok, result = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            future = self._pending.pop(request_id, None)
+            if future is None:
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(result))
+        # Worker gone: nothing pending will ever be answered
+        for future in list(self._pending.values()):
+            future.set_exception(RuntimeError(f"Shard worker {self.path} exited"))
+        self._pending.clear()
+
+    def submit(self, method, *args):
+        future = Future()
+        request_id = next(self._ids)
+        self._pending[request_id] = future
+        try:
+            with self._send_lock:
+                self._conn.send((request_id, method, args))
+        except (OSError, ValueError) as exc:
+            self._pending.pop(request_id, None)
+            future.set_exception(exc)
+        return future
+
+    def close(self):
+        try:
+            with self._send_lock:
+                self._conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+        self._conn.close()
+
+
+class ShardedVectorStore(SearchMixin):
+    """Scatter-gather over the shards of a sharded build"""
+
+    def __init__(self, shards, embeddings, layout=None, timeout=SHARD_TIMEOUT):
+        self.shards = shards
+        self.embeddings = embeddings
+        self.layout = layout or {}
+        self.timeout = timeout
+        self.missed = 0  # Shard answers skipped (timeout / failure)
+        self._calls = threading.local()  # Per-thread state of the last search
+        # qrp only checks for None: hybrid mode needs every shard's index
+        self.lexical = True if all(s.info["lexical"] for s in shards) else None
+
+    @classmethod
+    def load(cls, save_dir, embeddings, workers=None, timeout=SHARD_TIMEOUT):
+        """Open every shard; ``workers``: "process" (default) or "local" """
+        layout = load_layout(save_dir)
+        paths = [shard_dir(save_dir, i) for i in range(layout["n_shards"])]
+        workers = workers or SHARD_WORKERS
+        if workers == "local":
+            shards = [LocalShard(path) for path in paths]
+        else:
+            n_threads = max(1, (os.cpu_count() or 1) // len(paths))
+            shards = [ProcessShard(path, n_threads) for path in paths]
+        print(f"Serving {len(shards)} shards of {save_dir} ({workers})")
+        return cls(shards, embeddings, layout, timeout)
+
+    @property
+    def version(self):
+        digest = hashlib.sha1()
+        for shard in self.shards:
+            digest.update(str(shard.info["version"]).encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    @property
+    def products(self):
+        return sorted({p for shard in self.shards for p in shard.info["products"]})
+
+    @property
+    def partial(self):
+        """Whether this thread's last search skipped a shard"""
+        return getattr(self._calls, "partial", False)
+
+    def _targets(self, filter):
+        """Shards that can hold matches (product partitions skip the rest)"""
+        wanted = (filter or {}).get("product")
+        if wanted is None:
+            return self.shards
+        wanted = _as_set(wanted)
+        return [s for s in self.shards if wanted & set(s.info["products"])]
+
+    def _gather(self, method, args, n_queries, k, best_first):
+        targets = self._targets(args[-1])
+        futures = [shard.submit(method, *args) for shard in targets]
+        done, not_done = wait(futures, timeout=self.timeout)
+        answers = []
+        for future in futures:
+            if future in done and future.exception() is None:
+                answers.append(future.result())
+            else:
+                self.missed += 1
+                telemetry.count("shard_misses")
+        self._calls.partial = len(answers) < len(targets)
+        if targets and not answers:
+            raise TimeoutError(f"No shard answered within {self.timeout}s")
+        if not_done:
+            print(f"Skipped {len(not_done)} slow shard(s) after {self.timeout}s")
+
+        merged = []
+        for i in range(n_queries):
+            found = [pair for answer in answers for pair in answer[i]]
+            found.sort(key=lambda pair: pair[1], reverse=best_first)
+            merged.append(found[:k])
+        return merged
+
+    def search(self, queries, k=4, filter=None):
+        """Per-query (document, L2 distance) lists, merged over the shards"""
+        queries = np.asarray(queries, dtype="float32")
+        return self._gather("search", (queries, k, filter), len(queries), k, False)
+
+    def hybrid_search(self, texts, queries, k=4, filter=None):
+        """Per-query (document, fused score) lists, merged over the shards
+
+        Each shard fuses its own rankings, so the merge is approximate.
+        """
+        queries = np.asarray(queries, dtype="float32")
+        args = (list(texts), queries, k, filter)
+        return self._gather("hybrid_search", args, len(texts), k, True)
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+
+class ShardedDocumentStore:
+    """Complaint lookups across the document stores of all shards"""
+
+    def __init__(self, stores):
+        self.stores = stores
+
+    @classmethod
+    def from_dir(cls, save_dir):
+        layout = load_layout(save_dir)
+        return cls(
+            [
+                DocumentStore.from_dir(shard_dir(save_dir, i))
+                for i in range(layout["n_shards"])
+            ]
+        )
+
+    def get_record(self, complaint_id):
+        for store in self.stores:
+            record = store.get_record(complaint_id)
+            if record is not None:
+                return record
+        return None
+
+    def get_narrative(self, complaint_id):
+        record = self.get_record(complaint_id)
+        return record["narrative"] if record is not None else None
+
+    def get_duplicates(self, complaint_id):
+        for store in self.stores:
+            if store.get_record(complaint_id) is not None:
+                return store.get_duplicates(complaint_id)
+        return []
+
+    def get_records(self, complaint_ids):
+        records = {}
+        for store in self.stores:
+            records.update(store.get_records(complaint_ids))
+        return records
+
+    def __len__(self):
+        return sum(len(store) for store in self.stores)
+
+    def close(self):
+        for store in self.stores:
+            store.close()
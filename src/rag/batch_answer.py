@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# src/rag/batch_answer.py
+
+"""
+Batch Question Answering
+
+- Reads questions from a JSONL file (``{"question": ..., "filters": {...}}``
+  per line) or a plain text file (one question per line)
+- Answers them with ``answer_questions``: batched embedding, one
+  multi-query FAISS search and padded generation batches
+- Writes one JSONL record per question with the answer and its sources
+  (with the near-duplicate complaints each source stands for, see
+  src/embeddings/dedup.py)
+
+Example:
+    python -m src.rag.batch_answer --input questions.jsonl \\
+        --output reports/answers.jsonl
+"""
+
+import argparse
+import json
+import os
+import time
+
+from tqdm import tqdm
+
+from .query_rag_pipeline import (
+    GENERATION_BATCH_SIZE,
+    TOP_K,
+    VECTOR_STORE_DIR,
+    answer_questions,
+    get_duplicate_ids,
+    load_vector_store,
+)
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+OUTPUT_PATH = "reports/answers.jsonl"
+QUESTIONS_PER_BATCH = 64  # Questions retrieved + generated together
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def read_questions(path):
+    """List of ``{"question", "filters"}`` records"""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                record = json.loads(line)
+                records.append(
+                    {"question": record["question"], "filters": record.get("filters")}
+                )
+            else:
+                records.append({"question": line, "filters": None})
+    return records
+
+
+def source_record(doc, duplicate_ids=()):
+    return {
+        "chunk_id": doc.id,
+        "complaint_id": doc.metadata.get("complaint_id"),
+        "product": doc.metadata.get("product"),
+        "duplicate_ids": list(duplicate_ids),
+        "text": doc.page_content,
+    }
+
+
+def source_records(sources, vector_store_dir=None):
+    """``source_record`` of every source; with ``vector_store_dir``, the IDs
+    of the near-duplicates it stands for are looked up"""
+    return [
+        source_record(
+            doc, get_duplicate_ids(doc, vector_store_dir) if vector_store_dir else ()
+        )
+        for doc in sources
+    ]
+
+
+def _batches(records, size):
+    """Consecutive runs of records sharing the same filters, at most ``size``"""
+    batch = []
+    for record in records:
+        if batch and (len(batch) == size or record["filters"] != batch[0]["filters"]):
+            yield batch
+            batch = []
+        batch.append(record)
+    if batch:
+        yield batch
+
+
+def answer_file(
+    input_path,
+    output_path,
+    vector_store,
+    top_k=TOP_K,
+    questions_per_batch=QUESTIONS_PER_BATCH,
+    generation_batch_size=GENERATION_BATCH_SIZE,
+    vector_store_dir=None,
+):
+    """Answer every question in ``input_path``; returns the number answered
+
+    ``vector_store_dir`` (the store's directory) adds the near-duplicate IDs
+    of each source.
+    """
+    records = read_questions(input_path)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    n_done = 0
+    with open(output_path, "w", encoding="utf-8") as out:
+        progress = tqdm(total=len(records), desc="Answering")
+        for batch in _batches(records, questions_per_batch):
+            results = answer_questions(
+                [record["question"] for record in batch],
+                vector_store,
+                top_k=top_k,
+                filters=batch[0]["filters"],
+                batch_size=generation_batch_size,
+            )
+            for record, (answer, sources) in zip(batch, results):
+                line = {
+                    **record,
+                    "answer": answer,
+                    "sources": source_records(sources, vector_store_dir),
+                }
+                out.write(json.dumps(line, ensure_ascii=False) + "\n")
+            n_done += len(batch)
+            progress.update(len(batch))
+        progress.close()
+    return n_done
+
+
+# --------------------------------------------
+# MAIN
+# --------------------------------------------
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Answer a file of questions")
+    parser.add_argument("--input", required=True, help=".jsonl or .txt questions")
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--vector-store", default=VECTOR_STORE_DIR)
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--batch-size", type=int, default=QUESTIONS_PER_BATCH)
+    parser.add_argument(
+        "--generation-batch-size", type=int, default=GENERATION_BATCH_SIZE
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    vs = load_vector_store(args.vector_store)
+
+    start = time.perf_counter()
+    n = answer_file(
+        args.input,
+        args.output,
+        vs,
+        top_k=args.top_k,
+        questions_per_batch=args.batch_size,
+        generation_batch_size=args.generation_batch_size,
+        vector_store_dir=args.vector_store,
+    )
+    elapsed = time.perf_counter() - start
+    print(f"Answered {n} questions in {elapsed:.1f}s → {args.output}")
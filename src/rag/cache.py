@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# src/rag/cache.py
+
+"""
+Query / Retrieval / Answer Cache for the RAG Pipeline
+
+- Query embeddings: in-memory LRU (the persistent embedding cache in
+  embedding_cache.py sits below it)
+- Retrievals: keyed by store version + normalized query + k + filters
+  + retrieval mode
+- Answers: keyed by store version + generator + prompt template + question
+  + retrieved chunk IDs
+- Entries expire after a TTL, tiers are bounded by entry count (least
+  recently used are evicted) and can be persisted in SQLite across restarts
+- Keys include the vector store's build id, so a rebuilt store never
+  serves stale retrievals or answers
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.documents import Document
+
+from ..embeddings.embedding_cache import normalize_text
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+CACHE_MAX_ENTRIES = int(os.environ.get("RAG_CACHE_MAX_ENTRIES", "10000"))  # 0: off
+CACHE_TTL_SECONDS = float(os.environ.get("RAG_CACHE_TTL", "86400"))
+CACHE_PATH = os.environ.get("RAG_CACHE_PATH", "")  # Empty: memory only
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get("RAG_QUERY_EMBEDDING_CACHE", "1024"))
+
+_lock = threading.Lock()
+_shared_cache = None
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def make_key(*parts):
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def normalize_query(text):
+    return normalize_text(text).lower()
+
+
+def _doc_to_dict(doc):
+    return {"id": doc.id, "page_content": doc.page_content, "metadata": doc.metadata}
+
+
+def _doc_from_dict(data):
+    return Document(**data)
+
+
+class TTLCache:
+    """Thread-safe LRU with per-entry expiry and optional SQLite persistence
+
+    Values must be JSON-serializable when ``path`` is set.
+    """
+
+    def __init__(self, max_entries, ttl=None, path=None, namespace="default"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires, value)
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (namespace TEXT, key TEXT, "
+                "value TEXT, expires REAL, last_used REAL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _expiry(self):
+        return time.time() + self.ttl if self.ttl else None
+
+    def get(self, key):
+        """Cached value or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self.path:
+                entry = self._load(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.time():
+                self._entries.pop(key, None)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._trim()
+            self.hits += 1
+            return entry[1]
+
+    def _load(self, key):
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT expires, value FROM entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE entries SET last_used = ? WHERE namespace = ? AND key = ?",
+            (time.time(), self.namespace, key),
+        )
+        conn.commit()
+        return row[0], json.loads(row[1])
+
+    def put(self, key, value):
+        with self._lock:
+            entry = (self._expiry(), value)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._trim()
+            if self.path:
+                self._store(key, entry)
+
+    def _store(self, key, entry):
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+            (self.namespace, key, json.dumps(entry[1]), entry[0], now),
+        )
+        count = conn.execute(
+            "SELECT COUNT(*) FROM entries WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+        if count > self.max_entries:
+            # Keep the file bounded too: expired first, then least recently used
+            conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND expires < ?",
+                (self.namespace, now),
+            )
+            conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND key IN ("
+                "SELECT key FROM entries WHERE namespace = ? "
+                "ORDER BY last_used LIMIT max(0, "
+                "(SELECT COUNT(*) FROM entries WHERE namespace = ?) - ?))",
+                (self.namespace, self.namespace, self.namespace, self.max_entries),
+            )
+        conn.commit()
+
+    def _trim(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.path:
+                conn = self._connection()
+                conn.execute(
+                    "DELETE FROM entries WHERE namespace = ?", (self.namespace,)
+                )
+                conn.commit()
+
+
+class RAGCache:
+    """The three cache tiers used by ``query_rag_pipeline``"""
+
+    def __init__(
+        self,
+        max_entries=CACHE_MAX_ENTRIES,
+        ttl=CACHE_TTL_SECONDS,
+        path=CACHE_PATH,
+        query_embedding_size=QUERY_EMBEDDING_CACHE_SIZE,
+    ):
+        self.enabled = max_entries > 0
+        self.query_embeddings = TTLCache(max(query_embedding_size, 1))
+        self.retrievals = TTLCache(
+            max(max_entries, 1), ttl, path or None, namespace="retrieval"
+        )
+        self.answers = TTLCache(max(max_entries, 1), ttl, path or None, "answer")
+
+    def embed_query(self, embeddings, query):
+        model = getattr(embeddings, "model_name", type(embeddings).__name__)
+        key = make_key(model, normalize_text(query))
+        vector = self.query_embeddings.get(key)
+        if vector is None:
+            vector = list(embeddings.embed_query(query))
+            self.query_embeddings.put(key, vector)
+        return vector
+
+    def embed_queries(self, embeddings, queries):
+        """Batch version of ``embed_query``: misses are embedded in one call"""
+        model = getattr(embeddings, "model_name", type(embeddings).__name__)
+        keys = [make_key(model, normalize_text(query)) for query in queries]
+        vectors = [self.query_embeddings.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # Sentence-transformers models embed queries and documents alike
+            computed = embeddings.embed_documents([queries[i] for i in missing])
+            for i, vector in zip(missing, computed):
+                vectors[i] = list(vector)
+                self.query_embeddings.put(keys[i], vectors[i])
+        return vectors
+
+    def get_retrieval(self, version, query, k, filters, mode="dense"):
+        key = make_key(version, normalize_query(query), k, filters, mode)
+        docs = self.retrievals.get(key)
+        return None if docs is None else [_doc_from_dict(d) for d in docs]
+
+    def put_retrieval(self, version, query, k, filters, docs, mode="dense"):
+        key = make_key(version, normalize_query(query), k, filters, mode)
+        self.retrievals.put(key, [_doc_to_dict(doc) for doc in docs])
+
+    def answer_key(self, version, generator, template, question, chunks):
+        chunk_ids = [doc.id for doc in chunks]
+        if None in chunk_ids:  # e.g. legacy stores: no stable chunk ids
+            return None
+        return make_key(
+            version, generator, template, normalize_text(question), chunk_ids
+        )
+
+    def stats(self):
+        return {
+            name: {"hits": tier.hits, "misses": tier.misses, "size": len(tier)}
+            for name, tier in (
+                ("query_embeddings", self.query_embeddings),
+                ("retrievals", self.retrievals),
+                ("answers", self.answers),
+            )
+        }
+
+    def clear(self):
+        for tier in (self.query_embeddings, self.retrievals, self.answers):
+            tier.clear()
+
+
+def get_cache():
+    """Process-wide cache configured from the RAG_CACHE_* environment."""
+    global _shared_cache
+    if _shared_cache is None:
+        with _lock:
+            if _shared_cache is None:
+                _shared_cache = RAGCache()
+    return _shared_cache
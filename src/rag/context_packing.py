@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# src/rag/context_packing.py
+
+"""
+Context Packing for the Generator Prompt
+
+- Retrieved chunks of the same complaint often overlap (chunk_overlap) or
+  sit next to each other: they are merged into one passage, exact
+  duplicates are dropped
+- Optional MMR (maximal marginal relevance) reorders passages so that
+  near-identical complaints don't crowd out the rest; similarity is the
+  word overlap of the passages, so no extra embedding pass is needed
+- Passages are added in order until the token budget is used up; the
+  first one that doesn't fit is cut at a word boundary
+"""
+
+from collections import namedtuple
+
+from ..embeddings.lexical_index import tokenize
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+MERGE_GAP = 1  # Chunks at most this many characters apart are merged
+MMR_LAMBDA = 0.7  # 1.0: pure relevance, 0.0: pure diversity
+MIN_PASSAGE_TOKENS = 16  # Don't cut a passage down to less than this
+
+Passage = namedtuple("Passage", ["text", "rank", "complaint_id"])
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def _span(doc):
+    start = doc.metadata.get("start", -1)
+    end = doc.metadata.get("end", -1)
+    if start is None or start < 0 or end - start != len(doc.page_content):
+        return None  # legacy chunks: no usable offsets
+    return start, end
+
+
+def merge_chunks(chunks):
+    """Passages for ``chunks`` (best rank first)
+
+    Overlapping or adjacent chunks of one complaint become one passage,
+    ranked like its best chunk.
+    """
+    passages = []
+    by_complaint = {}
+    seen_texts = set()
+    for rank, doc in enumerate(chunks):
+        span = _span(doc)
+        if span is None:
+            if doc.page_content not in seen_texts:
+                seen_texts.add(doc.page_content)
+                passages.append(
+                    Passage(doc.page_content, rank, doc.metadata.get("complaint_id"))
+                )
+            continue
+        by_complaint.setdefault(doc.metadata["complaint_id"], []).append(
+            (span[0], span[1], doc.page_content, rank)
+        )
+
+    for cid, spans in by_complaint.items():
+        spans.sort()
+        _, end, text, rank = spans[0]
+        for next_start, next_end, next_text, next_rank in spans[1:]:
+            if next_start > end + MERGE_GAP:
+                passages.append(Passage(text, rank, cid))
+                end, text, rank = next_end, next_text, next_rank
+                continue
+            if next_end > end:
+                if next_start > end:  # the splitter dropped a space in between
+                    text = f"{text} {next_text}"
+                else:
+                    text += next_text[end - next_start :]
+                end = next_end
+            rank = min(rank, next_rank)
+        passages.append(Passage(text, rank, cid))
+    return sorted(passages, key=lambda p: p.rank)
+
+
+def _similarity(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def mmr_order(passages, mmr_lambda=MMR_LAMBDA):
+    """Passages reordered by maximal marginal relevance
+
+    Relevance is the retrieval order, similarity the word-set overlap.
+    """
+    words = [set(tokenize(p.text)) for p in passages]
+    relevance = [1.0 - i / len(passages) for i in range(len(passages))]
+    selected = []
+    remaining = list(range(len(passages)))
+    while remaining:
+        scores = [
+            mmr_lambda * relevance[i]
+            - (1 - mmr_lambda)
+            * max((_similarity(words[i], words[j]) for j in selected), default=0.0)
+            for i in remaining
+        ]
+        selected.append(remaining.pop(scores.index(max(scores))))
+    return [passages[i] for i in selected]
+
+
+def truncate_to_tokens(text, max_tokens, count_tokens):
+    """Longest word prefix of ``text`` with at most ``max_tokens`` tokens"""
+    words = text.split(" ")
+    low, high = 0, len(words)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:mid])) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return " ".join(words[:low])
+
+
+def pack_context(
+    chunks, count_tokens, token_budget=None, mmr=False, separator="\n---\n"
+):
+    """Passage texts for the prompt, within ``token_budget`` tokens in total
+
+    ``count_tokens`` measures text in generator tokens; ``None`` budget
+    keeps every passage.
+    """
+    passages = merge_chunks(chunks)
+    if mmr and len(passages) > 2:
+        passages = mmr_order(passages)
+    texts = [p.text for p in passages]
+    if token_budget is None:
+        return texts
+
+    packed = []
+    used = 0
+    separator_tokens = count_tokens(separator)
+    for text in texts:
+        cost = count_tokens(text) + (separator_tokens if packed else 0)
+        if used + cost <= token_budget:
+            packed.append(text)
+            used += cost
+            continue
+        remaining = token_budget - used - (separator_tokens if packed else 0)
+        if remaining >= MIN_PASSAGE_TOKENS:
+            packed.append(truncate_to_tokens(text, remaining, count_tokens))
+        break
+    return packed
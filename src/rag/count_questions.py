@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# src/rag/count_questions.py
+
+"""
+Routing Counting and Trend Questions to the Aggregate Index
+
+- "How often do people mention fraud in credit cards?", "How many
+  complaints are about late fees?", "Trend of zelle complaints over time"
+  are frequency questions: top-k chunks cannot answer them, the
+  precomputed aggregate index (src/data/aggregate_index.py) can, exactly
+- ``parse_count_question`` recognizes them by their wording and pulls out
+  the phrase, the products named in the question and the breakdown asked
+  for (by product / month / company / issue)
+- ``answer_count_question`` answers from the index, citing the IDs of the
+  latest matching complaints; anything else returns None and goes through
+  normal retrieval + generation
+"""
+
+import os
+import re
+
+from ..data.aggregate_index import (
+    AGGREGATE_INDEX_DIR,
+    AggregateIndex,
+    has_aggregate_index,
+    words,
+)
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+# Directory of the aggregate index ('' disables routing)
+AGGREGATE_INDEX_PATH = os.environ.get("RAG_AGGREGATE_INDEX", AGGREGATE_INDEX_DIR)
+MAX_CITED = 5  # Complaint IDs quoted in an answer
+MAX_ROWS = 12  # Breakdown rows (months: the latest ones)
+
+COUNT_PATTERN = re.compile(
+    r"\b(how (often|many|frequently|common)|number of|count of|frequency"
+    r"|percent(age)?|proportion|share of|trend|over time|per month|by month"
+    r"|monthly|increas\w*|decreas\w*|(most|fewest|more|fewer) complaints)\b"
+)
+# Open questions ("why ...", "what are people saying ...", "summarize ...")
+# need retrieval and generation, unless they ask for a number outright
+OPEN_PATTERN = re.compile(
+    r"^(why|what|summari[sz]e|describe|explain|tell me|give me|list)\b"
+)
+DIRECT_COUNT_PATTERN = re.compile(
+    r"^what(?:'s|\s+(?:is|was|are|were))?\s+(?:the\s+)?(?:number|count|percent"
+    r"(?:age)?|proportion|share|trend|frequency)\b"
+)
+SUBJECT_PATTERN = re.compile(r"\b(mention\w*|complain\w*|report\w*|cite\w*|about)\b")
+TREND_PATTERN = re.compile(
+    r"\b(trend\w*|over time|per month|by month|monthly|increas\w*|decreas\w*"
+    r"|chang\w*)\b"
+)
+BREAKDOWN_PATTERNS = {
+    "company": re.compile(r"\b(by|per|which|top|across) (compan|bank|issuer)\w*"),
+    "issue": re.compile(r"\b(by|per|which|top|across) issues?\b"),
+    "product": re.compile(r"\b(by|per|which|across) products?\b"),
+}
+# The phrase follows these words and ends before a preposition or the end
+_PHRASE_END = (
+    r"(?=\s+(?:in|for|among|across|by|per|over|with|from|at|on|during|"
+    r"within|each|every|this|last)\b|[?.!,;]|$)"
+)
+PHRASE_PATTERNS = [
+    re.compile(r"\bmention(?:s|ed|ing)?\s+(?:of\s+)?(?P<phrase>.+?)" + _PHRASE_END),
+    re.compile(
+        r"\bcomplain\w*\s+(?:about|mentioning|regarding|involving|over|of|"
+        r"related to|concerning|citing)\s+(?P<phrase>.+?)" + _PHRASE_END
+    ),
+    re.compile(
+        r"\b(?:about|regarding|involving|concerning|related to)\s+"
+        r"(?P<phrase>.+?)" + _PHRASE_END
+    ),
+    re.compile(r"\bhow many\s+(?P<phrase>.+?)\s+complaints\b"),
+    # "trend of zelle complaints", "number of overdraft complaints"
+    re.compile(r"\b(?:of|in|for)\s+(?P<phrase>.+?)\s+complaints\b"),
+]
+_SUFFIX = re.compile(r"(ing|ed|es|e|s|ly)$")  # Stripped to compare stems
+# Question words that never belong to the phrase (compared as stems)
+QUESTION_STEMS = frozenset(
+    _SUFFIX.sub("", token)
+    for token in words(
+        "often many frequently common number count frequency percent "
+        "percentage proportion share trend time month monthly increase "
+        "decrease change people consumer customer user complaint complain "
+        "mention report cite product company issue total overall"
+    )
+)
+
+_index = None
+_index_path = None
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def get_aggregate_index(path=None):
+    """The aggregate index at ``path`` (default RAG_AGGREGATE_INDEX), loaded
+    once; None when there is none"""
+    global _index, _index_path
+    path = AGGREGATE_INDEX_PATH if path is None else path
+    if not path or not has_aggregate_index(path):
+        return None
+    if _index is None or _index_path != path:
+        _index, _index_path = AggregateIndex.from_dir(path), path
+    return _index
+
+
+def _stem(token):
+    """``increasing`` / ``increased`` / ``increase`` -> ``increas``"""
+    return _SUFFIX.sub("", token)
+
+
+def product_aliases(products):
+    """Lower-cased ways of naming each product, longest first
+
+    ``Buy Now, Pay Later (BNPL)`` -> ``buy now, pay later (bnpl)``, ``buy
+    now, pay later``, ``buy now pay later``, ``bnpl``; plurals and singulars
+    (``credit cards``, ``money transfer``) are included.
+    """
+    aliases = {}
+    for product in products:
+        name = product.lower()
+        base = re.sub(r"\s*\(.*?\)", "", name).strip()
+        forms = {name, base, base.replace(",", "")}
+        forms |= set(re.findall(r"\((.*?)\)", name))
+        for form in list(forms):
+            forms.add(form[:-1] if form.endswith("s") else form + "s")
+        for form in forms:
+            if form:
+                aliases[form] = product
+    return sorted(aliases.items(), key=lambda item: -len(item[0]))
+
+
+def _find_products(text, products):
+    """Products named in ``text`` and ``text`` without their names"""
+    found = []
+    for alias, product in product_aliases(products):
+        pattern = re.compile(rf"\b{re.escape(alias)}\b")
+        if pattern.search(text):
+            text = pattern.sub(" ", text)
+            if product not in found:
+                found.append(product)
+    return found, text
+
+
+def parse_count_question(question, products=()):
+    """``{"phrase", "products", "by"}`` for a counting question, else None
+
+    ``phrase`` is None when the question counts all complaints (of the
+    products it names).
+    """
+    text = " ".join(question.lower().split())
+    if OPEN_PATTERN.search(text) and not DIRECT_COUNT_PATTERN.search(text):
+        return None
+    if not (COUNT_PATTERN.search(text) and SUBJECT_PATTERN.search(text)):
+        return None
+    named, text = _find_products(text, products)
+
+    by = "month" if TREND_PATTERN.search(text) else None
+    for facet, pattern in BREAKDOWN_PATTERNS.items():
+        if by is None and pattern.search(text):
+            by = facet
+
+    phrase = None
+    for pattern in PHRASE_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            tokens = [
+                t for t in words(match["phrase"]) if _stem(t) not in QUESTION_STEMS
+            ]
+            if tokens:
+                phrase = " ".join(tokens)
+                break
+    if phrase is None and not named:
+        return None
+    return {"phrase": phrase, "products": named, "by": by}
+
+
+def _share(matches, total):
+    return f"{matches:,} of {total:,} ({matches / total:.1%})" if total else "0"
+
+
+def format_count_answer(result, phrase, products, by):
+    scope = f"{' / '.join(products)} complaints" if products else "complaints"
+    if phrase:
+        answer = (
+            f'{_share(result["matches"], result["total"])} {scope} mention "{phrase}"'
+        )
+        if not result["exact"]:
+            answer += " (all of its words, not necessarily together)"
+    else:
+        answer = f"{result['matches']:,} {scope}"
+    lines = [answer + "."]
+
+    breakdown = result["breakdown"]
+    if breakdown:
+        if by == "month":
+            breakdown = breakdown[-MAX_ROWS:]
+            parts = [f"{name}: {matches:,}" for name, matches, _ in breakdown]
+        else:
+            parts = [
+                f"{name}: {_share(matches, total)}"
+                for name, matches, total in breakdown[:MAX_ROWS]
+            ]
+        lines.append(f"By {by}: " + "; ".join(parts) + ".")
+    if result["examples"]:
+        cited = ", ".join(str(cid) for cid in result["examples"])
+        lines.append(f"Example complaints: {cited}.")
+    return "\n".join(lines)
+
+
+def answer_count_question(question, index, filters=None):
+    """Answer from the aggregate index, or None if this isn't a counting
+    question"""
+    parsed = parse_count_question(question, index.products)
+    if parsed is None:
+        return None
+    filters = dict(filters or {})
+    products = parsed["products"]
+    if filters.get("product") is None and products:
+        filters["product"] = products
+    elif filters.get("product") is not None:
+        wanted = filters["product"]
+        products = [wanted] if isinstance(wanted, str) else list(wanted)
+
+    by = parsed["by"]
+    if by is None and len(products) != 1:
+        by = "product"
+    result = index.count(parsed["phrase"], filters, by=by, n_examples=MAX_CITED)
+    return format_count_answer(result, parsed["phrase"], products, by)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# src/rag/micro_batching.py
+
+"""
+Request Micro-Batching for the API Server
+
+- Concurrent callers ``submit`` single items; a background worker collects
+  them into batches of at most ``max_batch_size``, waiting at most
+  ``max_wait_ms`` after the first item for more to arrive
+- Each batch is processed by one call of a blocking ``process(items)``
+  function (run in a thread, so the event loop stays responsive)
+- Backpressure: the queue is bounded; when it is full ``submit`` raises
+  ``Overloaded`` immediately instead of queueing more work
+- Callers that time out are dropped from batches not yet started
+- A failing item fails only its own caller: ``process`` returns the
+  exception in its place
+"""
+
+import asyncio
+import os
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+MAX_BATCH_SIZE = int(os.environ.get("RAG_API_MAX_BATCH_SIZE", "16"))
+MAX_WAIT_MS = float(os.environ.get("RAG_API_MAX_WAIT_MS", "10"))
+MAX_QUEUE_SIZE = int(os.environ.get("RAG_API_MAX_QUEUE", "256"))
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+class Overloaded(Exception):
+    """The batcher's queue is full; the caller should retry later."""
+
+
+class MicroBatcher:
+    """Collects concurrent ``submit`` calls into batches for ``process``
+
+    ``process`` takes a list of items and returns one result per item; an
+    exception instance as a result is raised to that item's caller only.
+    """
+
+    def __init__(
+        self,
+        process,
+        max_batch_size=MAX_BATCH_SIZE,
+        max_wait_ms=MAX_WAIT_MS,
+        max_queue_size=MAX_QUEUE_SIZE,
+        name="batcher",
+    ):
+        self.process = process
+        self.max_batch_size = max(max_batch_size, 1)
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        self.name = name
+        self.batches = 0  # Batches processed
+        self.items = 0  # Items processed
+        self._queue = None
+        self._worker = None
+
+    def start(self):
+        """Start the worker on the running event loop."""
+        if self._worker is None:
+            self._queue = asyncio.Queue(self.max_queue_size)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def pending(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, item, timeout=None):
+        """Result of ``process`` for ``item``; raises ``Overloaded`` or
+        ``asyncio.TimeoutError``"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            raise Overloaded(f"{self.name} queue is full") from None
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            future.cancel()  # No-op once done; otherwise skipped by the worker
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            # Callers that already gave up don't need their item computed
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(None, self.process, items)
+            except Exception as exc:  # Reported to every caller of the batch
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
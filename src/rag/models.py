@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# src/rag/models.py
+
+"""
+Model Lifecycle for the RAG Pipeline
+
+- Loads the embedding model and the answer generator once per process
+- Counts prompt tokens with the generator's tokenizer, loaded on its own
+  (cheap) when the generator isn't
+- Shares them between the Streamlit app, the Gradio app and the API
+- Supports preloading + warm-up at startup, also in a background thread
+  (``BackgroundLoad``)
+- Streams generated text piece by piece (``stream_generate``)
+- Model names are configurable through environment variables
+- RAG_BACKEND=onnx runs both models as int8-quantized ONNX Runtime
+  exports on CPU (see onnx_backend.py)
+"""
+
+import os
+import threading
+
+import torch
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_community.llms import HuggingFacePipeline
+from langchain_core.output_parsers import StrOutputParser
+from transformers import AutoTokenizer, TextIteratorStreamer, pipeline
+
+from ..embeddings.embedding_cache import EMBEDDING_CACHE_PATH, with_cache
+from .onnx_backend import (
+    load_onnx_embedder,
+    load_onnx_generator,
+    split_backend,
+    with_backend,
+)
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+INFERENCE_BACKEND = os.environ.get("RAG_BACKEND", "torch")  # or "onnx"
+EMBEDDING_MODEL_NAME = with_backend(
+    os.environ.get("RAG_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"),
+    INFERENCE_BACKEND,
+)
+GENERATOR_MODEL_NAME = with_backend(
+    os.environ.get("RAG_GENERATOR_MODEL", "google/flan-t5-small"), INFERENCE_BACKEND
+)
+
+MAX_NEW_TOKENS = int(os.environ.get("RAG_MAX_NEW_TOKENS", "512"))
+TEMPERATURE = float(os.environ.get("RAG_TEMPERATURE", "0.2"))
+
+WARMUP_TEXT = "What do customers complain about?"
+CHARS_PER_TOKEN = 4  # Token estimate if the tokenizer can't be loaded (offline)
+
+_lock = threading.Lock()
+_embedders = {}
+_generators = {}
+_tokenizers = {}
+
+# --------------------------------------------
+# LOADERS
+# --------------------------------------------
+
+
+def _load_embedder(model_name):
+    print(f"Loading embedding model: {model_name} ...")
+    base_name, backend = split_backend(model_name)
+    if backend == "onnx":
+        embedder = load_onnx_embedder(base_name)
+    else:
+        embedder = HuggingFaceEmbeddings(model_name=base_name)
+    # Repeated questions are served from the persistent embedding cache
+    return with_cache(embedder, model_name, EMBEDDING_CACHE_PATH)
+
+
+def _load_generator(model_name):
+    print(f"Loading generator model: {model_name} ...")
+    base_name, backend = split_backend(model_name)
+    if backend == "onnx":
+        model, tokenizer = load_onnx_generator(base_name)
+        llm_pipeline = pipeline(
+            "text2text-generation",
+            model=model,
+            tokenizer=tokenizer,
+            max_new_tokens=MAX_NEW_TOKENS,
+            temperature=TEMPERATURE,
+        )
+        return HuggingFacePipeline(pipeline=llm_pipeline)
+
+    llm_pipeline = pipeline(
+        "text2text-generation",
+        model=base_name,
+        device=0 if torch.cuda.is_available() else -1,
+        max_new_tokens=MAX_NEW_TOKENS,
+        temperature=TEMPERATURE,
+    )
+    return HuggingFacePipeline(pipeline=llm_pipeline)
+
+
+def _load_tokenizer(model_name):
+    # The ONNX export keeps the base model's tokenizer
+    base_name, _ = split_backend(model_name)
+    try:
+        return AutoTokenizer.from_pretrained(base_name)
+    except OSError as exc:
+        print(f"Tokenizer of {base_name} unavailable, estimating tokens: {exc}")
+        return None
+
+
+# --------------------------------------------
+# SHARED INSTANCES
+# --------------------------------------------
+
+
+def get_embedder(model_name=None):
+    """Return the process-wide embedding model, loading it on first use."""
+    model_name = model_name or EMBEDDING_MODEL_NAME
+    embedder = _embedders.get(model_name)
+    if embedder is None:
+        with _lock:
+            embedder = _embedders.get(model_name)
+            if embedder is None:
+                embedder = _load_embedder(model_name)
+                _embedders[model_name] = embedder
+    return embedder
+
+
+def get_generator(model_name=None):
+    """Return the process-wide generator LLM, loading it on first use."""
+    model_name = model_name or GENERATOR_MODEL_NAME
+    generator = _generators.get(model_name)
+    if generator is None:
+        with _lock:
+            generator = _generators.get(model_name)
+            if generator is None:
+                generator = _load_generator(model_name)
+                _generators[model_name] = generator
+    return generator
+
+
+def preload_models(embedding_model_name=None, generator_model_name=None, warmup=True):
+    """Load both models up front and optionally run one warm-up pass each."""
+    embedder = get_embedder(embedding_model_name)
+    generator = get_generator(generator_model_name)
+    if warmup:
+        embedder.embed_query(WARMUP_TEXT)
+        generator.invoke(WARMUP_TEXT)
+    return embedder, generator
+
+
+class BackgroundLoad:
+    """Runs ``load()`` in a daemon thread; ``result()`` waits for its value.
+
+    Lets a UI render while the models and the vector store warm up.
+    """
+
+    def __init__(self, load, name="rag-warmup"):
+        self._done = threading.Event()
+        self._value = None
+        self._error = None
+        threading.Thread(target=self._run, args=(load,), name=name, daemon=True).start()
+
+    def _run(self, load):
+        try:
+            self._value = load()
+        except BaseException as exc:  # Re-raised by result()
+            self._error = exc
+        finally:
+            self._done.set()
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError("Background load still running")
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+def get_tokenizer(model_name=None):
+    """Return the generator's tokenizer without loading the generator.
+
+    Reuses the loaded generator's tokenizer, otherwise loads the tokenizer
+    alone once; None if it can't be loaded.
+    """
+    model_name = model_name or GENERATOR_MODEL_NAME
+    generator = _generators.get(model_name)
+    tokenizer = getattr(getattr(generator, "pipeline", None), "tokenizer", None)
+    if tokenizer is not None:
+        return tokenizer
+    if model_name not in _tokenizers:
+        with _lock:
+            if model_name not in _tokenizers:
+                _tokenizers[model_name] = _load_tokenizer(model_name)
+    return _tokenizers[model_name]
+
+
+def count_tokens(text):
+    """Length of ``text`` in generator tokens.
+
+    Estimated from the character count if the tokenizer can't be loaded.
+    """
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+def stream_generate(llm, prompt):
+    """Yield the generated text in pieces, as the model produces them."""
+    pipe = getattr(llm, "pipeline", None)
+    if pipe is None or not hasattr(pipe, "model"):  # any other LangChain LLM
+        yield from (llm | StrOutputParser()).stream(prompt)
+        return
+
+    # Same settings as the pipeline, decoded token by token in this thread
+    streamer = TextIteratorStreamer(
+        pipe.tokenizer, skip_prompt=True, skip_special_tokens=True
+    )
+    inputs = pipe.tokenizer(prompt, return_tensors="pt", truncation=True)
+    inputs = inputs.to(pipe.model.device)
+    errors = []
+
+    def generate():
+        try:
+            pipe.model.generate(
+                **inputs,
+                streamer=streamer,
+                max_new_tokens=MAX_NEW_TOKENS,
+                temperature=TEMPERATURE,
+            )
+        except Exception as exc:  # Re-raised in the consuming thread
+            errors.append(exc)
+            streamer.end()
+
+    thread = threading.Thread(target=generate, daemon=True)
+    thread.start()
+    for piece in streamer:
+        if piece:
+            yield piece
+    thread.join()
+    if errors:
+        raise errors[0]
+
+
+def clear_models():
+    """Drop all cached models (mainly for tests and model swaps)."""
+    with _lock:
+        _embedders.clear()
+        _generators.clear()
+        _tokenizers.clear()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# src/rag/onnx_backend.py
+
+"""
+Quantized ONNX Runtime Backend for CPU Inference
+
+- Exports the embedder (MiniLM) and the generator (Flan-T5) to ONNX and
+  applies int8 dynamic quantization (weights int8, activations quantized
+  on the fly, no calibration data needed)
+- A model runs on this backend when its name carries the ``@onnx-int8``
+  suffix (``with_backend``); the suffixed name is what the embedding
+  cache, the manifest and the answer cache see, so vectors and answers
+  of the two backends never get mixed up
+- ``check_parity`` compares both backends on the same texts: embedding
+  cosine similarity, answer token F1, CPU time per item
+
+Needs ``optimum[onnxruntime]`` (``onnx-requirements.txt``, not installed by
+requirements.txt; imported only when the backend is used).
+
+Example:
+    python -m src.rag.onnx_backend --export      # one-off, into models/onnx
+    python -m src.rag.onnx_backend --check       # parity + speed report
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+BACKENDS = ("torch", "onnx")
+ONNX_SUFFIX = "@onnx-int8"
+
+ONNX_DIR = os.environ.get("RAG_ONNX_DIR", "models/onnx")
+# Instruction set the int8 kernels target: arm64, avx2, avx512, avx512_vnni
+QUANTIZATION = os.environ.get("RAG_ONNX_QUANTIZATION", "avx2")
+
+MIN_EMBEDDING_COSINE = 0.99  # Per text, quantized vs. PyTorch
+MIN_ANSWER_F1 = 0.8  # Mean token F1 of the answers, quantized vs. PyTorch
+REPORT_PATH = "reports/onnx_parity.json"
+
+SAMPLE_TEXTS = [
+    "I was charged a late fee even though my payment was made on time.",
+    "The Zelle payment I sent never arrived and the bank will not help.",
+    "My BNPL installment was taken twice from my checking account.",
+    "They raised the interest rate on my credit card without any notice.",
+    "A personal loan I never applied for appeared on my credit report.",
+    "My savings account was frozen and I could not pay my rent.",
+    "I disputed the transaction several times and was denied each time.",
+    "Customer service kept transferring me and hung up after an hour.",
+]
+SAMPLE_QUESTIONS = [
+    "Why are customers unhappy with late fees?",
+    "What goes wrong with money transfers?",
+    "What do customers report about BNPL payments?",
+    "What happens with credit card interest rates?",
+]
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+def with_backend(model_name, backend):
+    """Model name that selects ``backend`` when loaded"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    base, _ = split_backend(model_name)
+    return base + ONNX_SUFFIX if backend == "onnx" else base
+
+
+def split_backend(model_name):
+    """``"org/model@onnx-int8"`` -> ``("org/model", "onnx")``"""
+    if model_name.endswith(ONNX_SUFFIX):
+        return model_name[: -len(ONNX_SUFFIX)], "onnx"
+    return model_name, "torch"
+
+
+def export_dir(model_name, onnx_dir=None):
+    return os.path.join(onnx_dir or ONNX_DIR, model_name.replace("/", "__"))
+
+
+def _embedder_file():
+    return f"onnx/model_qint8_{QUANTIZATION}.onnx"
+
+
+def export_embedder(model_name, onnx_dir=None):
+    """Export + quantize a sentence-transformers model, return its dir"""
+    from sentence_transformers import (
+        SentenceTransformer,
+        export_dynamic_quantized_onnx_model,
+    )
+
+    out_dir = export_dir(model_name, onnx_dir)
+    print(f"Exporting {model_name} to ONNX ({QUANTIZATION} int8) → {out_dir}")
+    model = SentenceTransformer(model_name, backend="onnx", device="cpu")
+    model.save(out_dir)
+    export_dynamic_quantized_onnx_model(model, QUANTIZATION, out_dir)
+    return out_dir
+
+
+def export_generator(model_name, onnx_dir=None):
+    """Export + quantize an encoder-decoder model, return its dir"""
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    out_dir = export_dir(model_name, onnx_dir)
+    print(f"Exporting {model_name} to ONNX ({QUANTIZATION} int8) → {out_dir}")
+    config = getattr(AutoQuantizationConfig, QUANTIZATION)(is_static=False)
+    with tempfile.TemporaryDirectory() as fp32_dir:
+        model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True)
+        model.save_pretrained(fp32_dir)
+        # Encoder and decoder(s) are separate graphs, each quantized alone
+        for path in sorted(glob.glob(os.path.join(fp32_dir, "*.onnx"))):
+            quantizer = ORTQuantizer.from_pretrained(
+                fp32_dir, file_name=os.path.basename(path)
+            )
+            quantizer.quantize(save_dir=out_dir, quantization_config=config)
+        for name in ("config.json", "generation_config.json"):
+            if os.path.exists(os.path.join(fp32_dir, name)):
+                shutil.copy(os.path.join(fp32_dir, name), out_dir)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(out_dir)
+    return out_dir
+
+
+def _generator_files(out_dir):
+    files = {"encoder_file_name": "encoder_model_quantized.onnx"}
+    if os.path.exists(os.path.join(out_dir, "decoder_model_merged_quantized.onnx")):
+        files["decoder_file_name"] = "decoder_model_merged_quantized.onnx"
+    else:
+        files["decoder_file_name"] = "decoder_model_quantized.onnx"
+        if os.path.exists(
+            os.path.join(out_dir, "decoder_with_past_model_quantized.onnx")
+        ):
+            files[
+                "decoder_with_past_file_name"
+            ] = "decoder_with_past_model_quantized.onnx"
+    return files
+
+
+def load_onnx_embedder(model_name, encode_kwargs=None, onnx_dir=None):
+    """LangChain embeddings running the quantized export (exported on first use)"""
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    out_dir = export_dir(model_name, onnx_dir)
+    if not os.path.exists(os.path.join(out_dir, _embedder_file())):
+        export_embedder(model_name, onnx_dir)
+    return HuggingFaceEmbeddings(
+        model_name=out_dir,
+        model_kwargs={
+            "backend": "onnx",
+            "device": "cpu",
+            "model_kwargs": {"file_name": _embedder_file()},
+        },
+        encode_kwargs=encode_kwargs or {},
+    )
+
+
+def load_onnx_generator(model_name, onnx_dir=None):
+    """``(model, tokenizer)`` of the quantized export (exported on first use)"""
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    from transformers import AutoTokenizer
+
+    out_dir = export_dir(model_name, onnx_dir)
+    if not os.path.exists(os.path.join(out_dir, "encoder_model_quantized.onnx")):
+        export_generator(model_name, onnx_dir)
+    model = ORTModelForSeq2SeqLM.from_pretrained(out_dir, **_generator_files(out_dir))
+    return model, AutoTokenizer.from_pretrained(out_dir)
+
+
+def cosine_similarities(a, b):
+    """Row-wise cosine similarity of two ``(n, dim)`` matrices"""
+    a = np.asarray(a, dtype="float32")
+    b = np.asarray(b, dtype="float32")
+    norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+    return (a * b).sum(axis=1) / np.maximum(norms, 1e-12)
+
+
+def token_f1(prediction, reference):
+    """SQuAD-style token overlap F1 of two answers"""
+    pred = re.findall(r"\w+", prediction.lower())
+    ref = re.findall(r"\w+", reference.lower())
+    if not pred or not ref:
+        return float(pred == ref)
+    common = sum(min(pred.count(t), ref.count(t)) for t in set(pred))
+    if not common:
+        return 0.0
+    precision, recall = common / len(pred), common / len(ref)
+    return 2 * precision * recall / (precision + recall)
+
+
+def _cpu_ms_per_item(fn, n_items):
+    fn()  # warm-up (session init, lazy allocations)
+    start = time.process_time()
+    result = fn()
+    return result, round((time.process_time() - start) * 1000 / n_items, 3)
+
+
+def _onnx_mb(model_name, onnx_dir=None):
+    paths = glob.glob(
+        os.path.join(export_dir(model_name, onnx_dir), "**", "*quantized*.onnx"),
+        recursive=True,
+    ) + glob.glob(
+        os.path.join(export_dir(model_name, onnx_dir), "onnx", "*qint8*.onnx")
+    )
+    return round(sum(os.path.getsize(p) for p in set(paths)) / 2**20, 1)
+
+
+def check_parity(
+    embedders, generators, texts, prompts, embedding_model_name, generator_model_name
+):
+    """Compare ``(torch, onnx)`` embedder and generator pairs on the same inputs"""
+    from .query_rag_pipeline import generate_answers
+
+    torch_vectors, torch_embed_ms = _cpu_ms_per_item(
+        lambda: embedders[0].embed_documents(texts), len(texts)
+    )
+    onnx_vectors, onnx_embed_ms = _cpu_ms_per_item(
+        lambda: embedders[1].embed_documents(texts), len(texts)
+    )
+    cosines = cosine_similarities(torch_vectors, onnx_vectors)
+
+    torch_answers, torch_gen_ms = _cpu_ms_per_item(
+        lambda: generate_answers(prompts, generators[0]), len(prompts)
+    )
+    onnx_answers, onnx_gen_ms = _cpu_ms_per_item(
+        lambda: generate_answers(prompts, generators[1]), len(prompts)
+    )
+    f1 = [token_f1(o, t) for o, t in zip(onnx_answers, torch_answers)]
+
+    report = {
+        "quantization": QUANTIZATION,
+        "embedder": {
+            "model": embedding_model_name,
+            "min_cosine": round(float(cosines.min()), 5),
+            "mean_cosine": round(float(cosines.mean()), 5),
+            "cpu_ms_per_text": {"torch": torch_embed_ms, "onnx": onnx_embed_ms},
+            "onnx_mb": _onnx_mb(embedding_model_name),
+        },
+        "generator": {
+            "model": generator_model_name,
+            "mean_f1": round(float(np.mean(f1)), 4),
+            "exact_match": round(
+                float(np.mean([o == t for o, t in zip(onnx_answers, torch_answers)])),
+                4,
+            ),
+            "cpu_ms_per_answer": {"torch": torch_gen_ms, "onnx": onnx_gen_ms},
+            "onnx_mb": _onnx_mb(generator_model_name),
+        },
+    }
+    report["passed"] = (
+        report["embedder"]["min_cosine"] >= MIN_EMBEDDING_COSINE
+        and report["generator"]["mean_f1"] >= MIN_ANSWER_F1
+    )
+    return report
+
+
+# --------------------------------------------
+# MAIN
+# --------------------------------------------
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Quantized ONNX Runtime backend")
+    parser.add_argument("--export", action="store_true", help="(Re-)export models")
+    parser.add_argument("--check", action="store_true", help="Run the parity check")
+    parser.add_argument("--output", default=REPORT_PATH)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    import sys
+
+    from . import models
+    from .query_rag_pipeline import PROMPT_TEMPLATE
+
+    args = parse_args()
+    embedding_model, _ = split_backend(models.EMBEDDING_MODEL_NAME)
+    generator_model, _ = split_backend(models.GENERATOR_MODEL_NAME)
+    if args.export:
+        export_embedder(embedding_model)
+        export_generator(generator_model)
+    if not args.check:
+        sys.exit(0)
+
+    # Loaded directly: the shared embedder answers repeats from its cache
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    embedders = [
+        HuggingFaceEmbeddings(model_name=embedding_model),
+        load_onnx_embedder(embedding_model),
+    ]
+    generators = [
+        models._load_generator(with_backend(generator_model, b)) for b in BACKENDS
+    ]
+    prompts = [
+        PROMPT_TEMPLATE.format(context=text, question=question)
+        for text, question in zip(SAMPLE_TEXTS, SAMPLE_QUESTIONS)
+    ]
+    report = check_parity(
+        embedders, generators, SAMPLE_TEXTS, prompts, embedding_model, generator_model
+    )
+    print(json.dumps(report, indent=2))
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved report → {args.output}")
+    sys.exit(0 if report["passed"] else 1)
@@ -1,17 +1,42 @@
 #!/usr/bin/env python3
 # src/rag/query_rag_pipeline.py
 
-import torch
+import os
+
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.llms import HuggingFacePipeline
 
 from langchain_core.output_parsers import StrOutputParser
-from transformers import pipeline
+
+from ..embeddings.chunk_store import has_chunk_store
+from ..embeddings.document_store import DocumentStore, has_document_store
+from ..embeddings.mmap_store import MmapVectorStore
+from ..embeddings.sharded_store import (
+    ShardedDocumentStore,
+    ShardedVectorStore,
+    is_sharded_store,
+)
+from . import telemetry
+from .cache import get_cache
+from .context_packing import pack_context
+from .count_questions import answer_count_question, get_aggregate_index
+from .models import (
+    EMBEDDING_MODEL_NAME,
+    GENERATOR_MODEL_NAME,
+    count_tokens,
+    get_embedder,
+    get_generator,
+    stream_generate,
+)
 
 VECTOR_STORE_DIR = "vector_store/faiss_index"
-EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 TOP_K = 5
+GENERATION_BATCH_SIZE = int(os.environ.get("RAG_GENERATION_BATCH_SIZE", "8"))
+RETRIEVAL_MODE = os.environ.get("RAG_RETRIEVAL_MODE", "dense")  # or "hybrid"
+RETRIEVAL_MODES = ("dense", "hybrid")
+# Whole prompt, in generator tokens (Flan-T5 reads at most 512); 0: no limit
+PROMPT_TOKEN_BUDGET = int(os.environ.get("RAG_PROMPT_TOKENS", "512"))
+CONTEXT_MMR = os.environ.get("RAG_CONTEXT_MMR", "0") == "1"
+CONTEXT_SEPARATOR = "\n---\n"
 
 PROMPT_TEMPLATE = """You are a financial analyst assistant for CrediTrust.
 Your task is to answer questions about customer complaints. Use the following
@@ -28,58 +53,413 @@ Answer:
 """
 
 
-VECTOR_STORE_DIR = "vector_store/faiss_index"
-EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
-
-
 def load_vector_store(
     vector_store_dir: str = VECTOR_STORE_DIR,
     embedding_model_name: str = EMBEDDING_MODEL_NAME,
+    mmap: bool = True,
 ):
-    embeddings_model = HuggingFaceEmbeddings(model_name=embedding_model_name)
+    """Open the vector store; files are memory-mapped, not read into RAM.
+
+    A sharded build is served by one worker process per shard.
+    """
+    embeddings_model = get_embedder(embedding_model_name)
+    if is_sharded_store(vector_store_dir):
+        return ShardedVectorStore.load(vector_store_dir, embeddings_model)
+    if has_chunk_store(vector_store_dir):
+        return MmapVectorStore.load(vector_store_dir, embeddings_model, mmap=mmap)
+
+    print(
+        f"{vector_store_dir} uses the legacy pickle format, convert it with "
+        f"`python -m src.embeddings.mmap_store --convert {vector_store_dir}`"
+    )
     vector_store = FAISS.load_local(
         vector_store_dir, embeddings_model, allow_dangerous_deserialization=True
     )
     return vector_store
 
 
-def retrieve_chunks(vector_store, query, top_k=TOP_K):
-    """Embed question and retrieve top-k similar chunks."""
-    results = vector_store.similarity_search(query, k=top_k)
-    return results
+_document_stores = {}
+
+
+def load_document_store(vector_store_dir: str = VECTOR_STORE_DIR):
+    """Return the complaint side table of a vector store (opened lazily)."""
+    store = _document_stores.get(vector_store_dir)
+    if store is None:
+        if is_sharded_store(vector_store_dir):
+            store = ShardedDocumentStore.from_dir(vector_store_dir)
+        else:
+            store = DocumentStore.from_dir(vector_store_dir)
+        store = _document_stores.setdefault(vector_store_dir, store)
+    return store
+
+
+def get_full_narrative(doc, vector_store_dir: str = VECTOR_STORE_DIR):
+    """Look up the full narrative a retrieved chunk belongs to."""
+    if "original_narrative" in doc.metadata:  # index built before the side table
+        return doc.metadata["original_narrative"]
+    store = load_document_store(vector_store_dir)
+    return store.get_narrative(doc.metadata["complaint_id"])
+
+
+def get_duplicate_ids(doc, vector_store_dir: str = VECTOR_STORE_DIR):
+    """IDs of the near-duplicate complaints a retrieved chunk stands for.
+
+    Empty for stores without a document store (legacy builds).
+    """
+    if not (is_sharded_store(vector_store_dir) or has_document_store(vector_store_dir)):
+        return []
+    store = load_document_store(vector_store_dir)
+    return store.get_duplicates(doc.metadata["complaint_id"])
+
+
+def list_products(vector_store):
+    """Product names the store's chunks can be filtered by."""
+    if isinstance(vector_store, ShardedVectorStore):
+        return vector_store.products
+    chunks = getattr(vector_store, "chunks", None)  # unknown for legacy stores
+    return sorted(p for p in chunks.products if p) if chunks is not None else []
+
+
+def _active_cache(vector_store, cache):
+    """The cache to use, or None (disabled, or store without a build id)."""
+    cache = cache or get_cache()
+    if not cache.enabled or getattr(vector_store, "version", None) is None:
+        return None
+    return cache
+
+
+def _retrieval_mode(vector_store, mode):
+    mode = mode or RETRIEVAL_MODE
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode {mode!r}, use {RETRIEVAL_MODES}")
+    # Legacy stores and stores built before the lexical index are dense only
+    if mode == "hybrid" and getattr(vector_store, "lexical", None) is None:
+        return "dense"
+    return mode
+
+
+def retrieve_chunks(
+    vector_store, query, top_k=TOP_K, filters=None, cache=None, mode=None
+):
+    """Embed question and retrieve top-k similar chunks.
+
+    ``filters`` restricts the search to matching chunks, e.g.
+    ``{"product": "Credit card", "date_from": "2023-01-01"}`` (keys:
+    product, company, date_from, date_to). ``mode="hybrid"`` fuses the
+    dense ranking with BM25 keyword matches (default: RAG_RETRIEVAL_MODE).
+    Results and query embeddings are cached (see cache.py).
+    """
+    return _retrieve_chunks(vector_store, query, top_k, filters, cache, mode)[0]
+
+
+def _retrieve_chunks(vector_store, query, top_k, filters, cache, mode=None):
+    """``retrieve_chunks`` and whether the search was complete"""
+    with telemetry.span("retrieve"):
+        results, complete = _retrieve(vector_store, query, top_k, filters, cache, mode)
+    telemetry.count("chunks_retrieved", len(results))
+    return results, complete
+
+
+def _searched_all(vector_store):
+    """False when the last search (on this thread) skipped a shard: a
+    partial result is neither cached nor answered from the cache"""
+    return not getattr(vector_store, "partial", False)
+
+
+def _retrieve(vector_store, query, top_k, filters, cache, mode):
+    mode = _retrieval_mode(vector_store, mode)
+    cache = _active_cache(vector_store, cache)
+    if cache is None:
+        with telemetry.span("search"):  # embedding included
+            if mode == "hybrid":
+                found = vector_store.hybrid_search_with_score(
+                    query, k=top_k, filter=filters
+                )
+                return [doc for doc, _ in found], _searched_all(vector_store)
+            found = vector_store.similarity_search(query, k=top_k, filter=filters)
+            return found, _searched_all(vector_store)
+
+    results = cache.get_retrieval(vector_store.version, query, top_k, filters, mode)
+    if results is not None:
+        telemetry.count("retrieval_cache_hits")
+        return results, True
+
+    with telemetry.span("embed_query"):
+        embedding = cache.embed_query(vector_store.embeddings, query)
+    with telemetry.span("search"):
+        if mode == "hybrid":
+            found = vector_store.hybrid_search([query], [embedding], top_k, filters)
+            results = [doc for doc, _ in found[0]]
+        else:
+            results = vector_store.similarity_search_by_vector(
+                embedding, k=top_k, filter=filters
+            )
+    complete = _searched_all(vector_store)
+    if complete:
+        cache.put_retrieval(vector_store.version, query, top_k, filters, results, mode)
+    return results, complete
+
+
+def retrieve_chunks_batch(
+    vector_store, queries, top_k=TOP_K, filters=None, cache=None, mode=None
+):
+    """Top-k chunks for many questions: one embedding batch, one FAISS search."""
+    return _retrieve_chunks_batch(vector_store, queries, top_k, filters, cache, mode)[0]
+
+
+def _retrieve_chunks_batch(
+    vector_store, queries, top_k=TOP_K, filters=None, cache=None, mode=None
+):
+    """``retrieve_chunks_batch`` and, per query, whether its search was complete"""
+    mode = _retrieval_mode(vector_store, mode)
+    cache = _active_cache(vector_store, cache)
+    complete = [True] * len(queries)
+    results = [None] * len(queries)
+    if cache is not None:
+        results = [
+            cache.get_retrieval(vector_store.version, query, top_k, filters, mode)
+            for query in queries
+        ]
+    todo = [i for i, docs in enumerate(results) if docs is None]
+    if cache is not None and len(todo) < len(queries):
+        telemetry.count("retrieval_cache_hits", len(queries) - len(todo))
+    if not todo:
+        return results, complete
+
+    todo_queries = [queries[i] for i in todo]
+    with telemetry.span("embed_query"):
+        if cache is not None:
+            vectors = cache.embed_queries(vector_store.embeddings, todo_queries)
+        else:
+            vectors = vector_store.embeddings.embed_documents(todo_queries)
+    with telemetry.span("search"):
+        if mode == "hybrid":
+            found = [
+                [doc for doc, _ in docs]
+                for docs in vector_store.hybrid_search(
+                    todo_queries, vectors, top_k, filters
+                )
+            ]
+        elif hasattr(vector_store, "similarity_search_by_vectors"):
+            found = vector_store.similarity_search_by_vectors(
+                vectors, k=top_k, filter=filters
+            )
+        else:  # legacy LangChain store: one search per question
+            found = [
+                vector_store.similarity_search_by_vector(v, k=top_k, filter=filters)
+                for v in vectors
+            ]
+    telemetry.count("chunks_retrieved", sum(len(docs) for docs in found))
+    searched_all = _searched_all(vector_store)
+    for i, docs in zip(todo, found):
+        results[i] = docs
+        complete[i] = searched_all
+        if cache is not None and searched_all:
+            cache.put_retrieval(
+                vector_store.version, queries[i], top_k, filters, docs, mode
+            )
+    return results, complete
 
 
-def build_prompt(context_chunks, question):
-    """Construct prompt for LLM."""
-    context_texts = [doc.page_content for doc in context_chunks]
-    context_str = "\n---\n".join(context_texts)
-    prompt = PROMPT_TEMPLATE.format(context=context_str, question=question)
+def build_prompt(
+    context_chunks, question, token_budget=PROMPT_TOKEN_BUDGET, mmr=CONTEXT_MMR
+):
+    """Construct prompt for LLM.
+
+    Overlapping chunks of a complaint are merged and the context is cut to
+    fit the prompt into ``token_budget`` generator tokens (see
+    context_packing.py); ``mmr`` diversifies the passages first.
+    """
+    with telemetry.span("build_prompt"):
+        context_budget = None
+        if token_budget:
+            frame = PROMPT_TEMPLATE.format(context="", question=question)
+            context_budget = max(token_budget - count_tokens(frame), 0)
+        context_texts = pack_context(
+            context_chunks, count_tokens, context_budget, mmr, CONTEXT_SEPARATOR
+        )
+        context_str = CONTEXT_SEPARATOR.join(context_texts)
+        prompt = PROMPT_TEMPLATE.format(context=context_str, question=question)
+    if telemetry.active():
+        telemetry.count("prompt_tokens", count_tokens(prompt))
     return prompt
 
 
-def generate_answer(prompt):
-    llm_pipeline = pipeline(
-        "text2text-generation",
-        model="google/flan-t5-small",
-        device=0 if torch.cuda.is_available() else -1,
-        max_new_tokens=512,
-        temperature=0.2,
-    )
-    llm = HuggingFacePipeline(pipeline=llm_pipeline)
+def _count_generated(answers):
+    if telemetry.active():
+        telemetry.count("generated_tokens", sum(count_tokens(a) for a in answers))
+
+
+def generate_answer(prompt, llm=None):
+    """Generate an answer with the shared (already loaded) generator."""
+    llm = llm or get_generator()
     output_parser = StrOutputParser()
     chain = llm | output_parser
-    answer = chain.invoke(prompt)
+    with telemetry.span("generate"):
+        answer = chain.invoke(prompt)
+    _count_generated([answer])
     return answer
 
 
-def answer_question(question, vector_store, top_k=TOP_K):
-    """End-to-end RAG process for a single user question."""
-    chunks = retrieve_chunks(vector_store, question, top_k)
+def generate_answers(prompts, llm=None, batch_size=GENERATION_BATCH_SIZE):
+    """Generate answers for many prompts in padded batches."""
+    if not prompts:
+        return []
+    llm = llm or get_generator()
+    unique = list(dict.fromkeys(prompts))
+    pipe = getattr(llm, "pipeline", None)
+    with telemetry.span("generate"):
+        if pipe is None:
+            answers = (llm | StrOutputParser()).batch(unique)
+        else:
+            # Similar lengths per batch keep padding small
+            order = sorted(range(len(unique)), key=lambda i: len(unique[i]))
+            outputs = pipe([unique[i] for i in order], batch_size=batch_size)
+            answers = [None] * len(unique)
+            for i, output in zip(order, outputs):
+                output = output[0] if isinstance(output, list) else output
+                answers[i] = output["generated_text"]
+    _count_generated(answers)
+    lookup = dict(zip(unique, answers))
+    return [lookup[prompt] for prompt in prompts]
+
+
+def _answer_key(cache, vector_store, question, chunks):
+    if cache is None:
+        return None
+    # Anything that changes the prompt for the same chunks is part of the key
+    template = [PROMPT_TEMPLATE, PROMPT_TOKEN_BUDGET, CONTEXT_MMR]
+    return cache.answer_key(
+        vector_store.version, GENERATOR_MODEL_NAME, template, question, chunks
+    )
+
+
+def answer_from_aggregates(question, filters=None, aggregates=None):
+    """Answer a counting / trend question from the aggregate index.
+
+    Returns None for any other question, or when there is no index
+    (``aggregates`` defaults to the one at RAG_AGGREGATE_INDEX).
+    """
+    if aggregates is None:
+        aggregates = get_aggregate_index()
+        if aggregates is None:
+            return None
+    with telemetry.span("aggregate"):
+        answer = answer_count_question(question, aggregates, filters)
+    if answer is not None:
+        telemetry.count("aggregate_answers")
+    return answer
+
+
+def answer_question(
+    question, vector_store, top_k=TOP_K, filters=None, cache=None, aggregates=None
+):
+    """End-to-end RAG process for a single user question.
+
+    Counting and trend questions are answered from the aggregate index
+    (no sources, the answer cites complaint IDs); see count_questions.py.
+    Stage timings and counters go to telemetry.py; wrap the call in
+    ``telemetry.tracing()`` to get them for this question only.
+    """
+    answer = answer_from_aggregates(question, filters, aggregates)
+    if answer is not None:
+        return answer, []
+    chunks, complete = _retrieve_chunks(vector_store, question, top_k, filters, cache)
+
+    cache = _active_cache(vector_store, cache) if complete else None
+    key = _answer_key(cache, vector_store, question, chunks)
+    if key:
+        answer = cache.answers.get(key)
+        if answer is not None:
+            telemetry.count("answer_cache_hits")
+            return answer, chunks
+
     prompt = build_prompt(chunks, question)
     answer = generate_answer(prompt)
+    if key:
+        cache.answers.put(key, answer)
     return answer, chunks
 
 
+def stream_answer(
+    question, vector_store, top_k=TOP_K, filters=None, cache=None, aggregates=None
+):
+    """Streaming version of ``answer_question``: ``(chunks, tokens)``.
+
+    The chunks are returned as soon as retrieval is done; ``tokens`` is
+    an iterator over the answer text as it is generated.
+    """
+    counted = answer_from_aggregates(question, filters, aggregates)
+    if counted is not None:
+        return [], iter([counted])
+    chunks, complete = _retrieve_chunks(vector_store, question, top_k, filters, cache)
+
+    cache = _active_cache(vector_store, cache) if complete else None
+    key = _answer_key(cache, vector_store, question, chunks)
+    answer = cache.answers.get(key) if key else None
+
+    def tokens():
+        if answer is not None:
+            telemetry.count("answer_cache_hits")
+            yield answer
+            return
+        pieces = []
+        prompt = build_prompt(chunks, question)
+        with telemetry.span("generate"):  # includes the time the consumer takes
+            for piece in stream_generate(get_generator(), prompt):
+                pieces.append(piece)
+                yield piece
+        _count_generated(["".join(pieces)])
+        if key:  # Only complete answers are cached
+            cache.answers.put(key, "".join(pieces))
+
+    return chunks, tokens()
+
+
+def answer_questions(
+    questions,
+    vector_store,
+    top_k=TOP_K,
+    filters=None,
+    cache=None,
+    batch_size=GENERATION_BATCH_SIZE,
+    aggregates=None,
+):
+    """Batch version of ``answer_question``: a list of (answer, chunks)."""
+    questions = list(questions)
+    counted = [answer_from_aggregates(q, filters, aggregates) for q in questions]
+    rest = [q for q, answer in zip(questions, counted) if answer is None]
+    results = iter(
+        _answer_questions(rest, vector_store, top_k, filters, cache, batch_size)
+        if rest
+        else []
+    )
+    return [(answer, []) if answer is not None else next(results) for answer in counted]
+
+
+def _answer_questions(questions, vector_store, top_k, filters, cache, batch_size):
+    chunk_lists, complete = _retrieve_chunks_batch(
+        vector_store, questions, top_k, filters, cache
+    )
+
+    cache = _active_cache(vector_store, cache)
+    keys = [
+        _answer_key(cache, vector_store, question, chunks) if ok else None
+        for question, chunks, ok in zip(questions, chunk_lists, complete)
+    ]
+    answers = [cache.answers.get(key) if key else None for key in keys]
+
+    todo = [i for i, answer in enumerate(answers) if answer is None]
+    if len(todo) < len(answers):
+        telemetry.count("answer_cache_hits", len(answers) - len(todo))
+    prompts = [build_prompt(chunk_lists[i], questions[i]) for i in todo]
+    for i, answer in zip(todo, generate_answers(prompts, batch_size=batch_size)):
+        answers[i] = answer
+        if keys[i]:
+            cache.answers.put(keys[i], answer)
+    return list(zip(answers, chunk_lists))
+
+
 if __name__ == "__main__":
     vs = load_vector_store()
     question = "How often do people mention fraud in credit cards?"
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# src/rag/telemetry.py
+
+"""
+Tracing and Metrics for the RAG Pipeline
+
+- ``span(name)``: times a pipeline stage (embed_query, search, build_prompt,
+  generate, ...) into a process-wide latency histogram
+- ``count(name, n)``: process-wide counters (cache hits, chunks retrieved,
+  prompt / generated tokens)
+- ``tracing()``: collects the spans and counters of one request, e.g. to
+  return them with the answer
+- ``METRICS.render()``: everything in the Prometheus text format (served
+  by the API at /metrics)
+- With RAG_TELEMETRY=0 and no active trace, ``span`` returns a shared
+  no-op object and ``count`` returns immediately
+"""
+
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# --------------------------------------------
+# CONFIG
+# --------------------------------------------
+
+TELEMETRY_ENABLED = os.environ.get("RAG_TELEMETRY", "1") != "0"
+METRIC_PREFIX = "rag"
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+_current_trace = contextvars.ContextVar("rag_trace", default=None)
+
+# --------------------------------------------
+# FUNCTIONS
+# --------------------------------------------
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last one: above every bucket
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Thread-safe stage histograms and counters"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.histograms = {}  # stage -> Histogram
+        self.counters = {}  # (name, labels) -> value
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def render(self):
+        """Prometheus text exposition format"""
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        lines = [
+            f"# HELP {name} Time spent per pipeline stage.",
+            f"# TYPE {name} histogram",
+        ]
+        with self._lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                bounds = [str(b) for b in histogram.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, histogram.counts):
+                    cumulative += count
+                    lines.append(
+                        f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}'
+                    )
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+
+            typed = set()
+            for (counter, labels), value in sorted(self.counters.items()):
+                metric = f"{METRIC_PREFIX}_{counter}_total"
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} counter")
+                label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+                label_str = f"{{{label_str}}}" if label_str else ""
+                lines.append(f"{metric}{label_str} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+class Trace:
+    """Spans and counters of one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+
+    def as_dict(self):
+        return {
+            "total_ms": round((time.perf_counter() - self.start) * 1000, 3),
+            "spans": [
+                {
+                    "name": name,
+                    "start_ms": round((start - self.start) * 1000, 3),
+                    "duration_ms": round(seconds * 1000, 3),
+                }
+                for name, start, seconds in self.spans
+            ],
+            "counters": dict(self.counters),
+        }
+
+
+class _Span:
+    __slots__ = ("name", "trace", "start")
+
+    def __init__(self, name, trace):
+        self.name = name
+        self.trace = trace
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        if TELEMETRY_ENABLED:
+            METRICS.observe(self.name, seconds)
+        if self.trace is not None:
+            self.trace.spans.append((self.name, self.start, seconds))
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def active():
+    """Whether measurements are recorded (skip costly ones otherwise)"""
+    return TELEMETRY_ENABLED or _current_trace.get() is not None
+
+
+def span(name):
+    """Context manager timing the stage ``name``"""
+    trace = _current_trace.get()
+    if trace is None and not TELEMETRY_ENABLED:
+        return _NOOP_SPAN
+    return _Span(name, trace)
+
+
+def count(name, value=1):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.counters[name] = trace.counters.get(name, 0) + value
+    if TELEMETRY_ENABLED:
+        METRICS.inc(name, value)
+
+
+@contextmanager
+def tracing():
+    """Collect the spans and counters recorded inside the block"""
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
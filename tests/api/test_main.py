@@ -0,0 +1,194 @@
+# tests/api/test_main.py
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from api import main as api_main
+from api.main import create_app
+from src.embeddings import create_vector_store as cvs
+from src.embeddings.mmap_store import MmapVectorStore
+from src.rag import query_rag_pipeline as qrp
+from src.rag.cache import RAGCache
+
+
+class FakePipeline:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, prompts, batch_size=1):
+        time.sleep(self.delay)
+        self.calls.append(list(prompts))
+        return [{"generated_text": f"answer {len(p)}"} for p in prompts]
+
+
+class FakeLLM:
+    def __init__(self, delay=0.0):
+        self.pipeline = FakePipeline(delay)
+
+
+@pytest.fixture
+def vector_store(tmp_path, fake_embeddings):
+    df = pd.DataFrame(
+        {
+            "Complaint ID": range(20),
+            "Product": ["Credit card", "BNPL"] * 10,
+            "Cleaned Narrative": [
+                f"unexpected late fee number {i}." for i in range(20)
+            ],
+        }
+    )
+    cvs.build_vector_store(df, "fake", str(tmp_path), 40, 5, fake_embeddings)
+    return MmapVectorStore.load(str(tmp_path), fake_embeddings)
+
+
+def make_client(monkeypatch, vector_store, llm, **options):
+    monkeypatch.setattr(qrp, "get_generator", lambda: llm)
+    app = create_app(vector_store, cache=RAGCache(max_entries=0), **options)
+    return TestClient(app)
+
+
+def test_concurrent_requests_share_batches(monkeypatch, vector_store, fake_embeddings):
+    llm = FakeLLM()
+    questions = [f"why a late fee {i}?" for i in range(8)]
+    with make_client(
+        monkeypatch, vector_store, llm, max_batch_size=8, max_wait_ms=200
+    ) as client:
+        fake_embeddings.embedded.clear()
+        with ThreadPoolExecutor(8) as pool:
+            responses = list(
+                pool.map(
+                    lambda q: client.post("/answer", json={"question": q}), questions
+                )
+            )
+        health = client.get("/health").json()
+
+    assert [r.status_code for r in responses] == [200] * 8
+    body = responses[0].json()
+    assert body["question"] == questions[0]
+    assert body["answer"].startswith("answer")
+    assert len(body["sources"]) == qrp.TOP_K
+    assert sum(len(call) for call in llm.pipeline.calls) == 8
+    assert len(llm.pipeline.calls) < 8  # prompts were generated together
+    assert health["batches"]["retrieval"]["items"] == 8
+    assert health["batches"]["retrieval"]["count"] < 8
+    assert sorted(fake_embeddings.embedded) == sorted(questions)
+
+
+def test_answer_matches_answer_question(monkeypatch, vector_store):
+    llm = FakeLLM()
+    with make_client(monkeypatch, vector_store, llm, max_wait_ms=0) as client:
+        body = client.post(
+            "/answer",
+            json={"question": "late fee", "top_k": 3, "filters": {"product": "BNPL"}},
+        ).json()
+    [(answer, chunks)] = qrp.answer_questions(
+        ["late fee"], vector_store, 3, {"product": "BNPL"}, RAGCache(max_entries=0)
+    )
+    assert body["answer"] == answer
+    assert [s["chunk_id"] for s in body["sources"]] == [d.id for d in chunks]
+    assert {s["product"] for s in body["sources"]} == {"BNPL"}
+
+
+def test_timeouts_and_bad_filters(monkeypatch, vector_store):
+    llm = FakeLLM(delay=0.5)
+    with make_client(monkeypatch, vector_store, llm, timeout=0.1) as client:
+        slow = client.post("/answer", json={"question": "late fee"})
+        bad = client.post(
+            "/answer", json={"question": "late fee", "filters": {"color": "red"}}
+        )
+        bad_date = client.post(
+            "/answer",
+            json={"question": "late fee", "filters": {"date_from": "yesterday"}},
+        )
+    assert slow.status_code == 504
+    assert bad.status_code == 400
+    assert bad_date.status_code == 400
+
+
+def test_list_filters_and_failing_groups_stay_separate(monkeypatch, vector_store):
+    retrieve = qrp._retrieve_chunks_batch
+
+    def flaky(store, queries, top_k, filters, cache):
+        if filters and filters.get("company") == "Timeout Bank":
+            raise TimeoutError("shard timed out")
+        return retrieve(store, queries, top_k, filters, cache)
+
+    monkeypatch.setattr(qrp, "_retrieve_chunks_batch", flaky)
+    requests = [
+        {"question": "late fee", "filters": {"product": ["BNPL", "Credit card"]}},
+        {"question": "late fee", "filters": {"company": "Timeout Bank"}},
+    ]
+    with make_client(
+        monkeypatch, vector_store, FakeLLM(), max_batch_size=2, max_wait_ms=200
+    ) as client:
+        with ThreadPoolExecutor(2) as pool:
+            ok, failed = pool.map(lambda r: client.post("/answer", json=r), requests)
+        health = client.get("/health").json()
+
+    assert health["batches"]["retrieval"] == {"count": 1, "items": 2}
+    assert ok.status_code == 200
+    assert {s["product"] for s in ok.json()["sources"]} == {"BNPL", "Credit card"}
+    assert failed.status_code == 504  # Only the caller whose group failed
+
+
+def test_full_queue_answers_503(monkeypatch, vector_store):
+    llm = FakeLLM(delay=0.3)
+    with make_client(
+        monkeypatch, vector_store, llm, max_batch_size=1, max_queue_size=1
+    ) as client:
+        with ThreadPoolExecutor(6) as pool:
+            responses = list(
+                pool.map(
+                    lambda i: client.post("/answer", json={"question": f"fee {i}"}),
+                    range(6),
+                )
+            )
+    codes = [r.status_code for r in responses]
+    assert 503 in codes and 200 in codes
+    rejected = responses[codes.index(503)]
+    assert rejected.headers["retry-after"] == "1"
+
+
+def test_trace_and_metrics_endpoints(monkeypatch, vector_store):
+    with make_client(monkeypatch, vector_store, FakeLLM(), max_wait_ms=0) as client:
+        traced = client.post("/answer", json={"question": "fee", "trace": True})
+        plain = client.post("/answer", json={"question": "fee"})
+        metrics = client.get("/metrics")
+
+    trace = traced.json()["trace"]
+    names = {span["name"] for span in trace["spans"]}
+    assert {"batched_retrieve", "build_prompt", "batched_generate"} <= names
+    assert trace["counters"]["prompt_tokens"] > 0
+    assert "trace" not in plain.json()
+    assert metrics.headers["content-type"].startswith("text/plain")
+    assert 'rag_stage_seconds_count{stage="request"}' in metrics.text
+    assert 'rag_requests_total{status="200"}' in metrics.text
+
+
+def test_prompt_and_sources_are_built_off_the_event_loop(monkeypatch, vector_store):
+    on_loop = []
+
+    def recording(func):
+        def wrapper(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(True)
+            except RuntimeError:
+                on_loop.append(False)
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    monkeypatch.setattr(qrp, "build_prompt", recording(qrp.build_prompt))
+    monkeypatch.setattr(api_main, "source_records", recording(api_main.source_records))
+    with make_client(monkeypatch, vector_store, FakeLLM()) as client:
+        response = client.post("/answer", json={"question": "late fee?"})
+
+    assert response.status_code == 200
+    assert on_loop == [False, False]
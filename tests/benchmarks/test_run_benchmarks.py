@@ -0,0 +1,46 @@
+# tests/benchmarks/test_run_benchmarks.py
+
+import pandas as pd
+
+from src.benchmarks import run_benchmarks as bench
+from src.benchmarks.synthetic import make_complaints, stub_models
+from src.rag import models
+
+
+def test_synthetic_corpus_is_deterministic():
+    first = make_complaints(50, seed=3)
+    pd.testing.assert_frame_equal(first, make_complaints(50, seed=3))
+    assert not first.equals(make_complaints(50, seed=4))
+    assert first["Complaint ID"].is_unique
+    assert first["Consumer complaint narrative"].str.len().min() > 0
+
+
+def test_stub_models_are_served_and_removed():
+    with stub_models() as (embedder, generator):
+        assert models.get_embedder() is embedder
+        assert models.get_generator() is generator
+        a, b = embedder.embed_documents(["late fee", "late fee"])
+        assert a == b and len(a) == 384
+    assert models.EMBEDDING_MODEL_NAME not in models._embedders
+
+
+def test_compare_flags_slower_latency_and_lower_throughput():
+    baseline = {"results": {"x": {"p50_ms": 10.0, "rows_per_s": 100.0, "chunks": 5}}}
+    same = {"results": {"x": {"p50_ms": 11.0, "rows_per_s": 90.0, "chunks": 9}}}
+    worse = {"results": {"x": {"p50_ms": 13.0, "rows_per_s": 70.0}, "new": {}}}
+
+    assert bench.compare(same, baseline, tolerance=0.25) == []
+    assert bench.compare(worse, baseline, tolerance=0.25) == [
+        ("x", "p50_ms", 10.0, 13.0),
+        ("x", "rows_per_s", 100.0, 70.0),
+    ]
+
+
+def test_suite_runs_offline():
+    results = bench.run_suite(sizes=[200], n_text_rows=100, n_queries=3)
+
+    names = set(results["results"])
+    assert {"clean_text", "chunk_texts", "embedding", "index_build_flat"} <= names
+    for stage in ("retrieve_dense", "retrieve_hybrid", "answer_question"):
+        assert results["results"][f"{stage}@200"]["p95_ms"] > 0
+    assert bench.compare(results, results) == []
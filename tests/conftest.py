@@ -0,0 +1,20 @@
+# tests/conftest.py
+
+import pytest
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """Offline stand-in for MiniLM that records every text it embeds"""
+
+    embedded: list = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def fake_embeddings():
+    return CountingEmbeddings(size=16, embedded=[])
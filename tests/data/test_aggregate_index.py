@@ -0,0 +1,61 @@
+# tests/data/test_aggregate_index.py
+
+import pandas as pd
+
+from src.data.aggregate_index import AggregateIndex, build_aggregate_index_from_file
+
+
+def make_complaints():
+    return pd.DataFrame(
+        {
+            "Complaint ID": [1, 2, 3, 4, 5, 6],
+            "Product": ["Credit card"] * 3 + ["Personal loan"] * 3,
+            "Company": ["Bank A", "Bank B", "Bank A", "Bank A", None, "Bank B"],
+            "Issue": ["Fraud", "Fees", "Fraud", "Fees", "Fees", "Fraud"],
+            "Date received": [
+                "2023-01-05",
+                "2023-01-20",
+                "2023-02-01",
+                "2023-02-10",
+                "2023-03-01",
+                None,
+            ],
+            "Cleaned Narrative": [
+                "someone used my card, this is fraud.",
+                "i was charged late fees twice.",
+                "fraud on my account and a late fee.",
+                "the late fee on my loan was wrong.",
+                "the fee was late.",
+                "identity theft and fraud.",
+            ],
+        }
+    )
+
+
+def test_counts_by_facet_month_and_filter(tmp_path):
+    path = str(tmp_path / "complaints.parquet")
+    make_complaints().to_parquet(path, index=False)
+    build_aggregate_index_from_file(
+        path, str(tmp_path / "agg"), batch_size=4, min_phrase_count=2
+    )
+    index = AggregateIndex.from_dir(str(tmp_path / "agg"))
+    assert len(index) == 6
+
+    fraud = index.count("fraud", by="product")
+    assert (fraud["matches"], fraud["total"]) == (3, 6)
+    assert fraud["breakdown"] == [("Credit card", 2, 3), ("Personal loan", 1, 3)]
+    assert fraud["examples"] == [3, 1, 6]  # latest first, unknown date last
+
+    # Plurals match, and a phrase needs its words next to each other...
+    late_fee = index.count("late fees", filters={"product": "Credit card"})
+    assert (late_fee["matches"], late_fee["total"], late_fee["exact"]) == (2, 3, True)
+    # ... unless it is too rare to be stored: then any order counts
+    fee_late = index.count("fee late")
+    assert (fee_late["matches"], fee_late["exact"]) == (4, False)
+
+    monthly = index.count("late fee", by="month")
+    assert monthly["breakdown"] == [("2023-01", 1, 2), ("2023-02", 2, 2)]
+    dated = index.count(None, filters={"date_from": "2023-02-01"}, by="company")
+    assert dated["matches"] == 3
+    assert dated["breakdown"][0] == ("Bank A", 2, 2)
+    assert index.count("unknownword")["matches"] == 0
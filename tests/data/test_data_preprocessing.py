@@ -1,10 +1,13 @@
 # tests/test_data_preprocessing.py
 
+import re
+
 import pandas as pd
 
 # import os
 # import tempfile
 from src.data import data_preprocessing as dp
+from src.embeddings.chunker import chunk_spans
 
 
 def test_load_data(tmp_path):
@@ -66,3 +69,141 @@ def test_save_filtered_data(tmp_path):
 
     loaded = pd.read_csv(out_path)
     assert loaded.shape == df.shape
+
+
+def test_stream_filtered_data(tmp_path):
+    raw = pd.DataFrame(
+        {
+            "Date received": ["2023-01-05", "2023-01-06", "2023-01-07"]
+            + ["2023-02-01", "2023-02-02"],
+            "Product": ["Credit card", "Mortgage", "Money transfers"]
+            + ["Personal loan", "Savings account"],
+            "Issue": ["Fees", "Escrow", "Fraud", "Interest", "Access"],
+            "Company": ["Bank A", "Bank B", "Bank C", "Bank D", "Bank A"],
+            "State": ["CA", "NY", "TX", "WA", "CA"],
+            "Consumer complaint narrative": [
+                "I am writing to file a complaint about FEES!",
+                "Escrow problem.",
+                None,
+                "High interest & bad service.",
+                "Account frozen.",
+            ],
+            "Complaint ID": [1, 2, 3, 4, 5],
+        }
+    )
+    test_csv = tmp_path / "complaints.csv"
+    raw.to_csv(test_csv, index=False)
+    out_path = tmp_path / "out" / "filtered.parquet"
+
+    n_rows = dp.stream_filtered_data(
+        str(test_csv), dp.TARGET_PRODUCTS, str(out_path), chunksize=2
+    )
+
+    assert n_rows == 3
+    loaded = pd.read_parquet(out_path)
+    assert loaded["Complaint ID"].tolist() == [1, 4, 5]
+    # Unused columns are never read
+    assert "State" not in loaded.columns
+    assert loaded["Cleaned Narrative"].tolist()[1] == "high interest bad service."
+    assert loaded["Cleaned Narrative"].tolist()[0] == dp.clean_text(
+        "I am writing to file a complaint about FEES!"
+    )
+
+
+def test_stream_filtered_data_without_matches(tmp_path):
+    raw = pd.DataFrame(
+        {
+            "Date received": ["2023-01-05", "2023-01-06"],
+            "Product": ["Mortgage", "Credit card"],
+            "Issue": ["Escrow", "Fees"],
+            "Company": ["Bank B", "Bank A"],
+            "Consumer complaint narrative": ["Escrow problem.", None],
+            "Complaint ID": [2, 3],
+        }
+    )
+    test_csv = tmp_path / "complaints.csv"
+    raw.to_csv(test_csv, index=False)
+    out_path = tmp_path / "filtered.parquet"
+
+    n_rows = dp.stream_filtered_data(str(test_csv), dp.TARGET_PRODUCTS, str(out_path))
+
+    assert n_rows == 0
+    loaded = pd.read_parquet(out_path)
+    assert loaded.empty
+    assert "Cleaned Narrative" in loaded.columns
+    # Downstream chunking works on the empty file
+    assert len(chunk_spans(loaded)) == 0
+
+
+def _legacy_clean_text(text):
+    # Reference copy of the original row-by-row implementation
+    text = text.lower()
+    text = re.sub(r"i am writing.*?complaint", "", text)
+    text = re.sub(r"i want to.*?complaint", "", text)
+    text = re.sub(r"[^a-z0-9\s.,]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text
+
+
+NARRATIVES = [
+    "I am writing to file a complaint about charges & fees!",
+    "I want to i am writing x complaint complaint and more",
+    "Multi\nline\tI AM WRITING\nthis complaint... XXXX/XXXX $500.00",
+    "  Café naïve résumé — “quotes” ‘single’  nbsp em ",
+    "",
+    "   ",
+    "Numbers 123,456.78 and {braces} [brackets] (parens)",
+    "i want to complain but never say the word",
+    "\x1c\x1dseparators\x1e\x1f\x0b\x0cform",
+]
+
+
+def test_clean_narratives_matches_legacy_clean_text():
+    df = pd.DataFrame({"Consumer complaint narrative": NARRATIVES * 3})
+    expected = [_legacy_clean_text(text) for text in df["Consumer complaint narrative"]]
+
+    cleaned = dp.clean_narratives(df.copy())["Cleaned Narrative"].tolist()
+    assert cleaned == expected
+    assert [dp.clean_text(text) for text in NARRATIVES * 3] == expected
+
+
+def test_clean_narratives_parallel_matches_serial():
+    df = pd.DataFrame({"Consumer complaint narrative": NARRATIVES * 5})
+    df.index = df.index + 100  # non-default index must be preserved
+    serial = dp.clean_narratives(df.copy())
+    parallel = dp.clean_narratives(df.copy(), n_jobs=2)
+    pd.testing.assert_series_equal(
+        serial["Cleaned Narrative"], parallel["Cleaned Narrative"]
+    )
+
+
+def test_stream_filtered_data_reuses_one_pool(tmp_path, monkeypatch):
+    pools = []
+
+    class CountingPool(dp.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            pools.append(self)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(dp, "ProcessPoolExecutor", CountingPool)
+    raw = pd.DataFrame(
+        {
+            "Product": ["Credit card"] * 12,
+            "Consumer complaint narrative": NARRATIVES[:4] * 3,
+            "Complaint ID": range(12),
+        }
+    )
+    test_csv = tmp_path / "complaints.csv"
+    raw.to_csv(test_csv, index=False)
+    out_path = tmp_path / "filtered.parquet"
+
+    n_rows = dp.stream_filtered_data(
+        str(test_csv), dp.TARGET_PRODUCTS, str(out_path), chunksize=4, n_jobs=2
+    )
+
+    assert n_rows == 12
+    assert len(pools) == 1
+    loaded = pd.read_parquet(out_path)
+    assert loaded["Cleaned Narrative"].tolist() == [
+        dp.clean_text(text) for text in raw["Consumer complaint narrative"]
+    ]
@@ -0,0 +1,83 @@
+# tests/embeddings/test_chunker.py
+
+import numpy as np
+import pandas as pd
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from src.embeddings import chunker
+from src.embeddings.chunk_store import build_chunk_table
+from src.embeddings.chunker import chunk_spans, split_offsets
+from src.embeddings.manifest import build_manifest
+
+NARRATIVES = [
+    "",
+    "   ",
+    "Short complaint.",
+    "I was charged a late fee. " * 40,
+    "First paragraph about my card.\n\nSecond paragraph.\nWith a line break. " * 8,
+    "x" * 700,
+    "no separators here but a very long word " + "y" * 400 + " and an end.",
+    " leading and trailing spaces . . . " * 20,
+]
+
+
+def make_frame():
+    n = len(NARRATIVES)
+    return pd.DataFrame(
+        {
+            "Complaint ID": np.arange(100, 100 + n),
+            "Product": ["Credit card", "Personal loan"] * (n // 2),
+            "Company": ["Bank A", None] * (n // 2),
+            "Date received": ["2023-05-01", "not a date"] * (n // 2),
+            "Cleaned Narrative": NARRATIVES,
+        }
+    )
+
+
+def test_split_offsets_matches_langchain():
+    for chunk_size, chunk_overlap in [(300, 50), (40, 10), (20, 5)]:
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            separators=["\n\n", "\n", ".", " ", ""],
+            add_start_index=True,
+        )
+        for text in NARRATIVES:
+            expected = [doc.page_content for doc in splitter.create_documents([text])]
+            offsets = split_offsets(text, chunk_size, chunk_overlap)
+            assert [text[start:end] for start, end in offsets] == expected
+
+
+def test_chunk_spans_documents_and_table():
+    spans = chunk_spans(make_frame(), chunk_size=60, chunk_overlap=10)
+    docs = spans.documents()
+    assert len(docs) == len(spans) > 0
+    assert spans.texts[:3] == [doc.page_content for doc in docs[:3]]
+
+    first = docs[0].metadata
+    assert first["company"] == "Bank A"
+    assert first["date_received"] == "2023-05-01"
+    missing = [d.metadata for d in docs if d.metadata["complaint_id"] % 2]
+    assert missing and all("company" not in m for m in missing)
+    assert all("date_received" not in m for m in missing)
+
+    # The column-wise table equals the one built from Documents
+    table, texts, products, companies = build_chunk_table(spans)
+    expected = build_chunk_table(docs)
+    assert np.array_equal(table, expected[0])
+    assert texts == expected[1]
+    assert products == expected[2] and companies == expected[3]
+
+    counts = build_manifest({}, spans, "m", 60, 10)
+    assert counts == build_manifest({}, docs, "m", 60, 10)
+
+
+def test_chunk_spans_worker_processes(monkeypatch):
+    df = make_frame()
+    in_process = chunk_spans(df, chunk_size=60, chunk_overlap=10, n_workers=1)
+    monkeypatch.setattr(chunker, "MIN_ROWS_PER_WORKER", 1)
+    pooled = chunk_spans(df, chunk_size=60, chunk_overlap=10, n_workers=2)
+    assert np.array_equal(in_process.rows, pooled.rows)
+    assert np.array_equal(in_process.starts, pooled.starts)
+    assert np.array_equal(in_process.ends, pooled.ends)
@@ -7,10 +7,10 @@ import pandas as pd
 import pytest
 
 from langchain.docstore.document import Document
-from langchain_community.vectorstores import FAISS
 
 # Import functions directly
 from src.embeddings import create_vector_store as cvs
+from src.embeddings.mmap_store import MmapVectorStore
 
 
 @pytest.fixture
@@ -37,12 +37,47 @@ def test_chunk_texts(dummy_dataframe):
     # Check metadata correctness
     assert "complaint_id" in chunks[0].metadata
     assert "product" in chunks[0].metadata
-    assert "original_narrative" in chunks[0].metadata
+    # Full narrative is no longer duplicated into every chunk
+    assert "original_narrative" not in chunks[0].metadata
 
     # Check chunk content is string
     assert isinstance(chunks[0].page_content, str)
 
 
+def test_chunk_offsets_point_into_narrative(dummy_dataframe):
+    chunks = cvs.chunk_texts(dummy_dataframe, chunk_size=20, chunk_overlap=5)
+    narratives = dict(
+        zip(dummy_dataframe["Complaint ID"], dummy_dataframe["Cleaned Narrative"])
+    )
+
+    for chunk in chunks:
+        meta = chunk.metadata
+        text = narratives[meta["complaint_id"]]
+        assert text[meta["start"] : meta["end"]] == chunk.page_content
+
+
+def test_chunk_texts_keeps_filter_fields(dummy_dataframe):
+    df = dummy_dataframe.assign(
+        Company=["Bank A", None], **{"Date received": ["05/01/2023", "bad"]}
+    )
+    chunks = cvs.chunk_texts(df, chunk_size=20, chunk_overlap=5)
+
+    first = [c.metadata for c in chunks if c.metadata["complaint_id"] == 1]
+    second = [c.metadata for c in chunks if c.metadata["complaint_id"] == 2]
+    assert all(m["company"] == "Bank A" for m in first)
+    assert all(m["date_received"] == "2023-05-01" for m in first)
+    assert all("company" not in m and "date_received" not in m for m in second)
+
+
+def test_load_cleaned_data_parquet(tmp_path, dummy_dataframe):
+    path = tmp_path / "filtered.parquet"
+    dummy_dataframe.to_parquet(path, index=False)
+
+    df = cvs.load_cleaned_data(str(path))
+    assert df.shape == dummy_dataframe.shape
+    assert df["Complaint ID"].tolist() == [1, 2]
+
+
 def test_embed_and_store(tmp_path, dummy_dataframe):
     # Create chunks
     chunks = cvs.chunk_texts(dummy_dataframe, chunk_size=20, chunk_overlap=5)
@@ -59,22 +94,27 @@ def test_embed_and_store(tmp_path, dummy_dataframe):
 
     # Check files exist
     index_path = save_dir / "index.faiss"
-    store_path = save_dir / "index.pkl"
+    store_path = save_dir / "chunks.npy"
 
     assert index_path.exists(), "FAISS index file not created."
-    assert store_path.exists(), "Metadata pickle file not created."
+    assert store_path.exists(), "Chunk store file not created."
+    assert not (save_dir / "index.pkl").exists()
 
     # Attempt to load vector store
-    embeddings_model = cvs.HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
-    vector_store = FAISS.load_local(
-        folder_path=str(save_dir),
-        embeddings=embeddings_model,
-        allow_dangerous_deserialization=True,
+    embeddings_model = cvs.load_embeddings_model(
+        "sentence-transformers/all-MiniLM-L6-v2"
     )
+    vector_store = MmapVectorStore.load(str(save_dir), embeddings_model)
 
     # Try searching the vector store
     results = vector_store.similarity_search("credit card", k=1)
     assert len(results) >= 1
     assert isinstance(results[0].page_content, str)
+
+
+def test_no_dedup_overrides_env_default(monkeypatch):
+    monkeypatch.setattr(cvs, "DEDUP", True)
+    monkeypatch.setattr("sys.argv", ["create_vector_store"])
+    assert cvs.parse_args().dedup is True
+    monkeypatch.setattr("sys.argv", ["create_vector_store", "--no-dedup"])
+    assert cvs.parse_args().dedup is False
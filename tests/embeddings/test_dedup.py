@@ -0,0 +1,115 @@
+# tests/embeddings/test_dedup.py
+
+import json
+
+import pandas as pd
+
+from src.embeddings import create_vector_store as cvs
+from src.embeddings.dedup import DEDUP_REPORT_FILENAME, deduplicate
+from src.embeddings.document_store import DocumentStore
+from src.embeddings.manifest import load_manifest
+from src.embeddings.mmap_store import MmapVectorStore
+from src.rag import query_rag_pipeline as qrp
+from src.rag.batch_answer import source_records
+
+TEMPLATE = (
+    "i am disputing this charge because the merchant never delivered the "
+    "goods and the bank refused to open a dispute after i called them "
+    "three times about the same problem with my account"
+)
+
+
+def make_complaints():
+    return pd.DataFrame(
+        {
+            "Complaint ID": [1, 2, 3, 4, 5, 6],
+            "Product": ["Credit card"] * 4 + ["Personal loan"] * 2,
+            "Cleaned Narrative": [
+                TEMPLATE,
+                TEMPLATE + " again",  # longest copy: the representative
+                TEMPLATE,
+                "zelle payment never arrived at my landlord.",
+                TEMPLATE,  # same text, other product: kept apart
+                "",
+            ],
+        }
+    )
+
+
+def test_deduplicate_clusters_near_copies_per_product():
+    marked, keep, report = deduplicate(make_complaints(), threshold=0.8)
+
+    assert keep.tolist() == [False, True, False, True, True, True]
+    assert marked["Duplicate IDs"].tolist() == [None, "1 3", None, None, None, None]
+    assert report["complaints"] == 6 and report["indexed"] == 4
+    assert report["duplicates"] == 2 and report["clusters"] == 1
+    assert report["largest_clusters"] == [{"representative": 2, "size": 3}]
+
+
+def test_build_indexes_one_complaint_per_cluster(tmp_path, fake_embeddings):
+    df = make_complaints()
+    cvs.build_vector_store(
+        df, "fake", str(tmp_path), 60, 10, fake_embeddings, dedup=True
+    )
+
+    vs = MmapVectorStore.load(str(tmp_path), fake_embeddings)
+    indexed = {doc.metadata["complaint_id"] for doc in vs.chunks.documents()}
+    assert indexed == {2, 4, 5}  # 6 has no text
+    assert DocumentStore.from_dir(str(tmp_path)).get_duplicates(2) == [1, 3]
+
+    manifest = load_manifest(str(tmp_path))
+    assert manifest["complaints"]["1"]["duplicate_of"] == 2
+    with open(tmp_path / DEDUP_REPORT_FILENAME) as f:
+        assert json.load(f)["duplicates"] == 2
+
+    # Unchanged members are not re-embedded, a changed one rebuilds
+    stats = cvs.update_vector_store(
+        df, "fake", str(tmp_path), 60, 10, fake_embeddings, dedup=True
+    )
+    assert stats == {"added": 0, "changed": 0, "deleted": 0}
+    df.loc[0, "Cleaned Narrative"] = "my card was stolen."
+    stats = cvs.update_vector_store(
+        df, "fake", str(tmp_path), 60, 10, fake_embeddings, dedup=True
+    )
+    assert stats["added"] == 6  # full build
+    vs = MmapVectorStore.load(str(tmp_path), fake_embeddings)
+    assert 1 in {doc.metadata["complaint_id"] for doc in vs.chunks.documents()}
+
+
+def test_full_build_fallbacks_keep_dedup(tmp_path, fake_embeddings):
+    df = make_complaints()
+    cvs.build_vector_store(
+        df, "fake", str(tmp_path), 60, 10, fake_embeddings, dedup=True
+    )
+    assert not (tmp_path / cvs.VECTORS_FILENAME).exists()
+
+    # Asking for full vectors the store doesn't have rebuilds it from scratch
+    df.loc[3, "Cleaned Narrative"] = "zelle payment was sent twice."
+    cvs.update_vector_store(
+        df,
+        "fake",
+        str(tmp_path),
+        60,
+        10,
+        fake_embeddings,
+        dedup=True,
+        full_vectors=True,
+    )
+    assert (tmp_path / cvs.VECTORS_FILENAME).exists()
+    vs = MmapVectorStore.load(str(tmp_path), fake_embeddings)
+    assert {doc.metadata["complaint_id"] for doc in vs.chunks.documents()} == {2, 4, 5}
+    assert DocumentStore.from_dir(str(tmp_path)).get_duplicates(2) == [1, 3]
+
+
+def test_sources_list_their_duplicates(tmp_path, fake_embeddings):
+    cvs.build_vector_store(
+        make_complaints(), "fake", str(tmp_path), 60, 10, fake_embeddings, dedup=True
+    )
+    vs = MmapVectorStore.load(str(tmp_path), fake_embeddings)
+    docs = vs.chunks.documents()
+
+    records = source_records(docs, str(tmp_path))
+    duplicates = {r["complaint_id"]: r["duplicate_ids"] for r in records}
+    assert duplicates == {2: [1, 3], 4: [], 5: []}
+    assert all(r["duplicate_ids"] == [] for r in source_records(docs))
+    assert qrp.get_duplicate_ids(docs[0], str(tmp_path / "missing")) == []
@@ -0,0 +1,52 @@
+# tests/embeddings/test_document_store.py
+
+import pandas as pd
+import pytest
+
+from src.embeddings import document_store as ds
+
+
+@pytest.fixture
+def complaints_df():
+    return pd.DataFrame(
+        {
+            "Complaint ID": [10, 11, 12],
+            "Product": pd.Categorical(["Credit card", "Personal loan", "Credit card"]),
+            "Issue": pd.array(["Fees", None, "Fraud"], dtype="string"),
+            "Cleaned Narrative": ["first narrative", "second one", "third text"],
+            "Consumer complaint narrative": ["First", "Second", "Third"],
+        }
+    )
+
+
+def test_save_and_lookup(tmp_path, complaints_df):
+    path = ds.save_document_store(complaints_df, str(tmp_path))
+    store = ds.DocumentStore(path)
+
+    assert len(store) == 3
+    assert store.get_narrative(11) == "second one"
+    record = store.get_record(10)
+    assert record == {
+        "complaint_id": 10,
+        "product": "Credit card",
+        "issue": "Fees",
+        "narrative": "first narrative",
+    }
+    assert store.get_record(11)["issue"] is None
+    assert store.get_record(999) is None
+    store.close()
+
+
+def test_get_records_batches_lookups(tmp_path, complaints_df):
+    ds.save_document_store(complaints_df, str(tmp_path))
+    store = ds.DocumentStore.from_dir(str(tmp_path))
+
+    records = store.get_records([12, 10, 12, 404])
+    assert sorted(records) == [10, 12]
+    assert records[12]["narrative"] == "third text"
+
+
+def test_save_overwrites_previous_store(tmp_path, complaints_df):
+    ds.save_document_store(complaints_df, str(tmp_path))
+    ds.save_document_store(complaints_df.head(1), str(tmp_path))
+    assert len(ds.DocumentStore.from_dir(str(tmp_path))) == 1
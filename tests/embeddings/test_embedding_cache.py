@@ -0,0 +1,86 @@
+# tests/embeddings/test_embedding_cache.py
+
+import pickle
+
+import numpy as np
+import pytest
+
+from src.embeddings import embedding_cache as ec
+from src.embeddings import embedding_stage as es
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ec.EmbeddingCache(str(tmp_path / "cache.sqlite"), max_entries=10)
+    yield cache
+    cache.close()
+
+
+def test_roundtrip_and_whitespace_normalization(cache):
+    cache.put_many("m", ["late  fee\ncharged"], [[0.5, 1.5]])
+
+    hit, miss = cache.get_many("m", [" late fee charged ", "other"])
+    np.testing.assert_allclose(hit, [0.5, 1.5])
+    assert miss is None
+    # Same text under another model is a different entry
+    assert cache.get_many("other-model", ["late fee charged"]) == [None]
+
+
+def test_lru_eviction_keeps_recently_used(cache):
+    texts = [f"text {i}" for i in range(10)]
+    cache.put_many("m", texts, np.ones((10, 2)))
+    cache.get_many("m", ["text 0"])  # touch the oldest entry
+
+    cache.put_many("m", ["text 10", "text 11"], np.ones((2, 2)))
+
+    assert len(cache) <= 10
+    assert cache.get_many("m", ["text 0"])[0] is not None
+    assert cache.get_many("m", ["text 1"])[0] is None
+
+
+def test_cached_embeddings_only_embed_misses(cache, fake_embeddings):
+    cached = ec.CachedEmbeddings(fake_embeddings, cache, "fake")
+    first = cached.embed_documents(["a b", "c", "a b"])
+    assert fake_embeddings.embedded == ["a b", "c"]
+
+    fake_embeddings.embedded.clear()
+    second = cached.embed_documents(["c", "a  b", "d"])
+    assert fake_embeddings.embedded == ["d"]
+    np.testing.assert_allclose(second[0], first[1], rtol=1e-6)
+    np.testing.assert_allclose(second[1], first[0], rtol=1e-6)
+    assert (cached.hits, cached.misses) == (2, 3)
+
+
+def test_query_embeddings_are_cached_separately(cache, fake_embeddings):
+    cached = ec.CachedEmbeddings(fake_embeddings, cache, "fake")
+    query = cached.embed_query("zelle fraud")
+    assert cached.embed_query("zelle  fraud") == query
+    assert cache.get_many("fake", ["zelle fraud"]) == [None]
+
+
+def test_with_cache_disabled_by_empty_path(fake_embeddings):
+    assert ec.with_cache(fake_embeddings, "fake", path="") is fake_embeddings
+
+
+def test_cache_survives_pickling(cache):
+    cache.put_many("m", ["x"], [[1.0]])
+    clone = pickle.loads(pickle.dumps(cache))
+    assert clone.get_many("m", ["x"])[0] is not None
+
+
+def test_rechunking_only_embeds_new_text(tmp_path, fake_embeddings):
+    cache_path = str(tmp_path / "cache.sqlite")
+    texts = ["alpha chunk", "beta chunk", "gamma chunk"]
+    es.embed_to_shards(
+        texts, "fake", str(tmp_path / "a"), fake_embeddings, cache_path=cache_path
+    )
+    fake_embeddings.embedded.clear()
+
+    es.embed_to_shards(
+        texts + ["delta chunk"],
+        "fake",
+        str(tmp_path / "b"),
+        fake_embeddings,
+        cache_path=cache_path,
+    )
+    assert fake_embeddings.embedded == ["delta chunk"]
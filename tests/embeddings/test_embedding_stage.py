@@ -0,0 +1,83 @@
+# tests/embeddings/test_embedding_stage.py
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.embeddings import create_vector_store as cvs
+from src.embeddings import embedding_stage as es
+from src.embeddings.mmap_store import MmapVectorStore
+
+TEXTS = [f"complaint text number {i}" for i in range(23)]
+
+
+def test_shards_match_single_pass(tmp_path, fake_embeddings):
+    paths = es.embed_to_shards(
+        TEXTS, "fake", str(tmp_path), fake_embeddings, batch_size=4, shard_size=10
+    )
+
+    assert [os.path.basename(p) for p in paths] == [
+        "shard_00000.npy",
+        "shard_00001.npy",
+        "shard_00002.npy",
+    ]
+    stacked = np.vstack(list(es.iter_shards(paths)))
+    expected = np.asarray(fake_embeddings.embed_documents(TEXTS), dtype="float32")
+    np.testing.assert_allclose(stacked, expected)
+
+
+def test_resume_skips_completed_shards(tmp_path, fake_embeddings):
+    paths = es.embed_to_shards(
+        TEXTS, "fake", str(tmp_path), fake_embeddings, batch_size=4, shard_size=10
+    )
+    os.remove(paths[1])  # simulate a crash while writing shard 1
+    fake_embeddings.embedded.clear()
+
+    es.embed_to_shards(
+        TEXTS, "fake", str(tmp_path), fake_embeddings, batch_size=4, shard_size=10
+    )
+    assert fake_embeddings.embedded == TEXTS[10:20]
+
+
+def test_changed_job_discards_old_shards(tmp_path, fake_embeddings):
+    es.embed_to_shards(TEXTS, "fake", str(tmp_path), fake_embeddings, shard_size=10)
+    fake_embeddings.embedded.clear()
+
+    es.embed_to_shards(TEXTS[:5], "fake", str(tmp_path), fake_embeddings, shard_size=10)
+    assert fake_embeddings.embedded == TEXTS[:5]
+
+
+def test_worker_processes_produce_same_vectors(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    paths = es.embed_to_shards(
+        TEXTS, "fake", str(tmp_path), embeddings, shard_size=5, n_workers=2
+    )
+    stacked = np.vstack(list(es.iter_shards(paths)))
+    np.testing.assert_allclose(stacked, embeddings.embed_documents(TEXTS), rtol=1e-6)
+
+
+def test_embed_and_store_assembles_index_from_shards(tmp_path, fake_embeddings):
+    docs = cvs.chunk_texts(
+        pd.DataFrame(
+            {
+                "Complaint ID": [1, 2],
+                "Product": ["Credit card", "Personal loan"],
+                "Cleaned Narrative": [" ".join(TEXTS[:10]), " ".join(TEXTS[10:])],
+            }
+        ),
+        chunk_size=60,
+        chunk_overlap=10,
+    )
+    save_dir = tmp_path / "store"
+    cvs.embed_and_store(
+        docs, "fake", str(save_dir), fake_embeddings, batch_size=3, shard_size=4
+    )
+
+    assert not (save_dir / cvs.SHARDS_DIRNAME).exists()
+    vs = MmapVectorStore.load(str(save_dir), fake_embeddings)
+    assert vs.index.ntotal == len(docs)
+    top = vs.similarity_search(docs[3].page_content, k=1)[0]
+    assert top.page_content == docs[3].page_content
@@ -0,0 +1,187 @@
+# tests/embeddings/test_incremental_build.py
+
+import pandas as pd
+import pytest
+
+from src.embeddings import create_vector_store as cvs
+from src.embeddings.chunk_store import ChunkStore
+from src.embeddings.document_store import DocumentStore
+from src.embeddings.manifest import load_manifest
+from src.embeddings.mmap_store import MmapVectorStore
+
+MODEL = "fake-model"
+
+
+@pytest.fixture
+def complaints():
+    return pd.DataFrame(
+        {
+            "Complaint ID": [1, 2, 3],
+            "Product": ["Credit card", "Personal loan", "Money transfers"],
+            "Cleaned Narrative": [
+                "late fee charged twice on my credit card statement.",
+                "the personal loan interest rate was changed without notice.",
+                "money transfer to my family never arrived after ten days.",
+            ],
+        }
+    )
+
+
+def _build(df, save_dir, embeddings):
+    return cvs.update_vector_store(
+        df,
+        MODEL,
+        str(save_dir),
+        chunk_size=40,
+        chunk_overlap=5,
+        embeddings_model=embeddings,
+    )
+
+
+def _stored_complaints(save_dir, embeddings):
+    vs = MmapVectorStore.load(str(save_dir), embeddings)
+    assert vs.index.ntotal == len(vs.chunks)
+    return sorted({doc.metadata["complaint_id"] for doc in vs.chunks.documents()})
+
+
+def test_first_run_is_full_build(tmp_path, complaints, fake_embeddings):
+    stats = _build(complaints, tmp_path, fake_embeddings)
+
+    assert stats == {"added": 3, "changed": 0, "deleted": 0}
+    manifest = load_manifest(str(tmp_path))
+    assert sorted(manifest["complaints"]) == ["1", "2", "3"]
+    assert _stored_complaints(tmp_path, fake_embeddings) == [1, 2, 3]
+
+
+def test_incremental_embeds_only_delta(tmp_path, complaints, fake_embeddings):
+    _build(complaints, tmp_path, fake_embeddings)
+
+    updated = complaints.copy()
+    updated.loc[1, "Cleaned Narrative"] = "the loan was sold to another servicer."
+    updated = updated[updated["Complaint ID"] != 3]
+    updated = pd.concat(
+        [
+            updated,
+            pd.DataFrame(
+                {
+                    "Complaint ID": [4],
+                    "Product": ["Savings account"],
+                    "Cleaned Narrative": ["savings account frozen."],
+                }
+            ),
+        ]
+    )
+
+    fake_embeddings.embedded.clear()
+    stats = _build(updated, tmp_path, fake_embeddings)
+
+    assert stats == {"added": 1, "changed": 1, "deleted": 1}
+    # Unchanged complaint 1 was not re-embedded
+    assert all("late fee" not in text for text in fake_embeddings.embedded)
+    assert any("servicer" in text for text in fake_embeddings.embedded)
+    assert _stored_complaints(tmp_path, fake_embeddings) == [1, 2, 4]
+
+    store = DocumentStore.from_dir(str(tmp_path))
+    assert store.get_record(3) is None
+    assert store.get_narrative(2) == "the loan was sold to another servicer."
+    assert store.get_narrative(4) == "savings account frozen."
+
+
+def test_company_and_date_changes_are_refreshed(tmp_path, complaints, fake_embeddings):
+    complaints["Company"] = ["Bank A", "Bank B", "Bank C"]
+    complaints["Date received"] = ["2023-01-01", "2023-02-01", "2023-03-01"]
+    _build(complaints, tmp_path, fake_embeddings)
+
+    updated = complaints.copy()
+    updated.loc[0, "Company"] = "Bank Z"
+    updated.loc[1, "Date received"] = "2024-02-01"
+    stats = _build(updated, tmp_path, fake_embeddings)
+
+    assert stats == {"added": 0, "changed": 2, "deleted": 0}
+    vs = MmapVectorStore.load(str(tmp_path), fake_embeddings)
+    found = vs.similarity_search("late fee", k=5, filter={"company": "Bank Z"})
+    assert {doc.metadata["complaint_id"] for doc in found} == {1}
+    found = vs.similarity_search("loan", k=5, filter={"date_from": "2024-01-01"})
+    assert {doc.metadata["complaint_id"] for doc in found} == {2}
+    store = DocumentStore.from_dir(str(tmp_path))
+    assert store.get_record(1)["company"] == "Bank Z"
+
+
+def test_no_changes_is_a_no_op(tmp_path, complaints, fake_embeddings):
+    _build(complaints, tmp_path, fake_embeddings)
+    fake_embeddings.embedded.clear()
+
+    stats = _build(complaints, tmp_path, fake_embeddings)
+    assert stats == {"added": 0, "changed": 0, "deleted": 0}
+    assert fake_embeddings.embedded == []
+
+
+def test_changed_chunk_settings_force_full_build(tmp_path, complaints, fake_embeddings):
+    _build(complaints, tmp_path, fake_embeddings)
+    stats = cvs.update_vector_store(
+        complaints,
+        MODEL,
+        str(tmp_path),
+        chunk_size=80,
+        chunk_overlap=5,
+        embeddings_model=fake_embeddings,
+    )
+    assert stats["added"] == 3
+    assert load_manifest(str(tmp_path))["chunk_size"] == 80
+
+
+def _chunk_records(save_dir):
+    chunks = ChunkStore.from_dir(str(save_dir))
+    return sorted(
+        (doc.id, doc.page_content, sorted(doc.metadata.items()))
+        for doc in chunks.documents()
+    )
+
+
+def test_patched_chunk_store_matches_full_build(tmp_path, complaints, fake_embeddings):
+    complaints["Company"] = ["Bank A", "Bank B", "Bank C"]
+    _build(complaints, tmp_path / "patched", fake_embeddings)
+
+    updated = complaints.copy()
+    updated.loc[1, "Cleaned Narrative"] = "the loan was sold to another servicer."
+    updated = updated[updated["Complaint ID"] != 3]
+    updated = pd.concat(
+        [
+            updated,
+            pd.DataFrame(
+                {
+                    "Complaint ID": [4],
+                    "Product": ["Savings account"],
+                    "Company": ["Bank D"],
+                    "Cleaned Narrative": ["savings account frozen."],
+                }
+            ),
+        ]
+    )
+    _build(updated, tmp_path / "patched", fake_embeddings)
+    _build(updated, tmp_path / "full", fake_embeddings)
+
+    assert _chunk_records(tmp_path / "patched") == _chunk_records(tmp_path / "full")
+    # Products and companies of the deleted complaint are pruned
+    chunks = ChunkStore.from_dir(str(tmp_path / "patched"))
+    assert "Money transfers" not in chunks.products
+    assert sorted(chunks.companies) == ["Bank A", "Bank B", "Bank D"]
+
+
+def test_patch_compacts_dead_texts(tmp_path, complaints, fake_embeddings):
+    _build(complaints, tmp_path, fake_embeddings)
+    before = ChunkStore.from_dir(str(tmp_path))
+    assert len(before.texts) == before.table["text_length"].sum()
+
+    # Appending a change leaves the old text behind
+    updated = complaints.copy()
+    updated.loc[2, "Cleaned Narrative"] = "wire never arrived."
+    _build(updated, tmp_path, fake_embeddings)
+    chunks = ChunkStore.from_dir(str(tmp_path))
+    assert len(chunks.texts) == len(before.texts) + len(b"wire never arrived.")
+
+    # Dropping most complaints rewrites chunks.bin with live texts only
+    _build(updated[updated["Complaint ID"] == 3], tmp_path, fake_embeddings)
+    chunks = ChunkStore.from_dir(str(tmp_path))
+    assert len(chunks.texts) == chunks.table["text_length"].sum()
+    assert [doc.page_content for doc in chunks.documents()] == ["wire never arrived."]
@@ -0,0 +1,181 @@
+# tests/embeddings/test_index_factory.py
+
+import faiss
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.embeddings import create_vector_store as cvs
+from src.embeddings import evaluate_index as ev
+from src.embeddings import index_factory as ixf
+from src.embeddings.manifest import load_manifest
+from src.embeddings.mmap_store import MmapVectorStore
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(20, 16))
+    points = centers[rng.integers(0, 20, 2000)] + 0.2 * rng.normal(size=(2000, 16))
+    return points.astype("float32")
+
+
+def test_resolve_params_validates_and_clamps():
+    params = ixf.resolve_params("ivf", n_vectors=400, nprobe=4)
+    assert params["nlist"] == 400 // ixf.MIN_POINTS_PER_CELL
+    assert params["nprobe"] == 4
+    with pytest.raises(ValueError):
+        ixf.resolve_params("annoy")
+    with pytest.raises(ValueError):
+        ixf.resolve_params("ivf", nprobes=3)
+
+
+@pytest.mark.parametrize(
+    "index_type, params",
+    [
+        ("flat", {}),
+        ("ivf", {"nlist": 16, "nprobe": 16}),
+        ("hnsw", {"M": 8, "ef_search": 64}),
+        ("ivfpq", {"nlist": 8, "nprobe": 8, "pq_m": 4, "nbits": 4}),
+        ("pq", {"pq_m": 4, "nbits": 4}),
+    ],
+)
+def test_build_index_types(vectors, index_type, params):
+    index, resolved = ixf.build_index(np.array_split(vectors, 3), index_type, **params)
+    assert index.ntotal == len(vectors)
+
+    _, ids = index.search(vectors[:10], 1)
+    if index_type in ("flat", "ivf", "hnsw"):
+        assert ids[:, 0].tolist() == list(range(10))
+
+
+@pytest.mark.parametrize(
+    "index_type, storage",
+    [("flat", "float16"), ("flat", "int8"), ("ivf", "int8"), ("hnsw", "int8")],
+)
+def test_compressed_storage(vectors, index_type, storage):
+    params = {"nlist": 16, "nprobe": 16} if index_type == "ivf" else {}
+    index, _ = ixf.build_index([vectors], index_type, storage=storage, **params)
+    full, _ = ixf.build_index([vectors], index_type, **params)
+    assert index.ntotal == len(vectors)
+    # (the HNSW graph itself is not compressed)
+    size = faiss.serialize_index(index).nbytes
+    assert size < faiss.serialize_index(full).nbytes
+
+    _, ids = index.search(vectors[:10], 10)
+    _, exact = ixf.rescore(vectors[:10], ids, vectors.__getitem__, 1)
+    assert exact[:, 0].tolist() == list(range(10))
+
+
+def test_compressed_storage_is_validated():
+    with pytest.raises(ValueError):
+        ixf.make_index(16, "pq", storage="int8", **ixf.DEFAULT_INDEX_PARAMS)
+    with pytest.raises(ValueError):
+        ixf.make_index(16, "flat", storage="int4")
+
+
+def test_search_params_are_persisted(tmp_path, vectors):
+    index, _ = ixf.build_index([vectors], "ivf", nlist=16, nprobe=5)
+    path = str(tmp_path / "index.faiss")
+    faiss.write_index(index, path)
+    assert faiss.read_index(path).nprobe == 5
+
+
+def test_evaluate_configs_reports_recall(vectors):
+    results = ev.evaluate_configs(
+        vectors, ["flat", "ivf:nlist=16,nprobe=1"], k=5, n_queries=50
+    )
+    assert results[0]["recall@5"] == 1.0
+    assert 0.0 < results[1]["recall@5"] <= 1.0
+    assert results[1]["params"]["nprobe"] == 1
+    assert "| ivf:nlist=16,nprobe=1 |" in ev.format_report(results)
+
+
+def test_evaluate_configs_reports_memory_saved(vectors):
+    results = ev.evaluate_configs(
+        vectors,
+        ["flat:storage=int8", "flat:storage=int8,rescore=4"],
+        k=5,
+        n_queries=50,
+    )
+    quantized, rescored = results
+    assert quantized["storage"] == "int8"
+    assert quantized["memory_saved"] > 0.7
+    assert rescored["recall@5"] >= quantized["recall@5"]
+    assert rescored["recall@5"] == 1.0
+
+
+def test_queries_are_held_out(vectors):
+    query_ids, indexed_ids = ev.split_queries(len(vectors), 50)
+    assert len(query_ids) == 50 and len(indexed_ids) == len(vectors) - 50
+    assert not set(query_ids) & set(indexed_ids)
+    assert len(ev.split_queries(10, 50)[0]) == 5  # at most half are queries
+
+    [result] = ev.evaluate_configs(vectors, ["flat"], k=5, n_queries=50)
+    assert (result["queries"], result["indexed"]) == (50, len(vectors) - 50)
+
+
+def test_load_vectors_prefers_full_precision_copy(tmp_path, fake_embeddings):
+    df = pd.DataFrame(
+        {
+            "Complaint ID": range(40),
+            "Product": ["Credit card"] * 40,
+            "Cleaned Narrative": [f"late fee complaint {i}." for i in range(40)],
+        }
+    )
+    cvs.build_vector_store(
+        df,
+        "fake",
+        str(tmp_path),
+        40,
+        5,
+        fake_embeddings,
+        storage="int8",
+        full_vectors=True,
+    )
+    full = np.load(tmp_path / cvs.VECTORS_FILENAME)
+    assert np.array_equal(ev.load_vectors(str(tmp_path)), full)
+
+
+def test_parse_config():
+    assert ev.parse_config("hnsw:M=16,ef_search=40") == (
+        "hnsw",
+        {"M": 16, "ef_search": 40},
+    )
+    assert ev.parse_config("flat:storage=int8,rescore=4") == (
+        "flat",
+        {"storage": "int8", "rescore": 4},
+    )
+    assert ev.parse_config("flat") == ("flat", {})
+
+
+def test_build_vector_store_with_ivf(tmp_path, fake_embeddings):
+    df = pd.DataFrame(
+        {
+            "Complaint ID": range(60),
+            "Product": ["Credit card"] * 60,
+            "Cleaned Narrative": [
+                f"complaint {i} about fee {i % 7}" for i in range(60)
+            ],
+        }
+    )
+    cvs.build_vector_store(
+        df,
+        "fake",
+        str(tmp_path),
+        embeddings_model=fake_embeddings,
+        index_type="ivf",
+        index_params={"nlist": 4, "nprobe": 4},
+    )
+
+    vs = MmapVectorStore.load(str(tmp_path), fake_embeddings)
+    assert "IVF" in type(faiss.downcast_index(vs.index)).__name__
+    assert (
+        vs.similarity_search("complaint 3 about fee 3", k=1)[0].metadata["complaint_id"]
+        == 3
+    )
+    assert load_manifest(str(tmp_path))["index"] == {
+        "type": "ivf",
+        "params": ixf.resolve_params("ivf", n_vectors=60, nlist=4, nprobe=4),
+        "storage": "float32",
+    }
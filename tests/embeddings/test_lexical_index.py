@@ -0,0 +1,110 @@
+# tests/embeddings/test_lexical_index.py
+
+import numpy as np
+import pandas as pd
+
+from src.embeddings import create_vector_store as cvs
+from src.embeddings.chunk_store import ChunkStore
+from src.embeddings.lexical_index import (
+    LexicalIndex,
+    build_postings,
+    tokenize,
+    write_lexical_index,
+)
+from src.embeddings.mmap_store import MmapVectorStore
+from src.rag import query_rag_pipeline as qrp
+from src.rag.cache import RAGCache
+
+TEXTS = [
+    "I was charged a late fee on my credit card.",
+    "Zelle transfer to XXXX never arrived.",
+    "The late fee was charged again, another late fee.",
+    "My personal loan rate changed.",
+]
+
+
+def test_tokenize_drops_stop_words_and_redactions():
+    assert tokenize("The Zelle transfer to XXXX on 12/xx/2022") == [
+        "zelle",
+        "transfer",
+        "12",
+        "2022",
+    ]
+
+
+def test_bm25_ranks_term_matches():
+    index = LexicalIndex(*build_postings(TEXTS))
+
+    rows, scores = index.search("late fee", k=10)
+    assert rows.tolist() == [2, 0]  # more occurrences rank first
+    assert scores[0] > scores[1] > 0
+    assert index.search("zelle", k=1)[0].tolist() == [1]
+    assert index.search("the of unknownword", k=5)[0].size == 0
+    # Restricted to allowed rows
+    assert index.search("late fee", 10, np.array([0, 1]))[0].tolist() == [0]
+
+
+def _complaints(n=40):
+    narratives = [f"my account statement number {i} looked wrong." for i in range(n)]
+    narratives[17] = "zelle payment sent to a scammer was never refunded."
+    return pd.DataFrame(
+        {
+            "Complaint ID": range(n),
+            "Product": ["Credit card", "Money transfers"] * (n // 2),
+            "Cleaned Narrative": narratives,
+        }
+    )
+
+
+def test_hybrid_retrieval_finds_exact_terms(tmp_path, fake_embeddings):
+    cvs.build_vector_store(_complaints(), "fake", str(tmp_path), 60, 5, fake_embeddings)
+    vs = MmapVectorStore.load(str(tmp_path), fake_embeddings)
+    assert vs.lexical is not None
+
+    cache = RAGCache(max_entries=0)
+    hybrid = qrp.retrieve_chunks(vs, "zelle scam", 3, cache=cache, mode="hybrid")
+    assert 17 in [doc.metadata["complaint_id"] for doc in hybrid]
+    batched = qrp.retrieve_chunks_batch(
+        vs, ["zelle scam"], 3, cache=cache, mode="hybrid"
+    )
+    assert [d.id for d in batched[0]] == [d.id for d in hybrid]
+
+    # Filters apply to both rankings
+    filtered = qrp.retrieve_chunks(
+        vs, "zelle", 5, {"product": "Credit card"}, cache, mode="hybrid"
+    )
+    assert {doc.metadata["product"] for doc in filtered} == {"Credit card"}
+
+
+def test_incremental_update_rebuilds_lexical_index(tmp_path, fake_embeddings):
+    df = _complaints()
+    cvs.update_vector_store(df, "fake", str(tmp_path), 60, 5, fake_embeddings)
+    df.loc[3, "Cleaned Narrative"] = "overdraft penalty applied twice."
+    cvs.update_vector_store(df, "fake", str(tmp_path), 60, 5, fake_embeddings)
+
+    vs = MmapVectorStore.load(str(tmp_path), fake_embeddings)
+    assert vs.lexical.build_id == vs.chunks.build_id
+    [(doc, _)] = vs.hybrid_search_with_score("overdraft", k=1)
+    assert doc.metadata["complaint_id"] == 3
+
+
+def test_patched_index_matches_full_rebuild(tmp_path, fake_embeddings):
+    df = _complaints()
+    cvs.update_vector_store(df, "fake", str(tmp_path), 60, 5, fake_embeddings)
+    df.loc[3, "Cleaned Narrative"] = "overdraft penalty applied twice."
+    df = df[df["Complaint ID"] != 17]
+    cvs.update_vector_store(df, "fake", str(tmp_path), 60, 5, fake_embeddings)
+
+    patched = LexicalIndex.from_dir(str(tmp_path), mmap=False)
+    rebuilt_dir = tmp_path / "rebuilt"
+    rebuilt_dir.mkdir()
+    write_lexical_index(str(rebuilt_dir), ChunkStore.from_dir(str(tmp_path)))
+    rebuilt = LexicalIndex.from_dir(str(rebuilt_dir), mmap=False)
+
+    assert "zelle" not in patched.vocabulary
+    assert set(patched.vocabulary) == set(rebuilt.vocabulary)
+    for query in ("overdraft", "account statement", "wrong number 5"):
+        rows, scores = patched.search(query, 10)
+        expected_rows, expected_scores = rebuilt.search(query, 10)
+        assert rows.tolist() == expected_rows.tolist()
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-6)
@@ -0,0 +1,31 @@
+# tests/embeddings/test_manifest.py
+
+from src.embeddings import manifest as mf
+
+
+def test_diff_manifest():
+    manifest = {
+        "complaints": {
+            "1": {"hash": "a", "n_chunks": 2},
+            "2": {"hash": "b", "n_chunks": 1},
+            "3": {"hash": "c", "n_chunks": 3},
+        }
+    }
+    added, changed, deleted = mf.diff_manifest(manifest, {1: "a", 2: "B", 4: "d"})
+    assert (added, changed, deleted) == ([4], [2], [3])
+
+
+def test_content_hash_tracks_product_and_text():
+    base = mf.content_hash("Credit card", "text")
+    assert base == mf.content_hash("Credit card", "text")
+    assert base != mf.content_hash("Personal loan", "text")
+    assert base != mf.content_hash("Credit card", "text!")
+    assert base == mf.content_hash("Credit card", "text", None, float("nan"))
+    assert base != mf.content_hash("Credit card", "text", "Fees", "Bank A")
+
+
+def test_manifest_roundtrip(tmp_path):
+    assert mf.load_manifest(str(tmp_path)) is None
+    manifest = {"embedding_model": "m", "complaints": {}}
+    mf.save_manifest(manifest, str(tmp_path))
+    assert mf.load_manifest(str(tmp_path)) == manifest
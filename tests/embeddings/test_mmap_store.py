@@ -0,0 +1,232 @@
+# tests/embeddings/test_mmap_store.py
+
+import faiss
+import numpy as np
+import pandas as pd
+import pytest
+
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from src.embeddings import create_vector_store as cvs
+from src.embeddings.chunk_store import ChunkStore, has_chunk_store
+from src.embeddings.manifest import chunk_id
+from src.embeddings.mmap_store import MmapVectorStore, convert_legacy_store
+from src.rag import query_rag_pipeline as qrp
+
+
+@pytest.fixture
+def complaints():
+    return pd.DataFrame(
+        {
+            "Complaint ID": range(1, 61),
+            "Product": ["Credit card", "Personal loan", "Savings account"] * 20,
+            "Cleaned Narrative": [
+                f"complaint {i} about a disputed charge number {i % 9}. "
+                f"the bank did not respond to letter {i}."
+                for i in range(1, 61)
+            ],
+        }
+    )
+
+
+def _chunk_ids(docs):
+    """``<cid>-<n>`` ids in ``chunk_texts`` order"""
+    counts = {}
+    ids = []
+    for doc in docs:
+        cid = doc.metadata["complaint_id"]
+        ids.append(chunk_id(cid, counts.get(cid, 0)))
+        counts[cid] = counts.get(cid, 0) + 1
+    return ids
+
+
+def test_chunk_store_roundtrip(tmp_path, complaints, fake_embeddings):
+    docs = cvs.chunk_texts(complaints.head(3), chunk_size=40, chunk_overlap=5)
+    docs[0].page_content = "café – naïve"  # multi-byte UTF-8
+    cvs.embed_and_store(docs, "fake", str(tmp_path), fake_embeddings)
+
+    assert has_chunk_store(str(tmp_path))
+    assert not (tmp_path / "index.pkl").exists()
+    store = ChunkStore.from_dir(str(tmp_path))
+    assert isinstance(store.table, np.memmap)
+    loaded = store.documents()
+    assert [d.page_content for d in loaded] == [d.page_content for d in docs]
+    assert [d.metadata for d in loaded] == [d.metadata for d in docs]
+    assert [d.id for d in loaded] == _chunk_ids(docs)
+
+
+def test_search_matches_exact_neighbours(tmp_path, complaints, fake_embeddings):
+    docs = cvs.chunk_texts(complaints, chunk_size=40, chunk_overlap=5)
+    vs = cvs.embed_and_store(docs, "fake", str(tmp_path), fake_embeddings)
+
+    results = vs.similarity_search_with_score(docs[7].page_content, k=3)
+    assert results[0][0].page_content == docs[7].page_content
+    assert results[0][1] == pytest.approx(0.0, abs=1e-5)
+    assert len(vs.similarity_search("anything", k=len(docs) + 5)) == len(docs)
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf"])
+def test_incremental_update_keeps_labels_consistent(
+    tmp_path, complaints, fake_embeddings, index_type
+):
+    options = {"index_type": index_type, "index_params": {"nlist": 2}}
+    cvs.build_vector_store(
+        complaints, "fake", str(tmp_path), 40, 5, fake_embeddings, **options
+    )
+
+    updated = complaints[complaints["Complaint ID"] % 4 != 0].copy()
+    updated.loc[updated["Complaint ID"] == 5, "Cleaned Narrative"] = "new text."
+    cvs.update_vector_store(
+        updated, "fake", str(tmp_path), 40, 5, fake_embeddings, **options
+    )
+
+    vs = MmapVectorStore.load(str(tmp_path), fake_embeddings)
+    assert vs.index.ntotal == len(vs.chunks)
+    stored = vs.chunks.documents()
+    assert {d.metadata["complaint_id"] for d in stored} == set(updated["Complaint ID"])
+    assert "new text." in [d.page_content for d in stored]
+    for doc in stored:
+        top = vs.similarity_search(doc.page_content, k=1)[0]
+        assert top.page_content == doc.page_content
+
+
+def test_int8_store_rescores_from_full_vectors(tmp_path, complaints, fake_embeddings):
+    options = {"storage": "int8", "full_vectors": True}
+    cvs.build_vector_store(
+        complaints, "fake", str(tmp_path), 40, 5, fake_embeddings, **options
+    )
+    vs = MmapVectorStore.load(str(tmp_path), fake_embeddings)
+    assert isinstance(faiss.downcast_index(vs.index), faiss.IndexScalarQuantizer)
+    assert len(vs.vectors) == len(vs.chunks)
+
+    doc = vs.chunks.document(11)
+    top, score = vs.similarity_search_with_score(doc.page_content, k=1)[0]
+    assert top.page_content == doc.page_content
+    assert score == pytest.approx(0.0, abs=1e-6)  # exact, not quantized
+
+    # Incremental updates keep the full-precision copy in step
+    updated = complaints[complaints["Complaint ID"] % 3 != 0]
+    cvs.update_vector_store(
+        updated, "fake", str(tmp_path), 40, 5, fake_embeddings, storage="int8"
+    )
+    vs = MmapVectorStore.load(str(tmp_path), fake_embeddings)
+    assert len(vs.vectors) == len(vs.chunks) == vs.index.ntotal
+    for row in range(0, len(vs.chunks), 7):
+        expected = fake_embeddings.embed_query(vs.chunks.document(row).page_content)
+        assert np.allclose(vs.vectors[row], expected, atol=1e-6)
+
+    # A rebuild without them drops the stale copy
+    cvs.build_vector_store(updated, "fake", str(tmp_path), 40, 5, fake_embeddings)
+    assert MmapVectorStore.load(str(tmp_path), fake_embeddings).vectors is None
+
+
+def test_convert_legacy_store(tmp_path, complaints, fake_embeddings):
+    docs = cvs.chunk_texts(complaints.head(5), chunk_size=40, chunk_overlap=5)
+    ids = _chunk_ids(docs)
+    vectors = fake_embeddings.embed_documents([d.page_content for d in docs])
+    index = faiss.IndexFlatL2(16)
+    index.add(np.asarray(vectors, dtype="float32"))
+    FAISS(
+        fake_embeddings,
+        index,
+        InMemoryDocstore(dict(zip(ids, docs))),
+        dict(enumerate(ids)),
+    ).save_local(str(tmp_path))
+
+    convert_legacy_store(str(tmp_path))
+
+    assert not (tmp_path / "index.pkl").exists()
+    vs = MmapVectorStore.load(str(tmp_path), fake_embeddings)
+    assert vs.similarity_search(docs[2].page_content, k=1)[0].id == ids[2]
+
+
+def test_load_vector_store_uses_mmap_format(
+    tmp_path, complaints, fake_embeddings, monkeypatch
+):
+    docs = cvs.chunk_texts(complaints.head(2), chunk_size=40, chunk_overlap=5)
+    cvs.embed_and_store(docs, "fake", str(tmp_path), fake_embeddings)
+    monkeypatch.setattr(qrp, "get_embedder", lambda name: fake_embeddings)
+
+    vs = qrp.load_vector_store(str(tmp_path))
+    assert isinstance(vs, MmapVectorStore)
+    top = qrp.retrieve_chunks(vs, docs[0].page_content, top_k=1)[0]
+    assert (top.page_content, top.metadata) == (docs[0].page_content, docs[0].metadata)
+
+
+@pytest.fixture
+def filtered_store(tmp_path, fake_embeddings):
+    def build(index_type, **index_params):
+        df = pd.DataFrame(
+            {
+                "Complaint ID": range(300),
+                "Product": ["Credit card", "Personal loan", "BNPL"] * 100,
+                "Company": ["Bank A", "Bank B"] * 150,
+                "Date received": [f"2023-{m:02d}-15" for m in range(1, 11)] * 30,
+                "Cleaned Narrative": [f"complaint number {i}." for i in range(300)],
+            }
+        )
+        save_dir = str(tmp_path / index_type)
+        cvs.build_vector_store(
+            df,
+            "fake",
+            save_dir,
+            embeddings_model=fake_embeddings,
+            index_type=index_type,
+            index_params=index_params,
+        )
+        return MmapVectorStore.load(save_dir, fake_embeddings)
+
+    return build
+
+
+@pytest.mark.parametrize(
+    "index_type, params",
+    [
+        ("flat", {}),
+        ("ivf", {"nlist": 8, "nprobe": 1}),
+        ("hnsw", {"M": 4, "ef_search": 4}),
+        ("pq", {"pq_m": 4, "nbits": 4}),
+    ],
+)
+def test_product_filter_returns_k_matches(filtered_store, index_type, params):
+    vs = filtered_store(index_type, **params)
+    results = vs.similarity_search(
+        "complaint number 7.", k=10, filter={"product": "BNPL"}
+    )
+
+    assert len(results) == 10
+    assert {doc.metadata["product"] for doc in results} == {"BNPL"}
+    if index_type == "flat":
+        # Exact search over the partition equals post-filtering everything
+        everything = vs.similarity_search("complaint number 7.", k=300)
+        expected = [d for d in everything if d.metadata["product"] == "BNPL"][:10]
+        assert [d.id for d in results] == [d.id for d in expected]
+
+
+def test_company_and_date_filters(filtered_store):
+    vs = filtered_store("flat")
+    flt = {
+        "product": ["Credit card", "BNPL"],
+        "company": "Bank B",
+        "date_from": "2023-03-01",
+        "date_to": "2023-06-30",
+    }
+    results = vs.similarity_search("complaint", k=500, filter=flt)
+
+    assert len(results) == len(vs.chunks.select(flt)) > 0
+    for doc in results:
+        meta = doc.metadata
+        assert meta["product"] in ("Credit card", "BNPL")
+        assert meta["company"] == "Bank B"
+        assert "2023-03-01" <= meta["date_received"] <= "2023-06-30"
+
+    assert vs.similarity_search("complaint", k=5, filter={"product": "Auto"}) == []
+    with pytest.raises(ValueError):
+        vs.similarity_search("complaint", k=5, filter={"state": "CA"})
+
+
+def test_product_partitions_are_contiguous(filtered_store):
+    vs = filtered_store("flat")
+    labels = vs.chunks.select({"product": "Personal loan"})
+    assert labels[-1] - labels[0] + 1 == len(labels) == 100
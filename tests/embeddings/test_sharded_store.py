@@ -0,0 +1,170 @@
+# tests/embeddings/test_sharded_store.py
+
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.embeddings import create_vector_store as cvs
+from src.embeddings.mmap_store import MmapVectorStore
+from src.embeddings.sharded_store import (
+    ShardedVectorStore,
+    assign_shards,
+    is_sharded_store,
+)
+from src.rag import query_rag_pipeline as qrp
+from src.rag.cache import RAGCache
+
+
+@pytest.fixture
+def complaints():
+    return pd.DataFrame(
+        {
+            "Complaint ID": range(1, 91),
+            "Product": ["Credit card"] * 50 + ["Personal loan"] * 25 + ["BNPL"] * 15,
+            "Cleaned Narrative": [
+                f"complaint {i} about a disputed charge number {i % 9}."
+                for i in range(1, 91)
+            ],
+        }
+    )
+
+
+@pytest.fixture
+def stores(tmp_path, complaints, fake_embeddings):
+    """(unsharded store, sharded build dir) over the same complaints"""
+    cvs.build_vector_store(
+        complaints, "fake", str(tmp_path / "single"), 40, 5, fake_embeddings
+    )
+    single = MmapVectorStore.load(str(tmp_path / "single"), fake_embeddings)
+    sharded_dir = str(tmp_path / "sharded")
+    cvs.build_sharded_vector_store(
+        complaints, "fake", sharded_dir, 3, "hash", 40, 5, fake_embeddings
+    )
+    return single, sharded_dir
+
+
+def test_assign_shards(complaints):
+    shards, layout = assign_shards(complaints, 3, "hash")
+    assert np.bincount(shards).tolist() == [30, 30, 30]
+
+    shards, layout = assign_shards(complaints, 2, "product")
+    # Largest product alone, the two smaller ones together
+    assert layout["products"] == {"Credit card": 0, "Personal loan": 1, "BNPL": 1}
+    more = pd.concat(
+        [complaints, pd.DataFrame({"Complaint ID": [99], "Product": ["Savings"]})]
+    )
+    shards, updated = assign_shards(more, 2, "product", layout)
+    assert {k: updated["products"][k] for k in layout["products"]} == layout["products"]
+    assert updated["products"]["Savings"] == 1
+    with pytest.raises(ValueError):
+        assign_shards(complaints, 2, "random")
+
+
+def test_scatter_gather_matches_single_index(stores, fake_embeddings):
+    single, sharded_dir = stores
+    sharded = ShardedVectorStore.load(sharded_dir, fake_embeddings, workers="local")
+    assert is_sharded_store(sharded_dir)
+    assert len(sharded.shards) == 3
+
+    queries = [
+        "complaint 7 about a disputed charge",
+        "disputed charge number 4",
+        "complaint 88",
+    ]
+    vectors = fake_embeddings.embed_documents(queries)
+    for expected, found in zip(
+        single.search(vectors, k=6), sharded.search(vectors, k=6)
+    ):
+        assert [d.id for d, _ in found] == [d.id for d, _ in expected]
+        assert np.allclose([s for _, s in found], [s for _, s in expected])
+
+    filtered = sharded.similarity_search("complaint", k=5, filter={"product": "BNPL"})
+    assert len(filtered) == 5
+    assert {d.metadata["product"] for d in filtered} == {"BNPL"}
+
+
+class StuckShard:
+    info = {"version": "stuck", "lexical": True, "products": ["Credit card"]}
+
+    def submit(self, method, *args):
+        return Future()  # never answers
+
+    def close(self):
+        pass
+
+
+def test_slow_or_missing_shard_is_skipped(stores, fake_embeddings):
+    _, sharded_dir = stores
+    sharded = ShardedVectorStore.load(sharded_dir, fake_embeddings, workers="local")
+    healthy = sharded.shards[:2]
+    sharded.shards = healthy + [StuckShard()]
+    sharded.timeout = 0.05
+
+    docs = sharded.similarity_search("complaint 3", k=4)
+    assert len(docs) == 4
+    held = {
+        d.metadata["complaint_id"]
+        for shard in healthy
+        for d in shard.store.chunks.documents()
+    }
+    assert {d.metadata["complaint_id"] for d in docs} <= held
+    assert sharded.missed == 1
+    assert sharded.partial
+
+    sharded.shards = [StuckShard()]
+    with pytest.raises(TimeoutError):
+        sharded.similarity_search("complaint 3", k=4)
+
+
+def test_partial_results_are_not_cached(stores, fake_embeddings, monkeypatch):
+    _, sharded_dir = stores
+    sharded = ShardedVectorStore.load(sharded_dir, fake_embeddings, workers="local")
+    sharded.timeout = 0.05
+    stuck = sharded.shards[0]
+    submit = stuck.submit
+    monkeypatch.setattr(stuck, "submit", StuckShard().submit)
+    monkeypatch.setattr(qrp, "generate_answer", lambda prompt: "answer")
+    monkeypatch.setattr(
+        qrp, "generate_answers", lambda prompts, **_: ["a"] * len(prompts)
+    )
+    cache = RAGCache()
+    question = "charged a late fee"
+
+    _, chunks = qrp.answer_question(question, sharded, 3, cache=cache)
+    [(_, batched)] = qrp.answer_questions([question], sharded, 3, cache=cache)
+    assert sharded.partial and chunks and batched
+    key = qrp._answer_key(cache, sharded, question, chunks)
+    assert cache.answers.get(key) is None
+    assert cache.get_retrieval(sharded.version, question, 3, None, "dense") is None
+
+    monkeypatch.setattr(stuck, "submit", submit)  # The shard answers again
+    qrp.answer_question(question, sharded, 3, cache=cache)
+    assert not sharded.partial
+    assert cache.get_retrieval(sharded.version, question, 3, None, "dense")
+
+
+def test_process_workers_and_pipeline(stores, fake_embeddings, monkeypatch):
+    single, sharded_dir = stores
+    monkeypatch.setattr(qrp, "get_embedder", lambda name: fake_embeddings)
+    vs = qrp.load_vector_store(sharded_dir)
+    try:
+        assert isinstance(vs, ShardedVectorStore)
+        assert qrp.list_products(vs) == ["BNPL", "Credit card", "Personal loan"]
+        question = "complaint 12 about a disputed charge number 3."
+        chunks = qrp.retrieve_chunks(vs, question, top_k=3, mode="hybrid")
+        assert len(chunks) == 3
+        dense = qrp.retrieve_chunks_batch(vs, [question], top_k=3, mode="dense")[0]
+        expected = single.similarity_search(question, k=3)
+        assert [d.id for d in dense] == [d.id for d in expected]
+        assert qrp.get_full_narrative(dense[0], sharded_dir).startswith("complaint")
+
+        # A dead worker only costs its share of the corpus
+        vs.shards[0].process.kill()
+        vs.shards[0].process.join()
+        assert len(vs.similarity_search("complaint", k=3)) == 3
+        assert vs.missed >= 1
+    finally:
+        vs.close()
+        qrp._document_stores.clear()
@@ -0,0 +1,112 @@
+# tests/rag/test_batch_answer.py
+
+import json
+
+import pandas as pd
+import pytest
+
+from src.embeddings import create_vector_store as cvs
+from src.embeddings.mmap_store import MmapVectorStore
+from src.rag import batch_answer
+from src.rag import query_rag_pipeline as qrp
+from src.rag.cache import RAGCache
+
+
+class FakePipeline:
+    """Mimics a HF text2text pipeline: records the batches it is given"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, prompts, batch_size=1):
+        self.calls.append((list(prompts), batch_size))
+        return [{"generated_text": f"answer to {len(p)}"} for p in prompts]
+
+
+class FakeLLM:
+    def __init__(self):
+        self.pipeline = FakePipeline()
+
+
+@pytest.fixture
+def vector_store(tmp_path, fake_embeddings):
+    df = pd.DataFrame(
+        {
+            "Complaint ID": range(30),
+            "Product": ["Credit card", "Personal loan", "BNPL"] * 10,
+            "Cleaned Narrative": [
+                f"complaint about fee number {i}." for i in range(30)
+            ],
+        }
+    )
+    cvs.build_vector_store(df, "fake", str(tmp_path), 40, 5, fake_embeddings)
+    return MmapVectorStore.load(str(tmp_path), fake_embeddings)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake = FakeLLM()
+    monkeypatch.setattr(qrp, "get_generator", lambda: fake)
+    return fake
+
+
+QUESTIONS = ["why was i charged a fee?", "who handles bnpl disputes?", "late fee"]
+
+
+def test_batch_retrieval_matches_single_queries(vector_store):
+    cache = RAGCache(max_entries=0)
+    batched = qrp.retrieve_chunks_batch(
+        vector_store, QUESTIONS, top_k=4, filters={"product": "BNPL"}, cache=cache
+    )
+    single = [
+        qrp.retrieve_chunks(vector_store, q, 4, {"product": "BNPL"}, cache)
+        for q in QUESTIONS
+    ]
+    assert [[d.id for d in docs] for docs in batched] == [
+        [d.id for d in docs] for docs in single
+    ]
+
+
+def test_answer_questions_generates_in_sorted_deduplicated_batches(vector_store, llm):
+    questions = QUESTIONS + [QUESTIONS[0]]
+    results = qrp.answer_questions(
+        questions, vector_store, top_k=3, cache=RAGCache(max_entries=0), batch_size=2
+    )
+
+    assert len(results) == 4
+    assert results[0] == results[3]
+    assert all(len(chunks) == 3 for _, chunks in results)
+    [(prompts, batch_size)] = llm.pipeline.calls
+    assert batch_size == 2
+    assert len(prompts) == 3  # the repeated question is generated once
+    assert [len(p) for p in prompts] == sorted(len(p) for p in prompts)
+
+
+def test_answer_questions_uses_answer_cache(vector_store, llm):
+    cache = RAGCache(max_entries=10, ttl=60, path="")
+    first = qrp.answer_questions(QUESTIONS, vector_store, cache=cache)
+    second = qrp.answer_questions(QUESTIONS, vector_store, cache=cache)
+
+    assert first == second
+    assert len(llm.pipeline.calls) == 1
+    assert cache.stats()["answers"]["hits"] == 3
+
+
+def test_answer_file_groups_questions_by_filters(tmp_path, vector_store, llm):
+    input_path = tmp_path / "questions.jsonl"
+    records = [
+        {"question": "fee?"},
+        {"question": "refund?"},
+        {"question": "bnpl fee?", "filters": {"product": "BNPL"}},
+    ]
+    input_path.write_text("\n".join(json.dumps(r) for r in records) + "\n\n")
+    output_path = tmp_path / "out" / "answers.jsonl"
+
+    n = batch_answer.answer_file(str(input_path), str(output_path), vector_store)
+
+    lines = [json.loads(line) for line in output_path.read_text().splitlines()]
+    assert n == len(lines) == 3
+    assert [line["question"] for line in lines] == ["fee?", "refund?", "bnpl fee?"]
+    assert {s["product"] for s in lines[2]["sources"]} == {"BNPL"}
+    assert all(line["answer"].startswith("answer to") for line in lines)
+    assert len(llm.pipeline.calls) == 2  # one per filter group
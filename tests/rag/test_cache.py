@@ -0,0 +1,127 @@
+# tests/rag/test_cache.py
+
+import pandas as pd
+import pytest
+
+from src.embeddings import create_vector_store as cvs
+from src.embeddings.mmap_store import MmapVectorStore
+from src.rag import cache as rag_cache
+from src.rag import query_rag_pipeline as qrp
+
+
+def test_ttl_cache_lru_and_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rag_cache.time, "time", lambda: now[0])
+    cache = rag_cache.TTLCache(max_entries=2, ttl=60)
+
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+    now[0] += 61
+    assert cache.get("a") is None
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_ttl_cache_persists_and_stays_bounded(tmp_path):
+    path = str(tmp_path / "rag_cache.sqlite")
+    cache = rag_cache.TTLCache(max_entries=3, ttl=None, path=path, namespace="x")
+    for i in range(5):
+        cache.put(f"k{i}", {"value": i})
+
+    reopened = rag_cache.TTLCache(max_entries=3, ttl=None, path=path, namespace="x")
+    assert reopened.get("k4") == {"value": 4}
+    assert reopened.get("k0") is None
+    count = reopened._connection().execute("SELECT COUNT(*) FROM entries")
+    assert count.fetchone()[0] == 3
+    # Namespaces don't see each other's entries
+    other = rag_cache.TTLCache(max_entries=3, ttl=None, path=path, namespace="y")
+    assert other.get("k4") is None
+
+
+@pytest.fixture
+def store_dir(tmp_path, fake_embeddings):
+    df = pd.DataFrame(
+        {
+            "Complaint ID": range(20),
+            "Product": ["Credit card", "Personal loan"] * 10,
+            "Cleaned Narrative": [f"fraudulent charge number {i}." for i in range(20)],
+        }
+    )
+
+    def build():
+        cvs.build_vector_store(df, "fake", str(tmp_path), 40, 5, fake_embeddings)
+        return str(tmp_path)
+
+    return build
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    prompts = []
+
+    def fake_generate(prompt, llm=None):
+        prompts.append(prompt)
+        return f"answer {len(prompts)}"
+
+    monkeypatch.setattr(qrp, "generate_answer", fake_generate)
+    return prompts
+
+
+def test_repeated_question_is_served_from_cache(store_dir, fake_embeddings, generated):
+    vs = MmapVectorStore.load(store_dir(), fake_embeddings)
+    cache = rag_cache.RAGCache(max_entries=10, ttl=60, path="")
+    fake_embeddings.embedded.clear()
+    question = "How often do people mention fraud in credit cards?"
+
+    first, sources = qrp.answer_question(question, vs, top_k=3, cache=cache)
+    again, cached_sources = qrp.answer_question(
+        f"  {question} ", vs, top_k=3, cache=cache
+    )
+    assert again == first == "answer 1"
+    assert [d.id for d in cached_sources] == [d.id for d in sources]
+
+    # Retrieval ignores case (the prompt does not)
+    qrp.answer_question(question.upper(), vs, top_k=3, cache=cache)
+    assert cache.stats()["retrievals"]["hits"] == 2
+    assert len(generated) == 2
+    # Different filters are a different retrieval
+    qrp.answer_question(
+        question, vs, top_k=3, filters={"product": "Personal loan"}, cache=cache
+    )
+    assert cache.stats()["retrievals"]["misses"] == 2
+
+
+def test_rebuilt_store_invalidates_cache(store_dir, fake_embeddings, generated):
+    cache = rag_cache.RAGCache(max_entries=10, ttl=60, path="")
+    question = "fraudulent charge"
+
+    vs = MmapVectorStore.load(store_dir(), fake_embeddings)
+    qrp.answer_question(question, vs, cache=cache)
+    qrp.answer_question(question, vs, cache=cache)
+    assert len(generated) == 1
+
+    rebuilt = MmapVectorStore.load(store_dir(), fake_embeddings)
+    assert rebuilt.version != vs.version
+    qrp.answer_question(question, rebuilt, cache=cache)
+    assert len(generated) == 2
+    # The query embedding itself is still reused
+    assert cache.stats()["query_embeddings"]["hits"] >= 1
+
+
+def test_disabled_cache_calls_the_store(fake_embeddings, generated):
+    class Store:
+        version = "v1"
+        calls = 0
+
+        def similarity_search(self, query, k=4, filter=None):
+            Store.calls += 1
+            return []
+
+    cache = rag_cache.RAGCache(max_entries=0)
+    for _ in range(2):
+        qrp.answer_question("q", Store(), cache=cache)
+    assert Store.calls == 2 and len(generated) == 2
@@ -0,0 +1,88 @@
+# tests/rag/test_context_packing.py
+
+import pandas as pd
+from langchain_core.documents import Document
+
+from src.embeddings import create_vector_store as cvs
+from src.rag import query_rag_pipeline as qrp
+from src.rag.context_packing import merge_chunks, mmr_order, pack_context
+
+NARRATIVE = (
+    "I paid my credit card bill on time every month. The bank still charged "
+    "a late fee and raised my interest rate. Customer service refused to "
+    "remove the fee and closed my complaint without any explanation at all."
+)
+
+
+def words(text):
+    return len(text.split())
+
+
+def narrative_chunks():
+    df = pd.DataFrame(
+        {
+            "Complaint ID": [1],
+            "Product": ["Credit card"],
+            "Cleaned Narrative": [NARRATIVE],
+        }
+    )
+    return cvs.chunk_texts(df, chunk_size=60, chunk_overlap=20)
+
+
+def test_overlapping_chunks_merge_back_into_the_narrative():
+    chunks = narrative_chunks()
+    assert len(chunks) > 3
+    # Retrieval order is not narrative order
+    shuffled = chunks[2:] + chunks[:2]
+    [passage] = merge_chunks(shuffled + [chunks[1]])
+    assert passage.text == NARRATIVE
+    assert passage.rank == 0
+
+
+def test_separate_spans_and_legacy_duplicates_stay_apart():
+    chunks = narrative_chunks()
+    legacy = Document(page_content="legacy text", metadata={"complaint_id": 9})
+    passages = merge_chunks([chunks[-1], legacy, chunks[0], legacy])
+    assert [p.text for p in passages] == [
+        chunks[-1].page_content,
+        "legacy text",
+        chunks[0].page_content,
+    ]
+
+
+def test_mmr_moves_near_duplicates_down():
+    docs = [
+        Document(page_content=text, metadata={"complaint_id": i})
+        for i, text in enumerate(
+            [
+                "late fee charged on my credit card",
+                "late fee charged on my credit card again",
+                "zelle transfer never arrived",
+            ]
+        )
+    ]
+    ordered = mmr_order(merge_chunks(docs), mmr_lambda=0.5)
+    assert [p.complaint_id for p in ordered] == [0, 2, 1]
+
+
+def test_budget_is_respected_and_last_passage_is_cut():
+    docs = [
+        Document(page_content=" ".join([f"word{i}"] * 30), metadata={"complaint_id": i})
+        for i in range(3)
+    ]
+    packed = pack_context(docs, words, token_budget=50, separator=" | ")
+    assert [words(text) for text in packed] == [30, 19]  # 30 + "|" + 19
+    assert pack_context(docs, words, token_budget=20, separator=" | ") == [
+        " ".join(["word0"] * 20)
+    ]
+    assert len(pack_context(docs, words, token_budget=None)) == 3
+
+
+def test_build_prompt_fits_the_token_budget():
+    chunks = narrative_chunks()
+    prompt = qrp.build_prompt(chunks * 3, "Why was a fee charged?", token_budget=120)
+    assert qrp.count_tokens(prompt) <= 120
+    assert prompt.count("I paid my credit card bill") == 1
+
+    unlimited = qrp.build_prompt(chunks, "Why?", token_budget=0)
+    assert NARRATIVE in unlimited
@@ -0,0 +1,68 @@
+# tests/rag/test_count_questions.py
+
+import pandas as pd
+
+from src.data.aggregate_index import AggregateIndex, build_aggregate_index
+from src.rag import query_rag_pipeline as qrp
+from src.rag.count_questions import parse_count_question
+
+PRODUCTS = ["Credit card", "Buy Now, Pay Later (BNPL)", "Money transfers"]
+
+
+def test_parse_count_question():
+    parsed = parse_count_question(
+        "How often do people mention fraud in credit cards?", PRODUCTS
+    )
+    assert parsed == {"phrase": "fraud", "products": ["Credit card"], "by": None}
+    parsed = parse_count_question("Monthly trend of BNPL complaints about late fees")
+    assert parsed["phrase"] == "late fee" and parsed["by"] == "month"
+    parsed = parse_count_question("How many BNPL complaints are there?", PRODUCTS)
+    assert parsed["phrase"] is None
+    assert parsed["products"] == ["Buy Now, Pay Later (BNPL)"]
+    assert parse_count_question("Why was I charged a late fee?", PRODUCTS) is None
+
+
+def test_parse_trend_questions():
+    parsed = parse_count_question("Trend of zelle complaints over time", PRODUCTS)
+    assert parsed == {"phrase": "zelle", "products": [], "by": "month"}
+    # Trend words are left out of the phrase in any form
+    parsed = parse_count_question("Are complaints about savings accounts increasing?")
+    assert parsed == {"phrase": "saving account", "products": [], "by": "month"}
+    parsed = parse_count_question("What is the number of complaints about late fees?")
+    assert parsed["phrase"] == "late fee"
+
+
+def test_open_questions_are_not_routed():
+    for question in [
+        "Why are complaints about savings accounts increasing?",
+        "What are customers saying about the number of fees?",
+        "how much money was stolen from people who complained about zelle",
+        "Summarize complaints about late fees over time",
+    ]:
+        assert parse_count_question(question, PRODUCTS) is None, question
+
+
+def test_answer_question_routes_counting_questions(tmp_path):
+    df = pd.DataFrame(
+        {
+            "Complaint ID": [10, 11, 12],
+            "Product": ["Credit card", "Credit card", "Money transfers"],
+            "Cleaned Narrative": ["card fraud.", "a late fee.", "zelle fraud."],
+        }
+    )
+    build_aggregate_index([df], str(tmp_path))
+    index = AggregateIndex.from_dir(str(tmp_path))
+
+    # Answered from the index: the vector store is never touched
+    answer, sources = qrp.answer_question(
+        "How often do people mention fraud in credit cards?", None, aggregates=index
+    )
+    assert sources == []
+    assert answer.startswith('1 of 2 (50.0%) Credit card complaints mention "fraud"')
+    assert "Example complaints: 10." in answer
+
+    answer = qrp.answer_from_aggregates(
+        "How many complaints mention fraud?", aggregates=index
+    )
+    assert "Credit card: 1 of 2 (50.0%); Money transfers: 1 of 1" in answer
+    assert qrp.answer_from_aggregates("What is zelle?", aggregates=index) is None
@@ -0,0 +1,89 @@
+# tests/rag/test_micro_batching.py
+
+import asyncio
+import time
+
+import pytest
+
+from src.rag.micro_batching import MicroBatcher, Overloaded
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_submits_are_batched():
+    seen = []
+
+    def process(items):
+        seen.append(list(items))
+        return [item * 2 for item in items]
+
+    async def main():
+        batcher = MicroBatcher(process, max_batch_size=4, max_wait_ms=50)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+        await batcher.stop()
+        return results, batcher
+
+    results, batcher = run(main())
+    assert results == [i * 2 for i in range(10)]
+    assert [len(batch) for batch in seen] == [4, 4, 2]
+    assert (batcher.batches, batcher.items) == (3, 10)
+
+
+def test_errors_reach_every_caller_of_the_batch():
+    def process(items):
+        raise ValueError("bad batch")
+
+    async def main():
+        batcher = MicroBatcher(process, max_wait_ms=20)
+        results = await asyncio.gather(
+            batcher.submit(1), batcher.submit(2), return_exceptions=True
+        )
+        await batcher.stop()
+        return results
+
+    assert [str(r) for r in run(main())] == ["bad batch", "bad batch"]
+
+
+def test_returned_errors_reach_only_their_caller():
+    def process(items):
+        return [ValueError(f"bad {i}") if i < 0 else i for i in items]
+
+    async def main():
+        batcher = MicroBatcher(process, max_wait_ms=20)
+        results = await asyncio.gather(
+            batcher.submit(1), batcher.submit(-2), return_exceptions=True
+        )
+        await batcher.stop()
+        return results
+
+    ok, failed = run(main())
+    assert ok == 1
+    assert isinstance(failed, ValueError) and str(failed) == "bad -2"
+
+
+def test_full_queue_rejects_and_timed_out_items_are_skipped():
+    processed = []
+
+    def slow(items):
+        time.sleep(0.2)
+        processed.extend(items)
+        return items
+
+    async def main():
+        batcher = MicroBatcher(slow, max_batch_size=1, max_wait_ms=0, max_queue_size=1)
+        first = asyncio.ensure_future(batcher.submit("first"))
+        await asyncio.sleep(0.05)  # "first" is being processed, the queue is empty
+        waiting = asyncio.ensure_future(batcher.submit("waiting", timeout=0.05))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await batcher.submit("rejected")
+        with pytest.raises(asyncio.TimeoutError):
+            await waiting
+        assert await first == "first"
+        await asyncio.sleep(0.05)
+        await batcher.stop()
+
+    run(main())
+    assert processed == ["first"]
@@ -0,0 +1,130 @@
+# tests/rag/test_models.py
+
+import threading
+
+import pytest
+
+from src.rag import models
+
+
+class DummyEmbedder:
+    def __init__(self, name):
+        self.name = name
+        self.queries = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [0.0, 1.0]
+
+
+class DummyGenerator:
+    def __init__(self, name):
+        self.name = name
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return "ok"
+
+
+@pytest.fixture
+def load_counts(monkeypatch):
+    counts = {"embedder": 0, "generator": 0}
+
+    def fake_embedder(name):
+        counts["embedder"] += 1
+        return DummyEmbedder(name)
+
+    def fake_generator(name):
+        counts["generator"] += 1
+        return DummyGenerator(name)
+
+    monkeypatch.setattr(models, "_load_embedder", fake_embedder)
+    monkeypatch.setattr(models, "_load_generator", fake_generator)
+    models.clear_models()
+    yield counts
+    models.clear_models()
+
+
+def test_models_are_loaded_once(load_counts):
+    first = models.get_generator()
+    second = models.get_generator()
+    assert first is second
+    assert models.get_embedder() is models.get_embedder()
+    assert load_counts == {"embedder": 1, "generator": 1}
+
+
+def test_concurrent_first_use_loads_once(load_counts):
+    threads = [threading.Thread(target=models.get_generator) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert load_counts["generator"] == 1
+
+
+def test_model_name_override(load_counts):
+    default = models.get_embedder()
+    other = models.get_embedder("some/other-model")
+    assert default is not other
+    assert other.name == "some/other-model"
+    assert default.name == models.EMBEDDING_MODEL_NAME
+
+
+def test_preload_models_warms_up(load_counts):
+    embedder, generator = models.preload_models()
+    assert embedder.queries == [models.WARMUP_TEXT]
+    assert generator.prompts == [models.WARMUP_TEXT]
+    # Later calls reuse the preloaded instances
+    assert models.get_generator() is generator
+
+
+def test_background_load_runs_once_and_waits():
+    release = threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return "vector store"
+
+    loading = models.BackgroundLoad(load)
+    assert not loading.ready
+    with pytest.raises(TimeoutError):
+        loading.result(timeout=0.01)
+    release.set()
+    assert loading.result(timeout=5) == "vector store"
+    assert loading.ready and calls == [1]
+
+
+def test_background_load_reraises_errors():
+    def load():
+        raise FileNotFoundError("vector_store/faiss_index")
+
+    loading = models.BackgroundLoad(load)
+    with pytest.raises(FileNotFoundError):
+        loading.result(timeout=5)
+
+
+class DummyTokenizer:
+    def __call__(self, text, add_special_tokens=True):
+        return {"input_ids": text.split()}
+
+
+def test_count_tokens_loads_only_the_tokenizer(load_counts, monkeypatch):
+    loaded = []
+
+    def fake_tokenizer(name):
+        loaded.append(name)
+        return DummyTokenizer()
+
+    monkeypatch.setattr(models, "_load_tokenizer", fake_tokenizer)
+    assert models.count_tokens("three word text") == 3
+    assert models.count_tokens("two words") == 2
+    assert loaded == [models.GENERATOR_MODEL_NAME]
+    assert load_counts["generator"] == 0
+
+
+def test_count_tokens_estimates_without_a_tokenizer(load_counts, monkeypatch):
+    monkeypatch.setattr(models, "_load_tokenizer", lambda name: None)
+    assert models.count_tokens("x" * 9) == 3
@@ -0,0 +1,87 @@
+# tests/rag/test_onnx_backend.py
+
+import numpy as np
+import pytest
+
+from src.embeddings import embedding_stage
+from src.rag import models, onnx_backend
+from src.rag.onnx_backend import (
+    check_parity,
+    cosine_similarities,
+    split_backend,
+    token_f1,
+    with_backend,
+)
+
+
+def test_backend_suffix_round_trip():
+    name = "sentence-transformers/all-MiniLM-L6-v2"
+    onnx_name = with_backend(name, "onnx")
+    assert onnx_name != name
+    assert split_backend(onnx_name) == (name, "onnx")
+    assert split_backend(name) == (name, "torch")
+    assert with_backend(onnx_name, "torch") == name
+    assert with_backend(onnx_name, "onnx") == onnx_name
+    with pytest.raises(ValueError):
+        with_backend(name, "tensorrt")
+
+
+def test_onnx_names_load_through_onnx_backend(monkeypatch, tmp_path):
+    loaded = []
+
+    def fake_onnx_embedder(name, encode_kwargs=None):
+        loaded.append((name, encode_kwargs))
+        return "onnx-embedder"
+
+    monkeypatch.setattr(embedding_stage, "load_onnx_embedder", fake_onnx_embedder)
+    monkeypatch.setattr(models, "load_onnx_embedder", fake_onnx_embedder)
+    monkeypatch.setattr(models, "EMBEDDING_CACHE_PATH", "")
+
+    name = with_backend("org/model", "onnx")
+    assert embedding_stage.load_embeddings_model(name, batch_size=8) == "onnx-embedder"
+    assert models._load_embedder(name) == "onnx-embedder"
+    assert loaded == [("org/model", {"batch_size": 8}), ("org/model", None)]
+
+
+class FakeEmbedder:
+    def __init__(self, noise):
+        self.noise = noise
+
+    def embed_documents(self, texts):
+        rng = np.random.default_rng(0)
+        base = np.arange(1, 5, dtype="float32")
+        return [base + self.noise * rng.standard_normal(4) for _ in texts]
+
+
+class FakeLLM:
+    def __init__(self, answer):
+        self.answer = answer
+
+    def batch(self, prompts):
+        return [self.answer for _ in prompts]
+
+    def __or__(self, parser):
+        return self
+
+
+def test_parity_metrics():
+    assert cosine_similarities([[1, 0], [1, 1]], [[2, 0], [1, -1]]).tolist() == [
+        1.0,
+        0.0,
+    ]
+    assert token_f1("Late fees were charged", "late fees were charged") == 1.0
+    assert token_f1("late fees", "interest rates") == 0.0
+    assert 0 < token_f1("late fees charged twice", "late fees") < 1
+
+    report = check_parity(
+        (FakeEmbedder(0.0), FakeEmbedder(0.01)),
+        (FakeLLM("late fees were charged"), FakeLLM("late fees were charged twice")),
+        ["a", "b"],
+        ["q1", "q2"],
+        "org/embedder",
+        "org/generator",
+    )
+    assert report["embedder"]["min_cosine"] > onnx_backend.MIN_EMBEDDING_COSINE
+    assert report["generator"]["exact_match"] == 0.0
+    assert report["generator"]["mean_f1"] == pytest.approx(8 / 9, abs=1e-4)
+    assert report["passed"]
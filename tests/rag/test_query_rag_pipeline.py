@@ -0,0 +1,93 @@
+# tests/rag/test_query_rag_pipeline.py
+
+import pandas as pd
+
+from langchain.docstore.document import Document
+from langchain_core.language_models import FakeStreamingListLLM
+
+from src.embeddings import create_vector_store as cvs
+from src.embeddings.document_store import save_document_store
+from src.embeddings.mmap_store import MmapVectorStore
+from src.rag import query_rag_pipeline as qrp
+from src.rag.cache import RAGCache
+from src.rag.models import stream_generate
+
+
+def test_get_full_narrative_from_document_store(tmp_path):
+    df = pd.DataFrame(
+        {
+            "Complaint ID": [7],
+            "Product": ["Credit card"],
+            "Cleaned Narrative": ["the whole narrative text"],
+        }
+    )
+    save_document_store(df, str(tmp_path))
+    doc = Document(
+        page_content="whole narrative",
+        metadata={"complaint_id": 7, "product": "Credit card", "start": 4, "end": 19},
+    )
+
+    narrative = qrp.get_full_narrative(doc, vector_store_dir=str(tmp_path))
+    assert narrative == "the whole narrative text"
+    assert narrative[4:19] == doc.page_content
+
+
+def test_get_full_narrative_legacy_metadata():
+    doc = Document(
+        page_content="chunk",
+        metadata={"complaint_id": 1, "original_narrative": "legacy chunk text"},
+    )
+    assert qrp.get_full_narrative(doc, vector_store_dir="missing") == (
+        "legacy chunk text"
+    )
+
+
+class RecordingStore:
+    def __init__(self):
+        self.calls = []
+
+    def similarity_search(self, query, k=4, filter=None):
+        self.calls.append((query, k, filter))
+        return []
+
+
+def test_retrieve_chunks_passes_filters_to_the_search():
+    store = RecordingStore()
+    qrp.retrieve_chunks(store, "late fees?", top_k=3, filters={"product": "BNPL"})
+    assert store.calls == [("late fees?", 3, {"product": "BNPL"})]
+    assert qrp.list_products(store) == []
+
+
+def test_stream_answer_returns_sources_before_generating(
+    tmp_path, fake_embeddings, monkeypatch
+):
+    df = pd.DataFrame(
+        {
+            "Complaint ID": range(10),
+            "Product": ["Credit card", "BNPL"] * 5,
+            "Cleaned Narrative": [f"hidden fee number {i}." for i in range(10)],
+        }
+    )
+    cvs.build_vector_store(df, "fake", str(tmp_path), 40, 5, fake_embeddings)
+    vs = MmapVectorStore.load(str(tmp_path), fake_embeddings)
+    llm = FakeStreamingListLLM(responses=["Fees are hidden."])
+    monkeypatch.setattr(qrp, "get_generator", lambda: llm)
+    prompts = []
+
+    def recording_stream(llm, prompt):
+        prompts.append(prompt)
+        yield from stream_generate(llm, prompt)
+
+    monkeypatch.setattr(qrp, "stream_generate", recording_stream)
+    cache = RAGCache(max_entries=10, ttl=60, path="")
+
+    sources, tokens = qrp.stream_answer("hidden fee?", vs, top_k=3, cache=cache)
+    assert len(sources) == 3
+    assert prompts == []  # nothing generated yet
+    pieces = list(tokens)
+    assert len(pieces) > 1 and "".join(pieces) == "Fees are hidden."
+
+    # The complete answer was cached
+    _, again = qrp.stream_answer("hidden fee?", vs, top_k=3, cache=cache)
+    assert list(again) == ["Fees are hidden."]
+    assert len(prompts) == 1
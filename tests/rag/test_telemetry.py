@@ -0,0 +1,72 @@
+# tests/rag/test_telemetry.py
+
+import pandas as pd
+import pytest
+from langchain_core.language_models import FakeListLLM
+
+from src.embeddings import create_vector_store as cvs
+from src.embeddings.mmap_store import MmapVectorStore
+from src.rag import query_rag_pipeline as qrp
+from src.rag import telemetry
+from src.rag.cache import RAGCache
+
+
+@pytest.fixture
+def vector_store(tmp_path, fake_embeddings, monkeypatch):
+    df = pd.DataFrame(
+        {
+            "Complaint ID": range(10),
+            "Product": ["Credit card", "BNPL"] * 5,
+            "Cleaned Narrative": [f"duplicate charge number {i}." for i in range(10)],
+        }
+    )
+    cvs.build_vector_store(df, "fake", str(tmp_path), 40, 5, fake_embeddings)
+    llm = FakeListLLM(responses=["the charge was duplicated"])
+    monkeypatch.setattr(qrp, "get_generator", lambda: llm)
+    return MmapVectorStore.load(str(tmp_path), fake_embeddings)
+
+
+def test_trace_records_stages_and_counters(vector_store):
+    cache = RAGCache(max_entries=10, ttl=60, path="")
+    with telemetry.tracing() as trace:
+        qrp.answer_question("duplicate charge?", vector_store, top_k=3, cache=cache)
+    first = trace.as_dict()
+
+    names = [s["name"] for s in first["spans"]]
+    assert names == ["embed_query", "search", "retrieve", "build_prompt", "generate"]
+    assert all(s["duration_ms"] >= 0 for s in first["spans"])
+    assert first["counters"]["chunks_retrieved"] == 3
+    assert first["counters"]["prompt_tokens"] > first["counters"]["generated_tokens"]
+
+    with telemetry.tracing() as trace:
+        qrp.answer_question("duplicate charge?", vector_store, top_k=3, cache=cache)
+    counters = trace.as_dict()["counters"]
+    assert counters["retrieval_cache_hits"] == counters["answer_cache_hits"] == 1
+
+
+def test_metrics_render_prometheus_histograms():
+    metrics = telemetry.Metrics(buckets=(0.01, 0.1))
+    for seconds in (0.005, 0.05, 0.5):
+        metrics.observe("search", seconds)
+    metrics.inc("requests", status=200)
+    metrics.inc("requests", status=200)
+
+    text = metrics.render()
+    assert 'rag_stage_seconds_bucket{stage="search",le="0.01"} 1' in text
+    assert 'rag_stage_seconds_bucket{stage="search",le="0.1"} 2' in text
+    assert 'rag_stage_seconds_bucket{stage="search",le="+Inf"} 3' in text
+    assert 'rag_stage_seconds_count{stage="search"} 3' in text
+    assert 'rag_requests_total{status="200"} 2' in text
+
+
+def test_disabled_telemetry_records_nothing(vector_store, monkeypatch):
+    monkeypatch.setattr(telemetry, "TELEMETRY_ENABLED", False)
+    monkeypatch.setattr(telemetry, "METRICS", telemetry.Metrics())
+
+    assert telemetry.span("search") is telemetry.span("generate")  # shared no-op
+    qrp.answer_question("duplicate charge?", vector_store, cache=RAGCache(0))
+    assert telemetry.METRICS.render().count("\n") == 2  # only the headers
+    # An explicit trace still works
+    with telemetry.tracing() as trace:
+        qrp.answer_question("duplicate charge?", vector_store, cache=RAGCache(0))
+    assert trace.spans